@@ -14,23 +14,30 @@ from io import BytesIO
 from together import Together
 from e2b_code_interpreter import Sandbox
 
-from src.core.llm_client import LLMClient
+from src.core.llm_client import LLMClient, request_options
+from src.core.job_queue import ACTIVE_STATUSES, get_job_queue
+from src.core.analysis_pipeline import analysis_job as build_analysis_job
 from src.core.code_executor import CodeExecutor
 from src.core.data_processor import DataProcessor
+from src.core.dataset_store import get_dataset_store
+from src.core.local_answers import LocalAnswerer
+from src.core.session_kernel import get_session_kernel
+from src.core.sql_engine import get_sql_engine
 from src.utils.file_handler import FileHandler
 from src.utils.code_parser import CodeParser
 from src.ui.sidebar import setup_sidebar
 from src.ui.components import display_header, display_footer, display_data_summary
 from src.ui.output_handler import OutputHandler
-from config.settings import APP_CONFIG, API_CONFIG
+from src.ui.data_viewer import display_paginated_dataframe
+from src.ui.job_panel import display_job
+from src.ui.profile_panel import display_profile
+from src.utils.profiler import RequestProfiler, profiled_job
+from config.settings import APP_CONFIG, API_CONFIG, SQL_ENGINE_CONFIG
+from src.utils.structured_logging import configure_logging
 import logging
 
-# Configure logging
-logging.basicConfig(
-    filename='logs/app.log', 
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configure logging (queued to a background writer; safe to call on every rerun)
+configure_logging()
 
 warnings.filterwarnings("ignore", category=UserWarning, module="pydantic")
 
@@ -52,25 +59,50 @@ def main():
     file_handler = FileHandler()
     code_parser = CodeParser()
     output_handler = OutputHandler()
+    dataset_store = get_dataset_store()
+    job_queue = get_job_queue()
+    sql_engine = get_sql_engine()
     
     # Setup sidebar
     setup_sidebar()
     
+    # Debug mode profiles this run's ingestion, profiling and rendering (and any analysis job it starts)
+    profiler = RequestProfiler() if st.session_state.get('debug_mode') else None
+    
+    def profile_stage(name: str):
+        return profiler.stage(name) if profiler is not None else contextlib.nullcontext()
+    
     # Main content
     uploaded_file = st.file_uploader("📂 Upload CSV file", type="csv")
     
     if uploaded_file is not None:
-        # Process and display data
-        df = pd.read_csv(uploaded_file)
+        # Process and display data (appended versions of a cached upload only parse the new rows)
+        with profile_stage('ingestion'):
+            dataset = dataset_store.ingest(uploaded_file.name, uploaded_file.getvalue())
+        df = dataset['df']
         st.write("🧾 **Dataset Preview:**")
+        if dataset['appended_rows']:
+            st.caption(f"➕ {dataset['appended_rows']:,} new rows appended to the cached dataset")
         
         if st.checkbox("🔎 Show full dataset"):
-            st.dataframe(df)
+            display_paginated_dataframe(df, dataset['fingerprint'])
         else:
             st.dataframe(df.head())
         
         # Display data summary
-        display_data_summary(df)
+        with profile_stage('profiling'):
+            display_data_summary(df)
+            
+            if st.checkbox("📈 Show data analysis"):
+                output_handler.display_dataframe_analysis(df, dataset['fingerprint'], dataset.get('timeseries'))
+        
+        # In SQL mode further files can be joined with the dataset without loading them into pandas
+        join_files = []
+        if st.session_state.get('sql_mode') and sql_engine.available:
+            join_files = st.file_uploader(
+                "🔗 More CSV files to join (SQL engine)", type="csv", accept_multiple_files=True,
+                help=f"Up to {SQL_ENGINE_CONFIG['max_join_files']} files, queried as tables named after the files"
+            ) or []
         
         # Query input
         query = st.text_area(
@@ -78,27 +110,81 @@ def main():
             "Can you calculate and display the mean of each numerical column?"
         )
         
-        if st.button("🔍 Analyze", type="primary"):
-            if not st.session_state.together_api_key or not st.session_state.e2b_api_key:
+        job_id = st.session_state.get('analysis_job')
+        job = job_queue.get(job_id) if job_id else None
+        running = job is not None and job['status'] in ACTIVE_STATUSES
+        
+        if st.button("🔍 Analyze", type="primary", disabled=running):
+            # Descriptive and group-by questions are answered from the cached profile and rollup cube;
+            # not in session mode, where the kernel's frame may have been changed by earlier turns
+            answer_locally = st.session_state.get('local_answers', True) and not st.session_state.get('session_mode')
+            local_answer = LocalAnswerer().answer(dataset, query) if answer_locally else None
+            if local_answer is not None:
+                st.session_state.pop('analysis_job', None)
+                st.session_state.local_answer = {'fingerprint': dataset['fingerprint'], 'answer': local_answer}
+                job = None
+            elif not st.session_state.together_api_key or not st.session_state.e2b_api_key:
                 st.error("Please enter both API keys in the sidebar.")
             else:
-                try:
-                    with Sandbox(api_key=st.session_state.e2b_api_key) as code_interpreter:
-                        # Upload dataset to sandbox
-                        dataset_path = file_handler.upload_to_sandbox(code_interpreter, uploaded_file)
+                # The job runs on a worker thread: capture everything it needs from the session now
+                options = request_options()
+                e2b_api_key = st.session_state.e2b_api_key
+                columns = list(df.columns)
+                sql_tables = None
+                if options['sql_mode'] and sql_engine.available:
+                    try:
+                        with st.spinner("🦆 Loading files into the SQL engine..."):
+                            sql_tables = sql_engine.register_uploads(
+                                [uploaded_file] + join_files[:SQL_ENGINE_CONFIG['max_join_files']]
+                            )
+                    except Exception as e:
+                        logging.warning(f"SQL engine registration failed: {str(e)}")
+                        st.warning(f"⚠️ SQL engine unavailable for this question: {str(e)}")
+                
+                if st.session_state.get('session_mode'):
+                    # Reuse this session's kernel: dataset stays loaded as `df` with earlier results
+                    kernel = get_session_kernel()
+                    
+                    def analysis_job(job):
+                        code_interpreter = kernel.ensure_sandbox()
+                        job.progress("📤 Loading dataset into the session kernel...")
+                        dataset_path = kernel.load_dataset(file_handler, uploaded_file, dataset)
+                        bars = file_handler.upload_bars(code_interpreter, dataset_path, dataset)
                         
-                        # Get LLM response and execute code
-                        code_results, llm_response, exec_code = llm_client.chat_with_llm(
-                            code_interpreter, query, dataset_path
+                        client = LLMClient(reporter=job)
+                        answer = client.chat_with_llm(
+                            code_interpreter, query, dataset_path, session_context=kernel.prompt_context(),
+                            schema=columns, options=options, bars=bars, sql_tables=sql_tables
                         )
-                        
-                        # Display results
-                        output_handler.display_results(code_results, llm_response, exec_code)
-                        
-                except Exception as e:
-                    st.error(f"❌ Error: {str(e)}")
-                    logging.error(f"Analysis error: {str(e)}")
-    
+                        # SQL answers ran on the host, not in the kernel: they are not kernel history
+                        if client.answer_language == 'python':
+                            kernel.record_turn(query, answer[2])
+                        return answer
+                else:
+                    # Pooled sandbox; identical questions on the same dataset share one run
+                    analysis_job = build_analysis_job(uploaded_file, dataset, query, options, e2b_api_key,
+                                                      file_handler=file_handler, answer_locally=False,
+                                                      sql_tables=sql_tables)
+                
+                if options['debug_mode']:
+                    analysis_job = profiled_job(analysis_job)
+                
+                st.session_state.pop('local_answer', None)
+                st.session_state.analysis_job = job_queue.submit(analysis_job, description=query)
+                logging.info(f"Submitted analysis job {st.session_state.analysis_job}")
+                st.rerun()
+        
+        local_answer = st.session_state.get('local_answer')
+        if job is not None:
+            with profile_stage('rendering'):
+                display_job(job_queue, job_id, output_handler)
+        elif local_answer is not None and local_answer['fingerprint'] == dataset['fingerprint']:
+            with profile_stage('rendering'):
+                output_handler.display_results(*local_answer['answer'])
+        
+        if profiler is not None and profiler.stages:
+            display_profile("🐞 Page profile", profiler.report(), 'page')
+        
     display_footer()
 
 if __name__ == "__main__":
@@ -16,4 +16,21 @@ MODEL_DESCRIPTIONS = {
     "Meta-Llama 3.3 70B": "Balanced performance and speed",
     "Mixtral 8x7B": "Good for general tasks",
     "Code Llama 34B": "Specialized for code generation"
+}
+
+# Selecting this in the sidebar routes each question by its complexity
+AUTO_MODEL = "Auto (route by question)"
+AUTO_MODEL_ID = "auto"
+
+# Escalation order for the router, fastest tier first
+MODEL_TIERS = {
+    "fast": ["Qwen 2.5 7B", "Mixtral 8x7B"],
+    "balanced": ["Meta-Llama 3.3 70B", "Code Llama 34B"],
+    "strong": ["DeepSeek V3", "Meta-Llama 3.1 405B"]
+}
+
+COMPLEXITY_TIERS = {
+    "simple": "fast",
+    "moderate": "balanced",
+    "complex": "strong"
 }
\ No newline at end of file
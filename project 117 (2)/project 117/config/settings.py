@@ -26,5 +26,199 @@ API_CONFIG = {
 LOGGING_CONFIG = {
     'level': os.getenv('LOG_LEVEL', 'INFO'),
     'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    'handlers': ['file', 'console']
+    'handlers': ['file', 'console'],
+    'directory': os.getenv('LOG_DIR', 'logs'),
+    'filename': 'app.log',
+    'max_bytes': int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024))),
+    'when': 'midnight',
+    'backup_count': 7,
+    'debug_sample_every': int(os.getenv('LOG_DEBUG_SAMPLE_EVERY', '10'))
+}
+
+# Dataset ingestion / caching
+INGESTION_CONFIG = {
+    'max_cached_datasets': int(os.getenv('MAX_CACHED_DATASETS', '8')),
+    'probe_bytes': 4096
+}
+
+# Paginated dataset viewer
+VIEWER_CONFIG = {
+    'page_sizes': [25, 50, 100, 250],
+    'default_page_size': 50,
+    'max_cached_pages': 64,
+    'max_cached_orders': 16
+}
+
+# Memoized per-dataset analysis results (tables, figures, correlations)
+RESULT_CACHE_CONFIG = {
+    'max_entries': int(os.getenv('RESULT_CACHE_ENTRIES', '256'))
+}
+
+# Correlation engine for wide frames
+CORRELATION_CONFIG = {
+    'block_size': 256,
+    'max_workers': int(os.getenv('CORRELATION_WORKERS', str(os.cpu_count() or 1))),
+    'sample_rows': int(os.getenv('CORRELATION_SAMPLE_ROWS', '200000')),
+    'dense_max_columns': 50,
+    'heatmap_max_columns': 40,
+    'top_k': 25
+}
+
+# DataProcessor.clean_data pipeline
+CLEANING_CONFIG = {
+    'steps': ['dedupe', 'impute'],
+    'chunk_size': int(os.getenv('CLEANING_CHUNK_SIZE', '250000')),
+    'track_memory': True
+}
+
+# Conversational session mode (one persistent sandbox kernel per Streamlit session)
+SESSION_CONFIG = {
+    'sandbox_timeout': int(os.getenv('SESSION_SANDBOX_TIMEOUT', '900')),
+    'history_turns': 3,
+    'max_variables': 30
+}
+
+# Static pre-flight checks on generated code
+PREFLIGHT_CONFIG = {
+    'max_retries': 2,
+    'column_match_cutoff': 0.85,
+    'path_match_cutoff': 0.75  # read paths this similar to the dataset file name are repaired
+}
+
+# Automatic model routing
+ROUTER_CONFIG = {
+    'max_attempts': 3,
+    'min_samples': 3,
+    'min_success_rate': 0.5
+}
+
+# Speculative racing of several models on the same prompt
+RACING_CONFIG = {
+    'partners': ['Qwen 2.5 7B', 'Meta-Llama 3.3 70B'],
+    'max_models': 3,
+    'timeout': int(os.getenv('RACING_TIMEOUT', '120'))
+}
+
+# Shared scheduler in front of the LLM provider
+SCHEDULER_CONFIG = {
+    'max_per_key': int(os.getenv('SCHEDULER_MAX_PER_KEY', '8')),
+    'max_per_model': int(os.getenv('SCHEDULER_MAX_PER_MODEL', '4')),
+    'rate_per_second': float(os.getenv('SCHEDULER_RATE_PER_SECOND', '2.0')),
+    'burst': 5,
+    'max_attempts': 4,
+    'backoff_base': 0.5,
+    'backoff_max': 20.0,
+    'hedge_min_samples': 20,
+    'request_timeout': 120.0,
+    'deadline': 180.0
+}
+
+# Background analysis jobs
+JOB_CONFIG = {
+    'max_workers': int(os.getenv('JOB_WORKERS', '8')),
+    'poll_interval': 1.0,
+    'max_finished_jobs': 200
+}
+
+# Warm E2B sandboxes shared by background jobs and the HTTP service
+SANDBOX_POOL_CONFIG = {
+    'max_per_key': int(os.getenv('SANDBOX_POOL_MAX_PER_KEY', '8')),
+    'max_idle_per_key': 4,
+    'sandbox_timeout': 600
+}
+
+# Async HTTP analysis service (python -m src.api.analysis_service)
+SERVICE_CONFIG = {
+    'host': os.getenv('SERVICE_HOST', '127.0.0.1'),
+    'port': int(os.getenv('SERVICE_PORT', '8600')),
+    'poll_interval': 0.2,
+    'heartbeat_interval': 15.0,
+    'max_datasets': int(os.getenv('SERVICE_MAX_DATASETS', '32'))
+}
+
+# Debug-mode request profiling
+PROFILER_CONFIG = {
+    'sample_interval': 0.005,  # seconds between stack samples for the flamegraph
+    'traceback_frames': 10,
+    'top_allocations': 10,
+    'stats_limit': 40
+}
+
+# Per-execution budgets for generated code in the sandbox
+EXECUTION_BUDGET_CONFIG = {
+    'timeout': float(os.getenv('EXECUTION_TIMEOUT', '120')),  # seconds; the kernel is restarted after it
+    'memory_limit_mb': int(os.getenv('EXECUTION_MEMORY_LIMIT_MB', '4096')),  # address-space ceiling
+    'max_stdout_bytes': 64 * 1024,
+    'max_stderr_bytes': 16 * 1024,
+    'max_artifacts': 20,
+    'max_artifact_bytes': 8 * 1024 * 1024
+}
+
+# Rendering of code outputs
+RENDER_CONFIG = {
+    'max_image_width': 1460,  # Streamlit's widest content area; wider images are downscaled
+    'eager_outputs': 6,  # outputs after these are rendered on demand
+    'max_inline_html_bytes': 200 * 1024,
+    'html_height': 500
+}
+
+# Arrow IPC transport of DataFrame results from the sandbox
+TABLE_TRANSPORT_CONFIG = {
+    'compression': 'zstd',  # 'lz4', 'zstd' or None
+    'max_table_bytes': 32 * 1024 * 1024,
+    'max_tables': 5,
+    'page_size': 100
+}
+
+# Large-data chart helpers pre-loaded in the sandbox
+VIZ_CONFIG = {
+    'max_points': 2000,  # points per series after downsampling
+    'webgl_threshold': 1000,  # traces with more points use scattergl
+    'density_threshold': 200000,  # scatter plots with more points are binned
+    'raster_size': (600, 400)
+}
+
+# Multi-resolution OHLCV/VWAP bars built at ingestion for intraday data
+TIMESERIES_CONFIG = {
+    'time_columns': ['Time', 'Timestamp', 'Datetime', 'Date'],  # first one that parses is used
+    'symbol_columns': ['Symbol', 'Ticker'],
+    'price_columns': ['Last Price', 'LTP', 'Close', 'Price'],
+    'volume_columns': ['Volume'],
+    'levels': ['1min', '5min', '1h', '1D'],  # finest first; each divides the next
+    'max_points': 2000  # bars per chart before a coarser level is used
+}
+
+# Rollup cube of group-by statistics built at ingestion
+ROLLUP_CONFIG = {
+    'max_cardinality': 200,  # categorical columns with more values are not dimensions
+    'max_dimensions': 6,
+    'max_group_columns': 2,  # cuboids cover group-bys over up to this many dimensions
+    'max_cells': 100000  # largest cuboid (product of its dimensions' cardinalities)
+}
+
+# Descriptive questions answered from the cached dataset profile
+PROFILE_ANSWER_CONFIG = {
+    'top_n': 5  # values listed for "top/most common" questions without a number
+}
+
+# Embedded DuckDB engine answering relational questions with SQL on the host
+SQL_ENGINE_CONFIG = {
+    'threads': None,  # DuckDB worker threads (None: one per core)
+    'memory_limit': '2GB',
+    'max_tables': 16,  # uploads kept parsed (least recently used are dropped)
+    'max_databases': 8,  # per-session databases kept loaded
+    'max_rows': 100000,  # rows returned per query
+    'max_join_files': 5  # extra CSV files a session can upload to join with its dataset
+}
+
+# Progressive answers: generated code runs on a stratified sample before the full data
+PROGRESSIVE_CONFIG = {
+    'min_rows': 200000,  # smaller datasets are only answered on the full data
+    'sample_rows': 50000,
+    'min_per_stratum': 30,
+    'stratum_columns': ['Sector', 'Industry', 'Symbol'],  # preferred strata, else the smallest categorical column
+    'max_strata': 500,
+    'confidence_z': 1.96,  # bounds are 95% intervals
+    'seed': 0,
+    'preview_timeout': 20  # seconds; a slow preview is dropped rather than delaying the full run
 }
\ No newline at end of file
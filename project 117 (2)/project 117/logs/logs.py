@@ -1,11 +1,12 @@
+import logging
 import os
+import sys
 
-# Ensure logs directory exists
-os.makedirs('logs', exist_ok=True)
+# Make the project importable when this file is run or imported from logs/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Then configure logging
-logging.basicConfig(
-    filename='logs/app.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+from src.utils.structured_logging import configure_logging
+
+# Same queued, rotating JSON pipeline the app and the HTTP service use
+configure_logging()
+logger = logging.getLogger(__name__)
\ No newline at end of file
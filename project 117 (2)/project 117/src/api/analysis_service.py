@@ -0,0 +1,220 @@
+import asyncio
+import io
+import json
+import posixpath
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Any, AsyncIterator, List, Optional
+import logging
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse, Response
+from starlette.routing import Route
+
+from src.core.analysis_pipeline import analysis_job
+from src.core.dataset_store import DatasetStore, get_dataset_store
+from src.core.job_queue import JobQueue, ACTIVE_STATUSES, get_job_queue
+from src.core.table_results import TableResult
+from src.utils.structured_logging import configure_logging
+from config.settings import API_CONFIG, RACING_CONFIG, SERVICE_CONFIG, TABLE_TRANSPORT_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class _Upload(io.BytesIO):
+    """Registered dataset bytes in the shape ``FileHandler`` expects from an upload"""
+
+    def __init__(self, name: str, data: bytes):
+        super().__init__(data)
+        self.name = name
+
+
+def serialize_result(result: Any) -> Dict[str, Any]:
+    """JSON form of one code result (an E2B ``Result``, a ``TableResult`` or captured stdout)"""
+    if isinstance(result, str):
+        return {'text': result}
+    if isinstance(result, TableResult):
+        return {'table': result.preview(TABLE_TRANSPORT_CONFIG['page_size'])}
+    formats = result.formats() if hasattr(result, 'formats') else []
+    serialized = {fmt: getattr(result, fmt, None) for fmt in formats}
+    if getattr(result, 'text', None):
+        serialized['text'] = result.text
+    return serialized
+
+
+class AnalysisService:
+    """The upload → LLM → execute pipeline behind an HTTP API.
+
+    Datasets are registered once and addressed by fingerprint. Each query runs
+    as a ``JobQueue`` job, so any number of HTTP requests are multiplexed over
+    the shared worker threads, ``SandboxPool`` and ``RequestScheduler``; the
+    event loop only waits on the job store.
+    """
+
+    def __init__(self, job_queue: Optional[JobQueue] = None, dataset_store: Optional[DatasetStore] = None,
+                 pipeline: Callable[..., Callable] = analysis_job):
+        self.job_queue = job_queue or get_job_queue()
+        self.dataset_store = dataset_store or get_dataset_store()
+        self.pipeline = pipeline
+        self._uploads: 'OrderedDict[str, _Upload]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register_dataset(self, name: str, data: bytes) -> Dict[str, Any]:
+        entry = self.dataset_store.ingest(name, data)
+        with self._lock:
+            self._uploads[entry['fingerprint']] = _Upload(name, data)
+            self._uploads.move_to_end(entry['fingerprint'])
+            while len(self._uploads) > SERVICE_CONFIG['max_datasets']:
+                self._uploads.popitem(last=False)
+        df = entry['df']
+        return {'fingerprint': entry['fingerprint'], 'name': name, 'rows': len(df),
+                'columns': [str(col) for col in df.columns]}
+
+    def submit_query(self, fingerprint: str, query: str, together_api_key: str, e2b_api_key: str,
+                     model: Optional[str] = None, race: bool = False) -> str:
+        with self._lock:
+            upload = self._uploads.get(fingerprint)
+        if upload is None:
+            raise KeyError(fingerprint)
+        dataset = self.dataset_store.ingest(upload.name, upload.getvalue())
+        options = {
+            'together_api_key': together_api_key,
+            'model_name': model or API_CONFIG['default_model'],
+            'race_mode': race,
+            'race_models': RACING_CONFIG['partners'],
+        }
+        return self.job_queue.submit(self.pipeline(upload, dataset, query, options, e2b_api_key),
+                                     owner='http', description=query)
+
+    async def events(self, job_id: str) -> AsyncIterator[str]:
+        """Server-sent events for a query until it finishes"""
+        sent_progress, sent_messages, sent_partial = 0, 0, {}
+        last_write = time.monotonic()
+        while True:
+            job = self.job_queue.get(job_id)
+            if job is None:
+                yield self._event('error', {'error': 'unknown query'})
+                return
+            events = [self._event('progress', {'step': step}) for step in job['progress'][sent_progress:]]
+            events += [self._event('message', {'level': level, 'message': message})
+                       for level, message in job['messages'][sent_messages:]]
+            events += [self._event('partial', {'name': name, 'value': value})
+                       for name, value in job['partial'].items() if sent_partial.get(name) != value]
+            sent_progress, sent_messages, sent_partial = len(job['progress']), len(job['messages']), job['partial']
+            if job['status'] not in ACTIVE_STATUSES:
+                events.append(self._event(job['status'], self.describe(job)))
+            elif not events and time.monotonic() - last_write > SERVICE_CONFIG['heartbeat_interval']:
+                events.append(": keep-alive\n\n")
+
+            for event in events:
+                yield event
+            if job['status'] not in ACTIVE_STATUSES:
+                return
+            if events:
+                last_write = time.monotonic()
+            await asyncio.sleep(SERVICE_CONFIG['poll_interval'])
+
+    @staticmethod
+    def describe(job: Dict[str, Any]) -> Dict[str, Any]:
+        """JSON view of a job"""
+        described = {key: job[key] for key in ('id', 'status', 'progress', 'partial', 'error', 'submitted', 'finished')}
+        described['messages'] = [{'level': level, 'message': message} for level, message in job['messages']]
+        if job['status'] == 'completed' and job['result'] is not None:
+            code_results, llm_response, exec_code = job['result']
+            described['result'] = {
+                'response': llm_response,
+                'code': exec_code,
+                'outputs': [serialize_result(result) for result in code_results or []],
+            }
+        return described
+
+    @staticmethod
+    def _event(name: str, data: Dict[str, Any]) -> str:
+        return f"event: {name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def create_app(service: Optional[AnalysisService] = None) -> Starlette:
+    """ASGI app exposing ``service``
+
+    - ``POST /datasets?name=data.csv`` (CSV body) → fingerprint, rows and columns
+    - ``POST /datasets/{fingerprint}/queries`` (JSON ``query``, optional ``model``, ``race``) → query id
+    - ``GET /queries/{id}`` → current state; ``GET /queries/{id}/events`` → server-sent events
+    - ``DELETE /queries/{id}`` → cancel
+
+    API keys come from the ``X-Together-Api-Key`` / ``X-E2B-Api-Key`` headers,
+    falling back to the environment (``API_CONFIG``).
+    """
+    service = service or AnalysisService()
+
+    async def register_dataset(request: Request) -> Response:
+        data = await request.body()
+        if not data:
+            return JSONResponse({'error': 'empty body'}, status_code=400)
+        # The name becomes a file name inside the sandbox
+        name = posixpath.basename(request.query_params.get('name', '')) or 'dataset.csv'
+        try:
+            described = await run_in_threadpool(service.register_dataset, name, data)
+        except Exception as e:
+            logger.error(f"Dataset registration failed: {str(e)}")
+            return JSONResponse({'error': f"could not parse dataset: {str(e)}"}, status_code=422)
+        return JSONResponse(described, status_code=201)
+
+    async def submit_query(request: Request) -> Response:
+        try:
+            body = await request.json()
+        except ValueError:
+            return JSONResponse({'error': 'body must be JSON'}, status_code=400)
+        if not isinstance(body, dict) or not str(body.get('query', '')).strip():
+            return JSONResponse({'error': 'missing query'}, status_code=400)
+        together_api_key = request.headers.get('x-together-api-key') or API_CONFIG['together_api_key']
+        e2b_api_key = request.headers.get('x-e2b-api-key') or API_CONFIG['e2b_api_key']
+        if not together_api_key or not e2b_api_key:
+            return JSONResponse({'error': 'missing API keys'}, status_code=401)
+        try:
+            job_id = await run_in_threadpool(
+                service.submit_query, request.path_params['fingerprint'], body['query'],
+                together_api_key, e2b_api_key, body.get('model'), bool(body.get('race'))
+            )
+        except KeyError:
+            return JSONResponse({'error': 'unknown dataset; register it first'}, status_code=404)
+        return JSONResponse({'id': job_id, 'events': f"/queries/{job_id}/events"}, status_code=202)
+
+    async def get_query(request: Request) -> Response:
+        job = service.job_queue.get(request.path_params['job_id'])
+        if job is None:
+            return JSONResponse({'error': 'unknown query'}, status_code=404)
+        return JSONResponse(json.loads(json.dumps(service.describe(job), default=str)))
+
+    async def stream_query(request: Request) -> Response:
+        if service.job_queue.get(request.path_params['job_id']) is None:
+            return JSONResponse({'error': 'unknown query'}, status_code=404)
+        return StreamingResponse(service.events(request.path_params['job_id']), media_type='text/event-stream',
+                                 headers={'Cache-Control': 'no-cache'})
+
+    async def cancel_query(request: Request) -> Response:
+        cancelled = service.job_queue.cancel(request.path_params['job_id'])
+        return JSONResponse({'cancelled': cancelled}, status_code=200 if cancelled else 409)
+
+    routes: List[Route] = [
+        Route('/datasets', register_dataset, methods=['POST']),
+        Route('/datasets/{fingerprint}/queries', submit_query, methods=['POST']),
+        Route('/queries/{job_id}', get_query, methods=['GET']),
+        Route('/queries/{job_id}', cancel_query, methods=['DELETE']),
+        Route('/queries/{job_id}/events', stream_query, methods=['GET']),
+    ]
+    return Starlette(routes=routes)
+
+
+def main():
+    import uvicorn
+
+    configure_logging()
+    # log_config=None leaves uvicorn's loggers on the shared queued pipeline
+    uvicorn.run(create_app(), host=SERVICE_CONFIG['host'], port=SERVICE_CONFIG['port'], log_config=None)
+
+
+if __name__ == "__main__":
+    main()
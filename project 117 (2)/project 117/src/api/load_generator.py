@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, Any, List, Optional
+
+import httpx
+import numpy as np
+
+
+async def run_query(client: httpx.AsyncClient, fingerprint: str, query: str) -> Dict[str, Any]:
+    """Submit one query and follow its event stream to the end"""
+    started = time.perf_counter()
+    response = await client.post(f"/datasets/{fingerprint}/queries", json={'query': query})
+    response.raise_for_status()
+    job_id = response.json()['id']
+    first_event, status, event = None, None, None
+    async with client.stream('GET', f"/queries/{job_id}/events") as stream:
+        async for line in stream.aiter_lines():
+            if line.startswith('event: '):
+                event = line[len('event: '):]
+                first_event = first_event or time.perf_counter() - started
+            elif line.startswith('data: ') and event in ('completed', 'failed', 'cancelled', 'error'):
+                status = event
+    return {'status': status, 'latency': time.perf_counter() - started, 'first_event': first_event}
+
+
+async def generate_load(base_url: str, dataset: bytes, query: str, requests: int, concurrency: int,
+                        dataset_name: str = 'dataset.csv', distinct_queries: bool = True,
+                        transport: Optional[httpx.AsyncBaseTransport] = None, headers: Optional[Dict[str, str]] = None
+                        ) -> Dict[str, Any]:
+    """Register ``dataset`` once, then send ``requests`` queries with at most ``concurrency`` in flight
+
+    With ``distinct_queries`` each request gets its own question, so the
+    service cannot coalesce them. ``transport`` allows benchmarking an
+    in-process app (``httpx.ASGITransport``) without opening a port.
+    """
+    async with httpx.AsyncClient(base_url=base_url, transport=transport, headers=headers, timeout=None) as client:
+        response = await client.post('/datasets', params={'name': dataset_name}, content=dataset)
+        response.raise_for_status()
+        fingerprint = response.json()['fingerprint']
+
+        limit = asyncio.Semaphore(concurrency)
+
+        async def one(index: int) -> Dict[str, Any]:
+            async with limit:
+                return await run_query(client, fingerprint, f"{query} (#{index})" if distinct_queries else query)
+
+        started = time.perf_counter()
+        results: List[Dict[str, Any]] = await asyncio.gather(*(one(index) for index in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    latencies = np.array([result['latency'] for result in results])
+    first_events = np.array([result['first_event'] for result in results if result['first_event'] is not None])
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'elapsed_s': elapsed,
+        'throughput_rps': requests / elapsed if elapsed else float('inf'),
+        'latency_p50_s': float(np.percentile(latencies, 50)),
+        'latency_p95_s': float(np.percentile(latencies, 95)),
+        'first_event_p50_s': float(np.percentile(first_events, 50)) if len(first_events) else None,
+        'statuses': {status: sum(result['status'] == status for result in results)
+                     for status in {result['status'] for result in results}},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the analysis HTTP service")
+    parser.add_argument('dataset', help="CSV file to register")
+    parser.add_argument('--url', default='http://127.0.0.1:8600')
+    parser.add_argument('--query', default='What is the mean of each numerical column?')
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=5)
+    parser.add_argument('--same-query', action='store_true', help="send identical queries (exercises coalescing)")
+    args = parser.parse_args()
+
+    with open(args.dataset, 'rb') as f:
+        dataset = f.read()
+    report = asyncio.run(generate_load(args.url, dataset, args.query, args.requests, args.concurrency,
+                                       dataset_name=args.dataset.rsplit('/', 1)[-1],
+                                       distinct_queries=not args.same_query))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import contextlib
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+import logging
+
+from src.core.job_queue import JobCancelled, JobReporter
+from src.core.llm_client import LLMClient
+from src.core.local_answers import LocalAnswerer
+from src.core.reporting import Reporter
+from src.core.sandbox_pool import SandboxPool, get_sandbox_pool
+from src.core.single_flight import SingleFlight, coalescing_key, get_single_flight
+from src.utils.file_handler import FileHandler
+from src.utils.structured_logging import trace_stage
+
+logger = logging.getLogger(__name__)
+
+
+class _CoalescedReporter(Reporter):
+    """A caller's job reporter for a run that other sessions may share
+
+    While the caller leads the run, every call is published as a
+    ``(method, args)`` update, which ``SingleFlight`` hands to each waiting
+    caller's ``replay`` (the leader's included) so all their jobs show the
+    same stages, messages and partial results. When the leader is cancelled
+    while followers still wait, the run carries on for them: the leader's job
+    stops receiving updates instead of stopping the run, which ends at its
+    next checkpoint once nobody is waiting any more.
+    """
+
+    def __init__(self, job: JobReporter, followers: Callable[[], int]):
+        self.job = job
+        self.followers = followers
+        self.publish: Optional[Callable[[Any], None]] = None  # set while this caller leads the run
+        self.detached = False
+
+    def replay(self, update: Tuple[str, tuple]):
+        """Apply an update of the shared run to this caller's job"""
+        method, args = update
+        if self.detached:
+            if not self.followers():
+                raise JobCancelled(self.job.id)
+            return
+        try:
+            getattr(self.job, method)(*args)
+        except JobCancelled:
+            if self.publish is None or not self.followers():
+                raise
+            self.detached = True
+            logger.info("Analysis cancelled by the session running it; continuing for the sessions waiting on it")
+
+    def _send(self, method: str, *args):
+        if self.publish is None:
+            self.replay((method, args))
+        else:
+            self.publish((method, args))
+
+    def info(self, message: str):
+        self._send('info', message)
+
+    def warning(self, message: str):
+        self._send('warning', message)
+
+    def error(self, message: str):
+        self._send('error', message)
+
+    def progress(self, message: str):
+        self._send('progress', message)
+
+    def partial(self, name: str, value: Any):
+        self._send('partial', name, value)
+
+    @contextlib.contextmanager
+    def stage(self, message: str) -> Iterator[None]:
+        self.progress(message)
+        yield
+        # The leader's own checkpoint, not an update for the followers
+        self.replay(('check_cancelled', ()))
+
+
+def analysis_job(upload, dataset: Dict[str, Any], query: str, options: Dict[str, Any], e2b_api_key: str,
+                 file_handler: Optional[FileHandler] = None, sandbox_pool: Optional[SandboxPool] = None,
+                 single_flight: Optional[SingleFlight] = None,
+                 local_answerer: Optional[LocalAnswerer] = None,
+                 answer_locally: bool = True,
+                 sql_tables: Optional[List[str]] = None) -> Callable[[JobReporter], Any]:
+    """Job function answering ``query`` about ``dataset``: upload → LLM → execute in a pooled sandbox
+
+    ``upload`` is the uploaded file (anything with ``name`` and ``getvalue()``),
+    ``dataset`` its ``DatasetStore`` entry and ``options`` the LLM settings
+    (see ``request_options``). Identical questions on the same dataset that run
+    at the same time share one run; questions ``LocalAnswerer`` can answer from
+    the dataset's precomputed structures skip the LLM and sandbox entirely
+    (callers that already tried pass ``answer_locally=False``). ``sql_tables``
+    (fingerprints of uploads registered with the ``SQLEngine``) lets the LLM
+    answer relational questions with SQL run on the host. With
+    ``options['progressive']`` the code runs on the dataset's stratified sample
+    first and the approximate answer is published as the job's ``preview``.
+    """
+    file_handler = file_handler or FileHandler()
+    sandbox_pool = sandbox_pool or get_sandbox_pool()
+    single_flight = single_flight or get_single_flight()
+    local_answerer = local_answerer or LocalAnswerer()
+    key = coalescing_key(dataset['fingerprint'], options['model_name'], query, options['race_mode'],
+                         bool(options.get('debug_mode')), bool(options.get('profile_sandbox')),
+                         bool(options.get('progressive')),
+                         tuple(sql_tables or ()))
+    columns = list(dataset['df'].columns)
+
+    def run(job: JobReporter):
+        local_answer = local_answerer.answer(dataset, query) if answer_locally else None
+        if local_answer is not None:
+            return local_answer
+
+        reporter = _CoalescedReporter(job, lambda: single_flight.followers(key))
+
+        def run_analysis(publish):
+            reporter.publish = publish
+            with sandbox_pool.lease(e2b_api_key) as code_interpreter:
+                # The sandbox is only stopped when no other session waits on this run
+                job.on_cancel(lambda: None if single_flight.followers(key) else code_interpreter.kill())
+                # Upload dataset to sandbox (skipped when this pooled sandbox already has it)
+                reporter.progress("📤 Uploading dataset to the sandbox...")
+                with trace_stage('upload', logger):
+                    dataset_path = file_handler.upload_to_sandbox(code_interpreter, upload, dataset)
+                    bars = file_handler.upload_bars(code_interpreter, dataset_path, dataset)
+                    sample = (file_handler.upload_sample(code_interpreter, dataset_path, dataset)
+                              if options.get('progressive') else None)
+
+                # Get LLM response and execute code
+                return LLMClient(reporter=reporter).chat_with_llm(
+                    code_interpreter, query, dataset_path, schema=columns, options=options, bars=bars,
+                    sql_tables=sql_tables, sample=sample
+                )
+
+        if single_flight.in_flight(key):
+            job.info("⏳ The same question is already being analyzed for this dataset; "
+                     "showing that run's results")
+        return single_flight.do(key, run_analysis, reporter.replay, job.check_cancelled)
+
+    return run
@@ -1,44 +1,264 @@
-import io
-import contextlib
-import warnings
+import json
+import time
 from typing import Optional, List, Any, Tuple
-import streamlit as st
-from e2b_code_interpreter import Sandbox
+from e2b_code_interpreter import Sandbox, TimeoutException
 import logging
 
+from src.core.reporting import Reporter, StreamlitReporter
+from src.core.sandbox_helpers import memory_limit_cell, setup_cell, collect_cell
+from src.core.table_results import TableResult
+from src.utils.metrics import get_metrics
+from config.settings import EXECUTION_BUDGET_CONFIG, PROFILER_CONFIG
+
+# Run as separate cells around the generated code so its own output and display are unchanged
+SANDBOX_PROFILE_START = """import cProfile as _dbg_cprofile
+_dbg_profiler = _dbg_cprofile.Profile()
+_dbg_profiler.enable()"""
+
+SANDBOX_PROFILE_REPORT = """_dbg_profiler.disable()
+import io as _dbg_io, pstats as _dbg_pstats
+_dbg_stream = _dbg_io.StringIO()
+_dbg_pstats.Stats(_dbg_profiler, stream=_dbg_stream).sort_stats('cumulative').print_stats({limit})
+print(_dbg_stream.getvalue())
+del _dbg_profiler, _dbg_stream"""
+
+# Leaves the kernel unprofiled when the generated code failed before the report cell ran
+SANDBOX_PROFILE_STOP = """if '_dbg_profiler' in globals():
+    _dbg_profiler.disable()
+    del _dbg_profiler"""
+
+
+def restart_kernel(sandbox: Sandbox):
+    """Restart the sandbox's Python kernels, stopping whatever they are still running"""
+    for context in sandbox.list_code_contexts():
+        if context.language == 'python':
+            sandbox.restart_code_context(context)
+
+
+class CappedOutput:
+    """Streamed output kept up to ``limit`` bytes; the rest is counted, not stored"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.parts: List[str] = []
+        self.size = 0
+        self.dropped = 0
+
+    def append(self, text: str):
+        data = text.encode('utf-8', errors='replace')
+        room = self.limit - self.size
+        if len(data) <= room:
+            self.parts.append(text)
+            self.size += len(data)
+            return
+        if room > 0:
+            self.parts.append(data[:room].decode('utf-8', errors='ignore'))
+            self.size = self.limit
+        self.dropped += len(data) - max(room, 0)
+
+    @property
+    def truncated(self) -> bool:
+        return self.dropped > 0
+
+    def text(self) -> str:
+        text = ''.join(self.parts)
+        if self.truncated:
+            text += f"\n… [output truncated: {self.dropped:,} more bytes]"
+        return text
+
+
+def artifact_size(result: Any) -> int:
+    """Approximate encoded size of one rich result (all of its formats)"""
+    formats = result.formats() if hasattr(result, 'formats') else []
+    return sum(len(str(getattr(result, fmt, None) or '')) for fmt in formats)
+
 class CodeExecutor:
-    def __init__(self):
+    def __init__(self, reporter: Optional[Reporter] = None, metric_prefix: str = ''):
         self.logger = logging.getLogger(__name__)
+        self.reporter = reporter or StreamlitReporter()
+        self.metrics = get_metrics()
+        self.metric_prefix = metric_prefix  # e.g. 'preview.' so sample runs don't count as answers
+        self.last_error: Optional[str] = None
+        self.last_profile: Optional[str] = None
     
-    def execute_code(self, e2b_code_interpreter: Sandbox, code: str) -> Tuple[Optional[List[Any]], str]:
-        """Execute Python code in E2B sandbox"""
+    def execute_code(self, e2b_code_interpreter: Sandbox, code: str, profile: bool = False,
+                     timeout: Optional[float] = None) -> Tuple[Optional[List[Any]], str]:
+        """Execute Python code in E2B sandbox within ``EXECUTION_BUDGET_CONFIG``
+
+        Stdout and stderr are streamed in and capped, the run is bounded by a
+        wall-clock timeout (after which the kernel is restarted), the kernel's
+        address space by a memory ceiling, and rich results by count and size.
+        With ``profile`` the code runs under ``cProfile`` inside the sandbox and
+        the statistics are kept in ``last_profile``. ``timeout`` overrides the
+        budget's wall-clock limit.
+        """
         
-        with st.spinner('🔧 Executing code in E2B sandbox...'):
-            try:
-                stdout_capture = io.StringIO()
-                stderr_capture = io.StringIO()
+        self.last_error = None
+        self.last_profile = None
+        budget = EXECUTION_BUDGET_CONFIG
+        timeout = timeout or budget['timeout']
+        self._run_helper_cell(e2b_code_interpreter, memory_limit_cell())
+        self._run_helper_cell(e2b_code_interpreter, setup_cell())
+        if profile:
+            self._run_helper_cell(e2b_code_interpreter, SANDBOX_PROFILE_START)
+        with self.reporter.stage('🔧 Executing code in E2B sandbox...'):
+            stdout = CappedOutput(budget['max_stdout_bytes'])
+            stderr = CappedOutput(budget['max_stderr_bytes'])
+            last_published = [0.0]
 
-                with contextlib.redirect_stdout(stdout_capture), contextlib.redirect_stderr(stderr_capture):
-                    with warnings.catch_warnings():
-                        warnings.simplefilter("ignore")
-                        exec_result = e2b_code_interpreter.run_code(code)
+            def on_stdout(message):
+                stdout.append(message.line)
+                # Live output for job views, throttled and only while it still grows
+                if not stdout.truncated and time.monotonic() - last_published[0] > 0.5:
+                    last_published[0] = time.monotonic()
+                    self.reporter.partial('stdout', stdout.text())
 
-                stderr_output = stderr_capture.getvalue()
-                stdout_output = stdout_capture.getvalue()
+            try:
+                exec_result = e2b_code_interpreter.run_code(
+                    code, on_stdout=on_stdout, on_stderr=lambda message: stderr.append(message.line),
+                    timeout=timeout
+                )
+                if profile:
+                    self.last_profile = self._run_helper_cell(
+                        e2b_code_interpreter, SANDBOX_PROFILE_REPORT.format(limit=PROFILER_CONFIG['stats_limit'])
+                    )
+            except TimeoutException as e:
+                self.logger.error(f"Code execution exceeded {timeout}s: {str(e)}")
+                self._budget_exceeded('timeout')
+                self._interrupt(e2b_code_interpreter)
+                self.last_error = f"TimeoutError: execution exceeded the {timeout:.0f}s budget and was stopped"
+                self._increment('execution.failed')
+                self.reporter.error(f"⏱️ {self.last_error}")
+                return None, stdout.text().strip()
+            except Exception as e:
+                self.last_error = str(e)
+                self._increment('execution.failed')
+                self.logger.error(f"Code execution error: {str(e)}")
+                self.reporter.error(f"❌ Code execution failed: {str(e)}")
+                return None, ""
+            finally:
+                if profile and self.last_profile is None:
+                    self._run_helper_cell(e2b_code_interpreter, SANDBOX_PROFILE_STOP)
+
+            for name, output in (('stdout', stdout), ('stderr', stderr)):
+                if output.truncated:
+                    self._budget_exceeded(name)
+            stderr_output = stderr.text()
+            stdout_output = stdout.text()
 
-                if stderr_output:
-                    st.error(f"⚠️ Error during execution:\n{stderr_output}")
-                    self.logger.error(f"Code execution error: {stderr_output}")
+            if stderr_output:
+                self.reporter.error(f"⚠️ Error during execution:\n{stderr_output}")
+                self.logger.error(f"Code execution error: {stderr_output}")
+            
+            if getattr(exec_result, 'error', None):
+                self.last_error = f"{exec_result.error.name}: {exec_result.error.value}"
+                if exec_result.error.name == 'MemoryError':
+                    self._budget_exceeded('memory')
+                self.reporter.error(f"⚠️ Error during execution:\n{self.last_error}")
+                self.logger.error(f"Code execution error: {self.last_error}")
+                self._increment('execution.failed')
+            else:
+                self._increment('execution.succeeded')
 
-                results = []
-                if exec_result.results:
-                    results.extend(exec_result.results)
-                if stdout_output.strip():
-                    results.append(stdout_output.strip())
+            results = self._within_artifact_budget(exec_result.results or [])
+            if not getattr(exec_result, 'error', None):
+                tables = self._collect_outputs(e2b_code_interpreter)
+                if any(table.name == 'result' for table in tables):
+                    # The cell's DataFrame value arrived as Arrow; drop its text/HTML rendering
+                    results = [result for result in results if not getattr(result, 'is_main_result', False)]
+                results = tables + results
+            if stdout_output.strip():
+                results.append(stdout_output.strip())
 
-                return results if results else None, stdout_output.strip()
-                
+            return results if results else None, stdout_output.strip()
+    
+    def _within_artifact_budget(self, results: List[Any]) -> List[Any]:
+        """Drop rich results over the size cap, then anything beyond the count cap"""
+        budget = EXECUTION_BUDGET_CONFIG
+        kept = []
+        for result in results:
+            if artifact_size(result) > budget['max_artifact_bytes']:
+                self._budget_exceeded('artifact_size')
+                self.reporter.warning(f"⚠️ An output larger than {budget['max_artifact_bytes'] // (1024 * 1024)} MB "
+                                      "was not displayed.")
+                continue
+            kept.append(result)
+        if len(kept) > budget['max_artifacts']:
+            self._budget_exceeded('artifacts')
+            self.reporter.warning(f"⚠️ Showing the first {budget['max_artifacts']} of {len(kept)} outputs.")
+            kept = kept[:budget['max_artifacts']]
+        return kept
+    
+    def _collect_outputs(self, e2b_code_interpreter: Sandbox) -> List[TableResult]:
+        """Tables the kernel serialized as Arrow IPC, plus the reports of charts built with the viz helpers"""
+        output = self._run_helper_cell(e2b_code_interpreter, collect_cell())
+        try:
+            collected = json.loads(output or '{}')
+        except ValueError:
+            self.logger.warning(f"Unexpected output from the sandbox collection cell: {output[:200]}")
+            return []
+        self._record_charts(collected.get('charts', []))
+        return self._read_tables(e2b_code_interpreter, collected.get('tables', []))
+    
+    def _read_tables(self, e2b_code_interpreter: Sandbox, descriptors: List[dict]) -> List[TableResult]:
+        """DataFrame results the kernel serialized as Arrow IPC, read back as bytes"""
+        tables = []
+        for descriptor in descriptors:
+            if 'path' not in descriptor:
+                if descriptor.get('skipped') == 'size':
+                    self._budget_exceeded('table_size')
+                    self.reporter.warning(f"⚠️ Table '{descriptor['name']}' is too large to transfer "
+                                          f"({descriptor['bytes'] / (1024 * 1024):.0f} MB).")
+                else:
+                    self.logger.warning(f"Table '{descriptor['name']}' not transferred: {descriptor.get('skipped')}")
+                continue
+            try:
+                data = e2b_code_interpreter.files.read(descriptor['path'], format='bytes')
+                tables.append(TableResult.from_ipc(descriptor['name'], data))
+                self._increment('tables.transferred')
+                self._observe('tables.bytes', len(data))
             except Exception as e:
-                self.logger.error(f"Code execution error: {str(e)}")
-                st.error(f"❌ Code execution failed: {str(e)}")
-                return None, ""
\ No newline at end of file
+                self.logger.warning(f"Could not read table '{descriptor['name']}' from the sandbox: {str(e)}")
+        return tables
+    
+    def _record_charts(self, reports: List[dict]):
+        """Points and estimated payload each large-data chart saved compared to plotting every row"""
+        for report in reports:
+            kind = report.get('kind', 'unknown')
+            self._increment('viz.charts', kind=kind)
+            self._increment('viz.points', report.get('points_in', 0), stage='before')
+            self._increment('viz.points', report.get('points_out', 0), stage='after')
+            self._increment('viz.payload_bytes', report.get('payload_before_bytes', 0), stage='before')
+            self._increment('viz.payload_bytes', report.get('payload_after_bytes', 0), stage='after')
+            self._observe('viz.build_ms', report.get('build_ms', 0.0), kind=kind)
+            self.logger.info(f"Chart '{kind}': {report.get('points_in', 0):,} → {report.get('points_out', 0):,} points, "
+                             f"~{report.get('payload_before_bytes', 0):,} → {report.get('payload_after_bytes', 0):,} "
+                             f"bytes in {report.get('build_ms', 0.0):.0f} ms")
+    
+    def _increment(self, name: str, value: float = 1, **labels):
+        self.metrics.increment(self.metric_prefix + name, value, **labels)
+    
+    def _observe(self, name: str, value: float, **labels):
+        self.metrics.observe(self.metric_prefix + name, value, **labels)
+    
+    def _budget_exceeded(self, budget: str):
+        self._increment('execution.budget_exceeded', budget=budget)
+    
+    def _interrupt(self, e2b_code_interpreter: Sandbox):
+        """Stop a runaway execution by restarting the kernel"""
+        try:
+            restart_kernel(e2b_code_interpreter)
+        except Exception as e:
+            self.logger.warning(f"Could not restart the sandbox kernel: {str(e)}")
+    
+    def _run_helper_cell(self, e2b_code_interpreter: Sandbox, cell: str) -> Optional[str]:
+        """Run a budget or profiling helper cell; its problems never fail the analysis"""
+        try:
+            result = e2b_code_interpreter.run_code(cell, timeout=EXECUTION_BUDGET_CONFIG['timeout'])
+            if getattr(result, 'error', None):
+                self.logger.warning(f"Sandbox helper cell failed: {result.error.name}: {result.error.value}")
+                return None
+            return ''.join(result.logs.stdout)
+        except Exception as e:
+            self.logger.warning(f"Sandbox helper cell failed: {str(e)}")
+            return None
\ No newline at end of file
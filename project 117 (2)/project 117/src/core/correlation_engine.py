@@ -0,0 +1,171 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import logging
+
+from src.utils.result_cache import get_result_cache
+from config.settings import CORRELATION_CONFIG
+
+try:
+    from scipy.cluster import hierarchy
+    from scipy.spatial.distance import squareform
+except ImportError:  # clustering falls back to spectral ordering
+    hierarchy = None
+
+
+class CorrelationEngine:
+    """Blocked correlation computation for wide numeric frames.
+
+    Column blocks are multiplied as dense matrices (BLAS) in a thread pool.
+    Missing values are handled pairwise like ``DataFrame.corr``, using masked
+    sums instead of per-pair Python loops. Spearman is Pearson on per-column ranks. Rows
+    are sampled above ``sample_rows``. Results are cached per dataset
+    fingerprint.
+    """
+
+    METHODS = ('pearson', 'spearman')
+
+    def __init__(self, block_size: Optional[int] = None, max_workers: Optional[int] = None,
+                 sample_rows: Optional[int] = None):
+        self.logger = logging.getLogger(__name__)
+        self.block_size = block_size or CORRELATION_CONFIG['block_size']
+        self.max_workers = max_workers or CORRELATION_CONFIG['max_workers']
+        self.sample_rows = sample_rows or CORRELATION_CONFIG['sample_rows']
+        self.result_cache = get_result_cache()
+
+    def correlation_matrix(self, df: pd.DataFrame, method: str = 'pearson',
+                           fingerprint: Optional[str] = None) -> pd.DataFrame:
+        """Full correlation matrix of the numeric columns"""
+        def compute():
+            values, columns = self._prepare(df, method)
+            matrix = np.empty((len(columns), len(columns)))
+            for start, block in self._map_blocks(values):
+                matrix[start:start + len(block)] = block
+            return pd.DataFrame(matrix, index=columns, columns=columns)
+
+        return self._cached(fingerprint, ('matrix', method), compute)
+
+    def top_pairs(self, df: pd.DataFrame, k: Optional[int] = None, method: str = 'pearson',
+                  fingerprint: Optional[str] = None) -> pd.DataFrame:
+        """The ``k`` most strongly correlated column pairs, without holding the full matrix"""
+        k = k or CORRELATION_CONFIG['top_k']
+
+        def compute():
+            values, columns = self._prepare(df, method)
+            candidates = []
+            for start, block in self._map_blocks(values):
+                # Upper triangle only: each pair once, no self-correlations
+                rows_in_block, cols = np.triu_indices(len(block), k=1, m=len(columns) - start)
+                cols = cols + start
+                strengths = block[rows_in_block, cols]
+                valid = ~np.isnan(strengths)
+                rows_in_block, cols, strengths = rows_in_block[valid], cols[valid], strengths[valid]
+                if len(strengths) > k:
+                    keep = np.argpartition(-np.abs(strengths), k)[:k]
+                    rows_in_block, cols, strengths = rows_in_block[keep], cols[keep], strengths[keep]
+                candidates.extend(zip(rows_in_block + start, cols, strengths))
+
+            candidates.sort(key=lambda item: -abs(item[2]))
+            return pd.DataFrame(
+                [(columns[i], columns[j], r) for i, j, r in candidates[:k]],
+                columns=['Column A', 'Column B', 'Correlation']
+            )
+
+        return self._cached(fingerprint, ('top_pairs', method, k), compute)
+
+    def clustered_matrix(self, df: pd.DataFrame, max_columns: Optional[int] = None, method: str = 'pearson',
+                         fingerprint: Optional[str] = None) -> pd.DataFrame:
+        """Correlation matrix of the most relevant columns, reordered by hierarchical clustering
+
+        Relevance is the mean absolute correlation of a column with all others.
+        """
+        max_columns = max_columns or CORRELATION_CONFIG['heatmap_max_columns']
+
+        def compute():
+            matrix = self.correlation_matrix(df, method, fingerprint)
+            strength = matrix.abs().fillna(0.0).to_numpy(copy=True)
+            np.fill_diagonal(strength, 0.0)
+            relevance = pd.Series(strength.mean(axis=1), index=matrix.index)
+            selected = relevance.nlargest(max_columns).index
+            subset = matrix.loc[selected, selected]
+            order = self._cluster_order(subset.abs().fillna(0.0).to_numpy())
+            labels = [selected[i] for i in order]
+            return subset.loc[labels, labels]
+
+        return self._cached(fingerprint, ('clustered', method, max_columns), compute)
+
+    def _cached(self, fingerprint: Optional[str], key: tuple, compute):
+        if fingerprint is None:
+            return compute()
+        return self.result_cache.get_or_compute((fingerprint, 'correlation') + key + (self.sample_rows,), compute)
+
+    def _prepare(self, df: pd.DataFrame, method: str) -> Tuple[np.ndarray, List[str]]:
+        """Sample rows, rank for Spearman and center the numeric columns"""
+        if method not in self.METHODS:
+            raise ValueError(f"Unsupported correlation method: {method}")
+        numeric_df = df.select_dtypes(include=['number'])
+        if len(numeric_df) > self.sample_rows:
+            numeric_df = numeric_df.sample(n=self.sample_rows, random_state=0)
+        if method == 'spearman':
+            numeric_df = numeric_df.rank()
+        values = numeric_df.to_numpy(dtype=np.float64, na_value=np.nan)
+        # Centering keeps the sum-of-products formulation numerically stable
+        values = values - np.nanmean(values, axis=0) if len(values) else values
+        return values, list(numeric_df.columns)
+
+    def _map_blocks(self, values: np.ndarray):
+        """Yield (first column, correlation rows) for each column block"""
+        mask = ~np.isnan(values)
+        has_missing = not mask.all()
+        filled = np.where(mask, values, 0.0)
+        squares = filled * filled
+        weights = mask.astype(np.float64)
+        n_columns = values.shape[1]
+        starts = list(range(0, n_columns, self.block_size))
+
+        def block(start: int) -> Tuple[int, np.ndarray]:
+            stop = min(start + self.block_size, n_columns)
+            x = filled[:, start:stop]
+            sxy = x.T @ filled
+            if has_missing:
+                # Sums restricted to rows where both columns of a pair are present
+                w = weights[:, start:stop]
+                n = w.T @ weights
+                sx = x.T @ weights
+                sy = w.T @ filled
+                sxx = squares[:, start:stop].T @ weights
+                syy = w.T @ squares
+            else:
+                n = float(len(values))
+                sx = x.sum(axis=0)[:, None]
+                sy = filled.sum(axis=0)[None, :]
+                sxx = squares[:, start:stop].sum(axis=0)[:, None]
+                syy = squares.sum(axis=0)[None, :]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                r = (n * sxy - sx * sy) / np.sqrt((n * sxx - sx * sx) * (n * syy - sy * sy))
+            r = np.clip(r, -1.0, 1.0)
+            r[np.broadcast_to(n < 2, r.shape)] = np.nan
+            return start, r
+
+        if len(starts) == 1 or self.max_workers <= 1:
+            for start in starts:
+                yield block(start)
+            return
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for result in pool.map(block, starts):
+                yield result
+
+    def _cluster_order(self, strength: np.ndarray) -> List[int]:
+        """Leaf order that places strongly correlated columns next to each other"""
+        if len(strength) < 3:
+            return list(range(len(strength)))
+        distance = 1.0 - strength
+        np.fill_diagonal(distance, 0.0)
+        if hierarchy is not None:
+            linkage = hierarchy.linkage(squareform(distance, checks=False), method='average')
+            return hierarchy.leaves_list(linkage).tolist()
+        # Spectral ordering by the Fiedler vector of the similarity graph
+        laplacian = np.diag(strength.sum(axis=1)) - strength
+        _, vectors = np.linalg.eigh(laplacian)
+        return np.argsort(vectors[:, 1]).tolist()
@@ -1,14 +1,28 @@
+import time
+import tracemalloc
+import contextlib
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Iterator
 import logging
 
+from src.utils.profiler import memory_tracing
+from config.settings import CLEANING_CONFIG
+
 class DataProcessor:
+    CLEANING_STEPS = ('dedupe', 'trim', 'coerce', 'impute')
+    
     def __init__(self):
         self.logger = logging.getLogger(__name__)
+        self.last_cleaning_report: List[Dict[str, Any]] = []
     
-    def analyze_dataframe(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """Analyze dataframe and return comprehensive information"""
+    def analyze_dataframe(self, df: pd.DataFrame, value_counts: Optional[Dict[str, pd.Series]] = None) -> Dict[str, Any]:
+        """Analyze dataframe and return comprehensive information
+
+        When a ``value_counts`` dict is passed it is filled with the full value
+        counts of every categorical column, so appended rows can later be folded
+        in by ``update_analysis`` without recounting the whole frame.
+        """
         try:
             analysis = {
                 'shape': df.shape,
@@ -29,7 +43,10 @@ class DataProcessor:
             if analysis['categorical_columns']:
                 analysis['categorical_summary'] = {}
                 for col in analysis['categorical_columns']:
-                    analysis['categorical_summary'][col] = df[col].value_counts().head().to_dict()
+                    counts = df[col].value_counts()
+                    if value_counts is not None:
+                        value_counts[col] = counts
+                    analysis['categorical_summary'][col] = counts.head().to_dict()
             
             return analysis
             
@@ -37,21 +54,218 @@ class DataProcessor:
             self.logger.error(f"Data analysis error: {str(e)}")
             return {}
     
-    def clean_data(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Basic data cleaning operations"""
+    def update_analysis(self, analysis: Dict[str, Any], df: pd.DataFrame, tail: pd.DataFrame,
+                        value_counts: Optional[Dict[str, pd.Series]] = None) -> Dict[str, Any]:
+        """Fold appended rows into an existing analysis instead of re-profiling
+
+        ``df`` is the combined frame and ``tail`` the rows appended to it. Counts,
+        means, standard deviations and extrema are merged from the cached values;
+        only the quartiles are recomputed on the numeric columns. Falls back to a
+        full ``analyze_dataframe`` whenever the schema changed.
+        """
         try:
-            # Remove duplicate rows
-            df_cleaned = df.drop_duplicates()
+            numeric_columns = df.select_dtypes(include=[np.number]).columns.tolist()
+            categorical_columns = df.select_dtypes(include=['object']).columns.tolist()
+            if (not analysis or list(df.columns) != analysis.get('columns')
+                    or numeric_columns != analysis.get('numeric_columns')
+                    or categorical_columns != analysis.get('categorical_columns')
+                    or (numeric_columns and 'numeric_summary' not in analysis)):
+                if value_counts is not None:
+                    value_counts.clear()
+                return self.analyze_dataframe(df, value_counts)
+            
+            updated = dict(analysis)
+            updated['shape'] = df.shape
+            updated['dtypes'] = df.dtypes.to_dict()
+            updated['memory_usage'] = analysis['memory_usage'] + tail.memory_usage(deep=True, index=False).sum()
+            tail_nulls = tail.isnull().sum()
+            updated['null_counts'] = {
+                col: int(count + tail_nulls.get(col, 0)) for col, count in analysis['null_counts'].items()
+            }
+            
+            if numeric_columns:
+                updated['numeric_summary'] = self._merge_numeric_summary(
+                    analysis['numeric_summary'], df[numeric_columns], tail[numeric_columns]
+                )
+            
+            if categorical_columns:
+                updated['categorical_summary'] = {}
+                for col in categorical_columns:
+                    if value_counts is not None and col in value_counts:
+                        counts = value_counts[col].add(tail[col].value_counts(), fill_value=0).astype('int64')
+                        counts = counts.sort_values(ascending=False, kind='stable')
+                        value_counts[col] = counts
+                    else:
+                        counts = df[col].value_counts()
+                    updated['categorical_summary'][col] = counts.head().to_dict()
             
-            # Handle missing values (basic strategy)
-            numeric_cols = df_cleaned.select_dtypes(include=[np.number]).columns
-            df_cleaned[numeric_cols] = df_cleaned[numeric_cols].fillna(df_cleaned[numeric_cols].median())
+            return updated
+            
+        except Exception as e:
+            self.logger.error(f"Incremental analysis error: {str(e)}")
+            return self.analyze_dataframe(df)
+    
+    def _merge_numeric_summary(self, summary: Dict[str, Dict[str, float]], numeric_df: pd.DataFrame,
+                               numeric_tail: pd.DataFrame) -> Dict[str, Dict[str, float]]:
+        """Merge cached describe() statistics with those of the appended rows"""
+        tail_count = numeric_tail.count()
+        tail_mean = numeric_tail.mean()
+        tail_m2 = numeric_tail.var(ddof=0) * tail_count
+        tail_min = numeric_tail.min()
+        tail_max = numeric_tail.max()
+        quartiles = numeric_df.quantile([0.25, 0.5, 0.75])
+        
+        merged = {}
+        for col in numeric_df.columns:
+            old = summary[col]
+            n_a, n_b = old['count'], float(tail_count[col])
+            n = n_a + n_b
+            stats = dict(old)
+            if n_b:
+                # Chan et al. pairwise update of the mean and sum of squared deviations
+                m2_a = (old['std'] ** 2) * (n_a - 1) if n_a > 1 else 0.0
+                delta = tail_mean[col] - old['mean'] if n_a else 0.0
+                mean = old['mean'] + delta * n_b / n if n_a else tail_mean[col]
+                m2 = m2_a + tail_m2[col] + delta ** 2 * n_a * n_b / n
+                stats.update({
+                    'count': n,
+                    'mean': mean,
+                    'std': np.sqrt(m2 / (n - 1)) if n > 1 else np.nan,
+                    'min': np.nanmin([old['min'], tail_min[col]]),
+                    'max': np.nanmax([old['max'], tail_max[col]]),
+                })
+            stats['25%'] = quartiles.at[0.25, col]
+            stats['50%'] = quartiles.at[0.5, col]
+            stats['75%'] = quartiles.at[0.75, col]
+            merged[col] = stats
+        return merged
+    
+    def clean_data(self, df: pd.DataFrame, steps: Optional[List[str]] = None, inplace: bool = False,
+                   chunk_size: Optional[int] = None) -> pd.DataFrame:
+        """Run the cleaning pipeline and return the cleaned frame
+
+        ``steps`` run in the given order and default to ``CLEANING_CONFIG['steps']``:
+        ``dedupe`` (drop duplicate rows by row hash), ``trim`` (strip whitespace in
+        text columns), ``coerce`` (text columns that are entirely numeric become
+        numeric) and ``impute`` (numeric medians, categorical modes). Columns are
+        replaced rather than written into, so the input is left untouched unless
+        ``inplace`` is set. Row hashing and trimming work ``chunk_size`` rows at a
+        time. Time and memory per step are stored in ``self.last_cleaning_report``.
+        """
+        steps = list(steps or CLEANING_CONFIG['steps'])
+        chunk_size = chunk_size or CLEANING_CONFIG['chunk_size']
+        self.last_cleaning_report = []
+        try:
+            unknown = [step for step in steps if step not in self.CLEANING_STEPS]
+            if unknown:
+                raise ValueError(f"Unknown cleaning steps: {unknown}")
             
-            categorical_cols = df_cleaned.select_dtypes(include=['object']).columns
-            df_cleaned[categorical_cols] = df_cleaned[categorical_cols].fillna(df_cleaned[categorical_cols].mode().iloc[0] if not df_cleaned[categorical_cols].mode().empty else 'Unknown')
+            df_cleaned = df if inplace else df.copy(deep=False)
+            for step in steps:
+                with self._measure_step(step, df_cleaned) as report:
+                    df_cleaned = getattr(self, f'_clean_{step}')(df_cleaned, inplace, chunk_size)
+                    report['rows_after'] = len(df_cleaned)
             
             return df_cleaned
             
         except Exception as e:
             self.logger.error(f"Data cleaning error: {str(e)}")
-            return df
\ No newline at end of file
+            return df
+    
+    def _clean_dedupe(self, df: pd.DataFrame, inplace: bool, chunk_size: int) -> pd.DataFrame:
+        """Drop duplicate rows, found by 64-bit row hashes and confirmed by comparing values"""
+        hashes = np.concatenate([
+            pd.util.hash_pandas_object(df.iloc[rows], index=False).to_numpy()
+            for rows in self._chunks(len(df), chunk_size)
+        ]) if len(df) else np.empty(0, dtype=np.uint64)
+        codes, _ = pd.factorize(hashes)
+        _, first_rows = np.unique(codes, return_index=True)
+        first = first_rows[codes]  # position of the first row with the same hash
+        candidates = np.flatnonzero(first != np.arange(len(df)))
+        if not len(candidates):
+            return df
+        
+        # A hash collision must not drop a distinct row, so candidates are compared with their first row
+        rows = df.iloc[candidates].reset_index(drop=True)
+        originals = df.iloc[first[candidates]].reset_index(drop=True)
+        same = ((rows == originals) | (rows.isna() & originals.isna())).all(axis=1).to_numpy()
+        duplicated = np.zeros(len(df), dtype=bool)
+        duplicated[candidates[same]] = True
+        if not duplicated.any():
+            return df
+        # Positions, not labels: with a repeated index a label drop would also remove the first rows
+        if inplace and df.index.is_unique:
+            df.drop(index=df.index[duplicated], inplace=True)
+            return df
+        return df.take(np.flatnonzero(~duplicated))
+    
+    def _clean_trim(self, df: pd.DataFrame, inplace: bool, chunk_size: int) -> pd.DataFrame:
+        """Strip surrounding whitespace from string values"""
+        for col in df.select_dtypes(include=['object']).columns:
+            values = df[col].to_numpy()
+            trimmed = np.empty(len(values), dtype=object)
+            for rows in self._chunks(len(values), chunk_size):
+                chunk = pd.Series(values[rows], dtype=object)
+                stripped = chunk.str.strip()
+                # Non-string values (NaN, numbers in mixed columns) are kept as they are
+                trimmed[rows] = stripped.where(stripped.notna(), chunk).to_numpy()
+            df[col] = trimmed
+        return df
+    
+    def _clean_coerce(self, df: pd.DataFrame, inplace: bool, chunk_size: int) -> pd.DataFrame:
+        """Convert text columns whose non-null values all parse as numbers"""
+        for col in df.select_dtypes(include=['object']).columns:
+            converted = pd.to_numeric(df[col], errors='coerce')
+            if converted.notna().sum() == df[col].notna().sum():
+                df[col] = converted
+        return df
+    
+    def _clean_impute(self, df: pd.DataFrame, inplace: bool, chunk_size: int) -> pd.DataFrame:
+        """Fill numeric gaps with medians and categorical gaps with modes, each computed once"""
+        null_counts = df.isnull().sum()
+        columns_with_nulls = null_counts[null_counts > 0].index
+        if columns_with_nulls.empty:
+            return df
+        
+        dtypes = df.dtypes[columns_with_nulls]
+        numeric_cols = [col for col, dtype in dtypes.items()
+                        if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)]
+        categorical_cols = [col for col, dtype in dtypes.items() if dtype == object]
+        fill_values = df[numeric_cols].median().to_dict() if numeric_cols else {}
+        for col in categorical_cols:
+            counts = df[col].value_counts()
+            if counts.empty:
+                fill_values[col] = 'Unknown'
+            else:
+                # Smallest of the most frequent values, matching Series.mode()
+                fill_values[col] = min(counts.index[counts.to_numpy() == counts.iloc[0]])
+        
+        for col, value in fill_values.items():
+            df[col] = df[col].fillna(value)
+        return df
+    
+    @contextlib.contextmanager
+    def _measure_step(self, step: str, df: pd.DataFrame) -> Iterator[Dict[str, Any]]:
+        """Record wall time and peak traced memory of one cleaning step"""
+        report = {'step': step, 'rows_before': len(df), 'rows_after': len(df)}
+        track_memory = CLEANING_CONFIG['track_memory']
+        # Shared with request profiling, which may be tracing on another thread
+        with memory_tracing() if track_memory else contextlib.nullcontext():
+            if track_memory:
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            try:
+                yield report
+            finally:
+                report['seconds'] = time.perf_counter() - start
+                if track_memory:
+                    report['peak_memory_bytes'] = max(0, tracemalloc.get_traced_memory()[1] - baseline)
+                self.last_cleaning_report.append(report)
+                self.logger.info(f"Cleaning step {step}: {report['seconds']:.3f}s, "
+                                 f"{report['rows_before']} -> {report['rows_after']} rows")
+    
+    @staticmethod
+    def _chunks(length: int, chunk_size: int) -> Iterator[slice]:
+        for start in range(0, length, max(1, chunk_size)):
+            yield slice(start, min(start + chunk_size, length))
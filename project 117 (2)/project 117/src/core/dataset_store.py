@@ -0,0 +1,195 @@
+import io
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+import pandas as pd
+import logging
+
+from src.core.data_processor import DataProcessor
+from src.core.rollup_cube import RollupCube
+from src.core.stratified_sample import StratifiedSample
+from src.core.timeseries_store import TimeSeriesIndex
+from config.settings import INGESTION_CONFIG
+
+# Cached frames are handed to every session as shallow copies; with copy-on-write
+# (the default from pandas 3) a write through one copy never reaches the others
+pd.set_option('mode.copy_on_write', True)
+
+
+def fingerprint_bytes(data: bytes) -> str:
+    """Content fingerprint of an uploaded file"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def dataframe_fingerprint(df: pd.DataFrame) -> str:
+    """Content fingerprint of an in-memory DataFrame"""
+    digest = hashlib.sha256(repr(list(df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+class DatasetStore:
+    """Cache of parsed and profiled uploads, keyed by content fingerprint.
+
+    A new upload whose bytes start with a cached upload (a file that only had
+    rows appended) is not re-parsed: only the tail is read, concatenated onto the
+    cached frame and folded into the cached profile, time-series index and
+    rollup cube. Large uploads also get a stratified sample for progressive
+    answers (redrawn from the full frame when rows are appended).
+
+    Entries are shared by every session, so each caller gets its own copy of
+    the entry dict with a copy-on-write view of ``df``: the data is only
+    copied if that caller modifies it. The derived structures are read-only.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.logger = logging.getLogger(__name__)
+        self.data_processor = DataProcessor()
+        self.max_entries = max_entries or INGESTION_CONFIG['max_cached_datasets']
+        self.probe_bytes = INGESTION_CONFIG['probe_bytes']
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Return a cached dataset entry by fingerprint"""
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is not None:
+                self._entries.move_to_end(fingerprint)
+        return self._handout(entry) if entry is not None else None
+
+    def ingest(self, name: str, data: bytes) -> Dict[str, Any]:
+        """Parse and profile an upload, reusing a cached prefix when possible"""
+        fingerprint = fingerprint_bytes(data)
+        cached = self.get(fingerprint)
+        if cached is not None:
+            return cached
+
+        entry = None
+        parent = self._find_prefix(name, data)
+        if parent is not None:
+            try:
+                entry = self._extend(parent, name, data, fingerprint)
+            except Exception as e:
+                self.logger.warning(f"Incremental ingestion failed, re-parsing {name}: {str(e)}")
+        if entry is None:
+            entry = self._load(name, data, fingerprint)
+
+        with self._lock:
+            self._entries[fingerprint] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return self._handout(entry)
+
+    @staticmethod
+    def _handout(entry: Dict[str, Any]) -> Dict[str, Any]:
+        """A caller's copy of a cached entry; its ``df`` shares the cached data until written to"""
+        return dict(entry, df=entry['df'].copy(deep=False))
+
+    def _find_prefix(self, name: str, data: bytes) -> Optional[Dict[str, Any]]:
+        """Find the largest cached upload that ``data`` strictly extends"""
+        with self._lock:
+            candidates = [
+                entry for entry in self._entries.values()
+                if entry['size'] < len(data) and entry['ends_with_newline']
+            ]
+        # Same file name first, then largest prefix first
+        candidates.sort(key=lambda entry: (entry['name'] != name, -entry['size']))
+
+        view = memoryview(data)
+        for entry in candidates:
+            size = entry['size']
+            if data[:len(entry['head'])] != entry['head'] or data[size - len(entry['tail']):size] != entry['tail']:
+                continue
+            if hashlib.sha256(view[:size]).hexdigest() == entry['fingerprint']:
+                return entry
+        return None
+
+    def _new_entry(self, name: str, data: bytes, fingerprint: str) -> Dict[str, Any]:
+        return {
+            'fingerprint': fingerprint,
+            'name': name,
+            'size': len(data),
+            'ends_with_newline': data.endswith(b'\n'),
+            'head': data[:self.probe_bytes],
+            'tail': data[-self.probe_bytes:],
+            'parent': None,
+            'offset': 0,
+            'appended_rows': 0,
+        }
+
+    def _load(self, name: str, data: bytes, fingerprint: str) -> Dict[str, Any]:
+        """Full parse and profile of an upload"""
+        df = pd.read_csv(io.BytesIO(data))
+        value_counts: Dict[str, pd.Series] = {}
+        entry = self._new_entry(name, data, fingerprint)
+        entry['df'] = df
+        entry['analysis'] = self.data_processor.analyze_dataframe(df, value_counts)
+        entry['value_counts'] = value_counts
+        entry['timeseries'] = self._derive('time-series index', lambda: TimeSeriesIndex.from_frame(df), name)
+        entry['cube'] = self._derive(
+            'rollup cube', lambda: RollupCube.from_frame(df, entry['analysis'], value_counts), name
+        )
+        entry['sample'] = self._derive(
+            'stratified sample', lambda: StratifiedSample.from_frame(df, entry['analysis'], value_counts), name
+        )
+        return entry
+
+    def _extend(self, parent: Dict[str, Any], name: str, data: bytes, fingerprint: str) -> Dict[str, Any]:
+        """Parse only the appended rows and merge them into the parent entry"""
+        base = parent['df']
+        tail_bytes = data[parent['size']:]
+        if tail_bytes.strip():
+            # Keep text columns as text so a tail of digit-only values does not
+            # turn into integers next to the cached strings
+            text_columns = {i: 'object' for i, dtype in enumerate(base.dtypes) if dtype == object}
+            tail = pd.read_csv(io.BytesIO(tail_bytes), header=None, dtype=text_columns)
+            if tail.shape[1] != base.shape[1]:
+                raise ValueError(f"appended rows have {tail.shape[1]} fields, expected {base.shape[1]}")
+            tail.columns = base.columns
+        else:
+            tail = base.iloc[0:0]
+
+        df = pd.concat([base, tail], ignore_index=True)
+        value_counts = {col: counts for col, counts in parent['value_counts'].items()}
+        timeseries, cube = parent.get('timeseries'), parent.get('cube')
+        analysis = self.data_processor.update_analysis(parent['analysis'], df, tail, value_counts)
+        entry = self._new_entry(name, data, fingerprint)
+        entry.update({
+            'df': df,
+            'analysis': analysis,
+            'value_counts': value_counts,
+            'timeseries': self._derive('time-series index', (lambda: timeseries.extended(tail))
+                                       if timeseries is not None else (lambda: TimeSeriesIndex.from_frame(df)), name),
+            'cube': self._derive('rollup cube', (lambda: cube.merged(tail)) if cube is not None
+                                 else (lambda: RollupCube.from_frame(df, analysis, value_counts)), name),
+            'sample': self._derive('stratified sample',
+                                   lambda: StratifiedSample.from_frame(df, analysis, value_counts), name),
+            'parent': parent['fingerprint'],
+            'offset': parent['size'],
+            'appended_rows': len(tail),
+        })
+        self.logger.info(f"Appended {len(tail)} rows to cached dataset {name}")
+        return entry
+
+    def _derive(self, what: str, build, name: str) -> Any:
+        """A structure derived from an upload; a failure only disables that structure, not the upload"""
+        try:
+            return build()
+        except Exception as e:
+            self.logger.warning(f"Could not build the {what} for {name}: {str(e)}")
+            return None
+
+
+_default_store: Optional[DatasetStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_dataset_store() -> DatasetStore:
+    """Process-wide dataset store shared by all Streamlit sessions"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = DatasetStore()
+        return _default_store
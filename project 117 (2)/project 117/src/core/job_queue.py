@@ -0,0 +1,227 @@
+import contextlib
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Dict, List, Any, Iterator, Optional
+import logging
+
+from src.core.reporting import Reporter
+from src.utils.metrics import get_metrics, MetricsRecorder
+from src.utils.structured_logging import new_trace, stage_timings
+from config.settings import JOB_CONFIG
+
+ACTIVE_STATUSES = ('pending', 'running')
+
+
+class JobCancelled(BaseException):
+    """Raised inside a job at its next checkpoint after ``cancel``.
+
+    Like ``asyncio.CancelledError`` it is not an ``Exception``, so the broad
+    ``except Exception`` handlers in the pipeline do not swallow it.
+    """
+
+
+class JobReporter(Reporter):
+    """Reporter handed to a job: records progress, messages and partial results in the store.
+
+    Every call is also a cancellation checkpoint.
+    """
+
+    def __init__(self, queue: 'JobQueue', job_id: str):
+        self.queue = queue
+        self.id = job_id
+        self._cancel_callbacks: List[Callable[[], None]] = []
+
+    def check_cancelled(self):
+        if self.queue._is_cancel_requested(self.id):
+            raise JobCancelled(self.id)
+
+    def on_cancel(self, callback: Callable[[], None]):
+        """Run ``callback`` (e.g. kill the sandbox) as soon as the job is cancelled"""
+        self._cancel_callbacks.append(callback)
+        if self.queue._is_cancel_requested(self.id):
+            callback()
+
+    def info(self, message: str):
+        self._message('info', message)
+
+    def warning(self, message: str):
+        self._message('warning', message)
+
+    def error(self, message: str):
+        self._message('error', message)
+
+    def progress(self, message: str):
+        """Record the step the job has reached"""
+        self.check_cancelled()
+        self.queue._update(self.id, lambda job: job['progress'].append(message))
+
+    def partial(self, name: str, value: Any):
+        self.check_cancelled()
+        self.queue._update(self.id, lambda job: job['partial'].__setitem__(name, value))
+
+    @contextlib.contextmanager
+    def stage(self, message: str) -> Iterator[None]:
+        self.progress(message)
+        yield
+        self.check_cancelled()
+
+    def _message(self, level: str, message: str):
+        self.check_cancelled()
+        self.queue._update(self.id, lambda job: job['messages'].append((level, message)))
+
+
+class JobQueue:
+    """Runs analyses on a worker thread pool, independent of Streamlit reruns.
+
+    ``submit`` returns a job id immediately. The job function receives a
+    ``JobReporter`` and writes progress, messages and partial results into the
+    shared store, which the UI polls with ``get``. Workers are threads because
+    the pipeline waits on the LLM provider and the E2B sandbox, not on local
+    CPU. Cancellation is cooperative (at the job's next checkpoint) plus any
+    ``on_cancel`` callbacks the job registered.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, metrics: Optional[MetricsRecorder] = None):
+        self.logger = logging.getLogger(__name__)
+        self.metrics = metrics or get_metrics()
+        self.max_workers = max_workers or JOB_CONFIG['max_workers']
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='analysis-job')
+        self._jobs: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._futures: Dict[str, Future] = {}
+        self._reporters: Dict[str, JobReporter] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable[[JobReporter], Any], owner: Optional[str] = None, description: str = "") -> str:
+        """Queue ``fn(reporter)`` and return its job id"""
+        job_id = uuid.uuid4().hex[:12]
+        reporter = JobReporter(self, job_id)
+        with self._lock:
+            self._jobs[job_id] = {
+                'id': job_id, 'owner': owner, 'description': description, 'status': 'pending',
+                'progress': [], 'messages': [], 'partial': {}, 'result': None, 'error': None,
+                'cancel_requested': False, 'submitted': time.time(), 'started': None, 'finished': None,
+            }
+            self._reporters[job_id] = reporter
+            self._futures[job_id] = self._pool.submit(self._run, job_id, fn, reporter)
+            self._prune()
+        self.metrics.increment('jobs.submitted')
+        self._record_gauges()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Snapshot of a job's state (safe to read while the job runs)"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            result = job['result']
+            snapshot = copy.deepcopy({key: value for key, value in job.items() if key != 'result'})
+        snapshot['result'] = result  # results hold sandbox objects; shared, not copied
+        return snapshot
+
+    def jobs_for(self, owner: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            ids = [job_id for job_id, job in self._jobs.items() if job['owner'] == owner]
+        return [self.get(job_id) for job_id in ids]
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a pending job or ask a running one to stop; False if it already finished"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['status'] not in ACTIVE_STATUSES:
+                return False
+            job['cancel_requested'] = True
+            future = self._futures.get(job_id)
+            reporter = self._reporters.get(job_id)
+            if future is not None and future.cancel():
+                self._finish(job, 'cancelled')
+        if reporter is not None:
+            for callback in list(reporter._cancel_callbacks):
+                try:
+                    callback()
+                except Exception as e:
+                    self.logger.warning(f"Cancel callback of job {job_id} failed: {str(e)}")
+        self._record_gauges()
+        return True
+
+    def _run(self, job_id: str, fn: Callable[[JobReporter], Any], reporter: JobReporter):
+        # The job id doubles as the trace id, so log lines can be joined to the job
+        with new_trace(job_id):
+            self._run_traced(job_id, fn, reporter)
+            with self._lock:
+                status = self._jobs[job_id]['status'] if job_id in self._jobs else 'pruned'
+            self.logger.info(f"Job {job_id} {status}", extra={'job_status': status, 'stage_timings_ms': stage_timings()})
+
+    def _run_traced(self, job_id: str, fn: Callable[[JobReporter], Any], reporter: JobReporter):
+        with self._lock:
+            job = self._jobs[job_id]
+            job['status'] = 'running'
+            job['started'] = time.time()
+        self._record_gauges()
+        try:
+            reporter.check_cancelled()
+            result = fn(reporter)
+            reporter.check_cancelled()
+            with self._lock:
+                job['result'] = result
+                self._finish(job, 'completed')
+        except JobCancelled:
+            with self._lock:
+                self._finish(job, 'cancelled')
+        except Exception as e:
+            self.logger.error(f"Job {job_id} failed: {str(e)}")
+            with self._lock:
+                job['error'] = str(e)
+                self._finish(job, 'failed')
+        finally:
+            self._record_gauges()
+
+    def _finish(self, job: Dict[str, Any], status: str):
+        """Mark a job finished; caller holds the lock"""
+        job['status'] = status
+        job['finished'] = time.time()
+        self._futures.pop(job['id'], None)
+        self._reporters.pop(job['id'], None)
+        self.metrics.increment(f'jobs.{status}')
+        if job['started'] is not None:
+            self.metrics.observe('jobs.duration', job['finished'] - job['started'])
+
+    def _update(self, job_id: str, change: Callable[[Dict[str, Any]], None]):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                change(job)
+
+    def _is_cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job is not None and job['cancel_requested']
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond ``max_finished_jobs``; caller holds the lock"""
+        finished = [job_id for job_id, job in self._jobs.items() if job['status'] not in ACTIVE_STATUSES]
+        for job_id in finished[:max(0, len(finished) - JOB_CONFIG['max_finished_jobs'])]:
+            del self._jobs[job_id]
+
+    def _record_gauges(self):
+        with self._lock:
+            statuses = [job['status'] for job in self._jobs.values()]
+        self.metrics.set_gauge('jobs.pending', statuses.count('pending'))
+        self.metrics.set_gauge('jobs.running', statuses.count('running'))
+
+
+_default_job_queue: Optional[JobQueue] = None
+_default_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Process-wide job queue shared by every Streamlit session"""
+    global _default_job_queue
+    with _default_job_queue_lock:
+        if _default_job_queue is None:
+            _default_job_queue = JobQueue()
+        return _default_job_queue
@@ -1,22 +1,88 @@
+import contextvars
 import re
+import threading
+import time
 import warnings
-from typing import Optional, List, Any, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeoutError
+from typing import Optional, List, Any, Tuple, Dict
 import streamlit as st
 from together import Together
 from e2b_code_interpreter import Sandbox
-from src.core.code_executor import CodeExecutor
+from src.core.code_executor import CodeExecutor, restart_kernel
+from src.core.reporting import Reporter, StreamlitReporter
+from src.core.model_router import get_model_router
+from src.core.preflight import PreflightChecker
+from src.core.request_scheduler import get_request_scheduler
+from src.core.sql_engine import get_sql_engine
+from src.core.table_results import TableResult
 from src.utils.code_parser import CodeParser
-from config.settings import API_CONFIG
+from src.utils.metrics import get_metrics
+from src.utils.structured_logging import trace_stage
+from config.models import TOGETHER_MODELS, AUTO_MODEL_ID
+from config.settings import API_CONFIG, PREFLIGHT_CONFIG, PROGRESSIVE_CONFIG, RACING_CONFIG, SCHEDULER_CONFIG
 import logging
 
+def request_options() -> Dict[str, Any]:
+    """The current session's LLM settings, captured on the script thread"""
+    return {
+        'together_api_key': st.session_state.together_api_key,
+        'model_name': st.session_state.model_name,
+        'race_mode': bool(st.session_state.get('race_mode')),
+        'race_models': st.session_state.get('race_models') or RACING_CONFIG['partners'],
+        'sql_mode': bool(st.session_state.get('sql_mode')),
+        'progressive': bool(st.session_state.get('progressive_mode')),
+        'debug_mode': bool(st.session_state.get('debug_mode')),
+        'profile_sandbox': bool(st.session_state.get('debug_mode') and st.session_state.get('profile_sandbox')),
+    }
+
 class LLMClient:
-    def __init__(self):
-        self.code_executor = CodeExecutor()
+    def __init__(self, reporter: Optional[Reporter] = None):
+        self.reporter = reporter or StreamlitReporter()
+        self.code_executor = CodeExecutor(self.reporter)
+        # Sample runs report nothing themselves and count under their own metric names;
+        # failures there only cost the preview
+        self.preview_executor = CodeExecutor(Reporter(), metric_prefix='preview.')
         self.code_parser = CodeParser()
+        self.preflight = PreflightChecker()
+        self.metrics = get_metrics()
+        self.router = get_model_router()
+        self.scheduler = get_request_scheduler()
+        self.sql_engine = get_sql_engine()
+        self.sql_tables: List[str] = []
+        self.answer_language = 'python'  # 'sql' when the last answer ran on the SQL engine
+        self.sample: Optional[Dict[str, Any]] = None
+        self.dataset_path = ""
+        self.session = False  # code runs in a persistent session kernel
+        self.ran_code = False  # generated code of this question has been executed
+        self.profile_sandbox = False
         self.logger = logging.getLogger(__name__)
     
-    def chat_with_llm(self, e2b_code_interpreter: Sandbox, user_message: str, dataset_path: str) -> Tuple[Optional[List[Any]], str, str]:
-        """Chat with LLM and execute generated code"""
+    def chat_with_llm(self, e2b_code_interpreter: Sandbox, user_message: str, dataset_path: str,
+                      session_context: Optional[Dict[str, Any]] = None,
+                      schema: Optional[List[str]] = None,
+                      options: Optional[Dict[str, Any]] = None,
+                      bars: Optional[Dict[str, Dict[str, Any]]] = None,
+                      sql_tables: Optional[List[str]] = None,
+                      sample: Optional[Dict[str, Any]] = None) -> Tuple[Optional[List[Any]], str, str]:
+        """Chat with LLM and execute generated code
+
+        ``session_context`` describes a persistent kernel (see ``SessionKernel``):
+        the variables it already holds and the recent questions asked in it.
+        Generated code goes through ``PreflightChecker`` against ``schema`` (the
+        dataset's columns) first; code it cannot repair is sent back to the LLM
+        instead of to the sandbox, and code that passes is run through the
+        ``CodeParser`` optimizer. With the "Auto" model selection the question
+        is routed by ``ModelRouter`` and escalated to larger models on failure.
+        In race mode several models answer at once and the first runnable
+        answer wins (see ``_race``). ``bars`` lists the pre-aggregated OHLCV
+        levels uploaded next to the dataset (see ``FileHandler.upload_bars``).
+        ``sql_tables`` are fingerprints of uploads registered with the
+        ``SQLEngine``: the LLM may then answer relational questions with a SQL
+        query, which runs on the host instead of in the sandbox. With a
+        ``sample`` (see ``FileHandler.upload_sample``) code is first run on the
+        dataset's stratified sample and the approximate results are reported as
+        the ``preview`` partial before the full-data run.
+        """
         
         system_prompt = f"""You're a Python data scientist and data visualization expert. You are given a dataset at path '{dataset_path}' and also the user's query.
 You need to analyze the dataset and answer the user's query with a response and you run Python code to solve them.
@@ -29,36 +95,389 @@ Guidelines:
 - Provide clear, executable Python code
 - Include proper error handling
 - Show results and insights from the analysis
+- To show a table, end the code with the DataFrame itself (not print(df)); for several tables call publish_table(df, "name") (already defined)
+- For charts of more than a few thousand points use the large-data helpers (already defined; they return Plotly figures): plot_timeseries(df, x, y, method="lttb" or "minmax"), plot_scatter(df, x, y), hexbin_figure(df, x, y), datashade_figure(df, x, y), to_webgl(fig)
 """
+        if session_context is not None:
+            system_prompt += self._session_prompt(session_context)
+        if bars:
+            system_prompt += self._bars_prompt(bars)
+        self.sql_tables = list(sql_tables or []) if self.sql_engine.available else []
+        self.answer_language = 'python'
+        if self.sql_tables:
+            system_prompt += self._sql_prompt(self.sql_engine.describe(self.sql_tables))
 
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_message},
-        ]
+        messages = [{"role": "system", "content": system_prompt}]
+        for turn in (session_context or {}).get('history', []):
+            messages.append({"role": "user", "content": turn['question']})
+            messages.append({"role": "assistant", "content": f"```python\n{turn['code']}\n```"})
+        messages.append({"role": "user", "content": user_message})
 
-        with st.spinner('🤖 Getting response from Together AI LLM model...'):
+        options = options or request_options()
+        self.profile_sandbox = bool(options.get('profile_sandbox'))
+        self.sample, self.dataset_path = sample, dataset_path
+        self.session = session_context is not None
+        self.ran_code = False
+        if options['model_name'] == AUTO_MODEL_ID:
+            complexity, models = self.router.route(user_message)
+            self.logger.info(f"Routing {complexity} question to {models}")
+        else:
+            models = [options['model_name']]
+
+        started = time.monotonic()
+        with self.reporter.stage('🤖 Getting response from Together AI LLM model...'):
             try:
-                client = Together(api_key=st.session_state.together_api_key)
-                response = client.chat.completions.create(
-                    model=st.session_state.model_name,
+                # Retries and deadlines are handled by the scheduler
+                client = Together(api_key=options['together_api_key'],
+                                  timeout=SCHEDULER_CONFIG['request_timeout'], max_retries=0)
+                if options['race_mode']:
+                    # Routed or selected, the first model races its partners instead of escalating
+                    return self._race(client, self._racers(models[:1], options['race_models']), messages,
+                                      e2b_code_interpreter, dataset_path, schema)
+                answer = (None, "", "")
+                for index, model in enumerate(models):
+                    if index:
+                        if self.ran_code:
+                            if self.session:
+                                # Restarting would lose the session's state, which the failed code may have changed
+                                self.logger.info("Not escalating: the failed code already ran in the session kernel")
+                                break
+                            self._reset_kernel(e2b_code_interpreter)
+                        self.metrics.increment('router.escalations')
+                        self.reporter.info(f"↗️ Retrying with a larger model: {model}")
+                    answer, success = self._answer_with_model(
+                        client, model, list(messages), e2b_code_interpreter, dataset_path, schema,
+                        last_model=index == len(models) - 1
+                    )
+                    if success:
+                        break
+                return answer
+                    
+            except Exception as e:
+                self.logger.error(f"LLM API error: {str(e)}")
+                self.reporter.error(f"❌ Error communicating with LLM: {str(e)}")
+                return None, "", ""
+            finally:
+                # Baseline for the latency local answers save (see ``LocalAnswerer``)
+                self.metrics.observe('llm.answer_latency', time.monotonic() - started)
+    
+    def _answer_with_model(self, client: Together, model: str, messages: List[Dict[str, str]],
+                           e2b_code_interpreter: Sandbox, dataset_path: str, schema: Optional[List[str]],
+                           last_model: bool = True) -> Tuple[Tuple[Optional[List[Any]], str, str], bool]:
+        """Ask one model (with pre-flight retries) and run its code; returns the answer and whether it ran"""
+        python_code = ""
+        for attempt in range(PREFLIGHT_CONFIG['max_retries'] + 1):
+            response, _ = self._complete(client, model, messages)
+
+            response_message = response.choices[0].message
+            self.reporter.partial('response', response_message.content)
+            python_code = self.code_parser.match_code_blocks(response_message.content)
+            sql = self._match_sql(response_message.content) if not python_code else ""
+            if sql:
+                code_results, error = self._run_sql(model, sql)
+                if error is None:
+                    return (code_results, response_message.content, sql), True
+                self.logger.warning(f"Generated SQL failed: {error}")
+                if attempt == PREFLIGHT_CONFIG['max_retries']:
+                    if last_model:
+                        self.reporter.warning(f"⚠️ Generated SQL failed: {error}")
+                    return (None, response_message.content, sql), False
+                messages.append({"role": "assistant", "content": response_message.content})
+                messages.append({"role": "user", "content": self._sql_feedback(error)})
+                continue
+            if not python_code:
+                break
+
+            preflight = self.preflight.check(python_code, dataset_path, schema, session=self.session)
+            if preflight['repairs']:
+                self.metrics.increment('preflight.repaired')
+                self.logger.info(f"Pre-flight repairs: {preflight['repairs']}")
+            if preflight['ok']:
+                python_code = preflight['code']
+                break
+
+            self.metrics.increment('preflight.rejected')
+            self.logger.warning(f"Pre-flight rejected generated code: {preflight['issues']}")
+            if attempt == PREFLIGHT_CONFIG['max_retries']:
+                self.router.record_outcome(model, False)
+                if last_model:
+                    self.reporter.warning("⚠️ Generated code failed pre-flight checks:\n" +
+                               "\n".join(f"- {issue}" for issue in preflight['issues']))
+                return (None, response_message.content, python_code), False
+            messages.append({"role": "assistant", "content": response_message.content})
+            messages.append({"role": "user", "content": self._preflight_feedback(preflight['issues'])})
+
+        if not python_code:
+            self.router.record_outcome(model, False)
+            if last_model:
+                self.reporter.warning(f"⚠️ No Python or SQL code block detected in LLM's response." if self.sql_tables
+                                      else f"⚠️ No Python code block detected in LLM's response.")
+            return (None, response_message.content, ""), False
+
+        python_code, code_results, success = self._run_code(e2b_code_interpreter, model, python_code)
+        return (code_results, response_message.content, python_code), success
+    
+    def _complete(self, client: Together, model: str, messages: List[Dict[str, str]]) -> Tuple[Any, float]:
+        """One chat completion (through the shared ``RequestScheduler``) and its latency"""
+        started = time.perf_counter()
+        with trace_stage('llm_completion', self.logger):
+            response = self.scheduler.submit(
+                str(getattr(client, 'api_key', '')), model,
+                lambda: client.chat.completions.create(
+                    model=model,
                     messages=messages,
                     max_tokens=API_CONFIG['max_tokens'],
                     temperature=API_CONFIG['temperature']
                 )
+            )
+        latency = time.perf_counter() - started
+        self.router.record_latency(model, latency)
+        return response, latency
+    
+    def _run_code(self, e2b_code_interpreter: Sandbox, model: str, python_code: str) -> Tuple[str, Optional[List[Any]], bool]:
+        """Optimize and execute code that passed pre-flight; returns the code run, its results and success"""
+        python_code, optimizer_warnings = self.code_parser.optimize_code(python_code)
+        for warning in optimizer_warnings:
+            self.metrics.increment('optimizer.warnings')
+            self.logger.warning(f"Performance: {warning}")
+        self.reporter.partial('code', python_code)
+        self.ran_code = True
+        if self.sample is not None:
+            # A preview of earlier code (before escalation or from another candidate) no longer applies
+            self.reporter.partial('preview', None)
+            self._run_preview(e2b_code_interpreter, python_code)
+        started = time.perf_counter()
+        with trace_stage('execution', self.logger):
+            code_results, stdout_output = self.code_executor.execute_code(
+                e2b_code_interpreter, python_code, profile=self.profile_sandbox
+            )
+        if self.code_executor.last_profile:
+            self.reporter.partial('sandbox_profile', self.code_executor.last_profile)
+        success = self.code_executor.last_error is None
+        if self.sample is not None and success:
+            self.metrics.observe('progressive.full_latency', time.perf_counter() - started)
+        self.router.record_outcome(model, success)
+        if success:
+            self.metrics.increment('questions.answered')
+        return python_code, code_results, success
+    
+    def _run_preview(self, e2b_code_interpreter: Sandbox, python_code: str):
+        """Run the code on the stratified sample and report the approximate results as the ``preview`` partial"""
+        sample_code = self.preflight.replace_path(python_code, self.dataset_path, self.sample['path'])
+        if sample_code is None:
+            return
+        sample = self.sample['sample']
+        started = time.perf_counter()
+        with self.reporter.stage(f"🔭 Previewing on a stratified sample ({sample.describe()})..."):
+            with trace_stage('preview_execution', self.logger):
+                code_results, _ = self.preview_executor.execute_code(
+                    e2b_code_interpreter, sample_code, timeout=PROGRESSIVE_CONFIG['preview_timeout']
+                )
+        if self.preview_executor.last_error is not None or not code_results:
+            self.metrics.increment('progressive.preview_failed')
+            self.logger.info(f"No preview from the sample: {self.preview_executor.last_error or 'no output'}")
+            return
+        elapsed = time.perf_counter() - started
+        self.metrics.increment('progressive.previews')
+        self.metrics.observe('progressive.preview_latency', elapsed)
+        self.reporter.partial('preview', {
+            'results': sample.annotate_results(code_results),
+            'note': f"Approximate answer from {sample.describe()} in {elapsed:.1f}s; the full-data run continues "
+                    f"and replaces it when it finishes. Columns recognized as means or sums are scaled to the "
+                    f"full data with 95% bounds; other values are as computed on the sample.",
+        })
+    
+    def _match_sql(self, content: str) -> str:
+        """The response's SQL query, when SQL engine mode is on"""
+        return self.code_parser.match_sql_blocks(content) if self.sql_tables else ""
+    
+    def _run_sql(self, model: str, sql: str) -> Tuple[Optional[List[Any]], Optional[str]]:
+        """Run generated SQL with the ``SQLEngine``; returns the result table or the error"""
+        self.reporter.partial('code', sql)
+        try:
+            with trace_stage('sql_execution', self.logger):
+                table = self.sql_engine.query(sql, self.sql_tables)
+        except Exception as e:
+            self.router.record_outcome(model, False)
+            return None, str(e)
+        self.router.record_outcome(model, True)
+        self.metrics.increment('questions.answered')
+        self.answer_language = 'sql'
+        return [TableResult.from_arrow('result', table)], None
+    
+    def _racers(self, models: List[str], partners: List[str]) -> List[str]:
+        """The selected (or routed) models followed by the racing partners, without duplicates"""
+        racers = []
+        for model in models + [TOGETHER_MODELS[name] for name in partners]:
+            if model not in racers:
+                racers.append(model)
+        return racers[:RACING_CONFIG['max_models']]
+    
+    def _race(self, client: Together, models: List[str], messages: List[Dict[str, str]],
+              e2b_code_interpreter: Sandbox, dataset_path: str,
+              schema: Optional[List[str]]) -> Tuple[Optional[List[Any]], str, str]:
+        """Send the prompt to all ``models`` at once; the first answer whose code passes
+        pre-flight and executes successfully wins and the other requests are abandoned
 
-                response_message = response.choices[0].message
-                python_code = self.code_parser.match_code_blocks(response_message.content)
+        Completions arrive concurrently but run in the sandbox one at a time, in
+        arrival order; the kernel is restarted between candidates so one that
+        failed half-way leaves nothing behind for the next. A session kernel
+        cannot be restarted without losing its state, so there only the first
+        candidate that reaches the sandbox is run. Losers that finish later
+        still report their token usage, and when the first model (the one that
+        would have been used without racing) loses, the time it would have
+        taken is recorded as latency saved.
+        """
+        race = ','.join(sorted(models))
+        self.metrics.increment('race.runs', race=race)
+        primary = models[0]
+        state = {'winner': None, 'winner_latency': None}
+        lock = threading.Lock()
 
-                if python_code:
-                    code_results, stdout_output = self.code_executor.execute_code(
-                        e2b_code_interpreter, python_code
-                    )
-                    return code_results, response_message.content, python_code
+        def account_late(future, model):
+            if future.cancelled() or future.exception() is not None:
+                return
+            response, latency = future.result()
+            self.metrics.increment('race.extra_tokens', self._tokens(response), race=race, model=model)
+            with lock:
+                winner_latency = state['winner_latency']
+            if model == primary and winner_latency is not None:
+                self.metrics.observe('race.latency_saved', max(0.0, latency - winner_latency), race=race)
+
+        pool = ThreadPoolExecutor(max_workers=len(models))
+        futures = {pool.submit(contextvars.copy_context().run, self._complete, client, model, list(messages)): model
+                   for model in models}
+        answer = (None, "", "")
+        handled = set()
+        try:
+            for future in as_completed(futures, timeout=RACING_CONFIG['timeout']):
+                model = futures[future]
+                handled.add(future)
+                try:
+                    response, latency = future.result()
+                except Exception as e:
+                    self.logger.warning(f"Racing request to {model} failed: {str(e)}")
+                    self.router.record_outcome(model, False)
+                    continue
+                content = response.choices[0].message.content
+                python_code = self.code_parser.match_code_blocks(content)
+                sql = self._match_sql(content) if not python_code else ""
+                preflight = self.preflight.check(python_code, dataset_path, schema, session=self.session) if python_code else None
+                if sql:
+                    self.reporter.partial('response', content)
+                    code_results, error = self._run_sql(model, sql)
+                    answer, success = (code_results, content, sql), error is None
+                    if error is not None:
+                        self.logger.warning(f"SQL from {model} failed: {error}")
+                elif preflight is None or not preflight['ok']:
+                    self.router.record_outcome(model, False)
+                    self.metrics.increment('race.extra_tokens', self._tokens(response), race=race, model=model)
+                    answer = (None, content, python_code)
+                    continue
                 else:
-                    st.warning(f"⚠️ No Python code block detected in LLM's response.")
-                    return None, response_message.content, ""
-                    
-            except Exception as e:
-                self.logger.error(f"LLM API error: {str(e)}")
-                st.error(f"❌ Error communicating with LLM: {str(e)}")
-                return None, "", ""
\ No newline at end of file
+                    if preflight['repairs']:
+                        self.metrics.increment('preflight.repaired')
+
+                    if self.ran_code:
+                        self._reset_kernel(e2b_code_interpreter)
+                    self.reporter.partial('response', content)
+                    python_code, code_results, success = self._run_code(e2b_code_interpreter, model,
+                                                                        preflight['code'])
+                    answer = (code_results, content, python_code)
+                if success:
+                    with lock:
+                        state['winner'], state['winner_latency'] = model, latency
+                    self.metrics.increment('race.wins', race=race, model=model)
+                    if model == primary:
+                        self.metrics.observe('race.latency_saved', 0.0, race=race)
+                    self.logger.info(f"Race won by {model} after {latency:.1f}s")
+                    break
+                self.metrics.increment('race.extra_tokens', self._tokens(response), race=race, model=model)
+                if self.ran_code and self.session:
+                    self.logger.info("Race stopped: the session kernel may hold the failed candidate's changes")
+                    break
+        except FutureTimeoutError:
+            self.logger.warning(f"Race timed out after {RACING_CONFIG['timeout']}s")
+        finally:
+            # Including losers that completed while the winner was running in the sandbox
+            for future, model in futures.items():
+                if future in handled:
+                    continue
+                if future.done():
+                    account_late(future, model)
+                else:
+                    future.add_done_callback(lambda done, model=model: account_late(done, model))
+            # Requests already on the wire cannot be interrupted; their results are ignored
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        if state['winner'] is None:
+            self.metrics.increment('race.no_winner', race=race)
+            self.reporter.warning("⚠️ None of the raced models produced code that ran successfully.")
+        return answer
+    
+    def _reset_kernel(self, e2b_code_interpreter: Sandbox):
+        """Restart the kernel so the next candidate does not see what a failed one left behind"""
+        try:
+            restart_kernel(e2b_code_interpreter)
+        except Exception as e:
+            self.logger.warning(f"Could not restart the sandbox kernel: {str(e)}")
+    
+    @staticmethod
+    def _tokens(response: Any) -> int:
+        usage = getattr(response, 'usage', None)
+        return int(getattr(usage, 'total_tokens', 0) or 0)
+    
+    def _preflight_feedback(self, issues: List[str]) -> str:
+        """Follow-up message asking the LLM to fix code that failed pre-flight checks"""
+        return ("Your code cannot run as written:\n" + "\n".join(f"- {issue}" for issue in issues) +
+                "\nPlease fix these problems and reply with the complete corrected Python code block.")
+    
+    def _sql_feedback(self, error: str) -> str:
+        """Follow-up message asking the LLM to fix a SQL query that failed"""
+        return (f"Your SQL query failed: {error}\nPlease fix it and reply with the complete corrected query in a "
+                "```sql block (or with Python code if the question cannot be answered in SQL).")
+    
+    def _sql_prompt(self, tables: List[str]) -> str:
+        """Prompt section offering the SQL engine's tables for relational questions"""
+        lines = [
+            "",
+            "SQL engine:",
+            "- The uploaded CSV files are also tables in an embedded DuckDB database on the host:",
+        ]
+        lines.extend(f"  - {table}" for table in tables)
+        lines.extend([
+            "- For relational questions (filtering, aggregation, grouping, ranking, joins between the files) reply "
+            "with a single read-only query in a ```sql block (DuckDB dialect, double-quote column names) instead of "
+            "Python; it runs on the host and its result is shown as a table.",
+            "- For charts and anything SQL cannot express reply with Python as usual. The Python sandbox only has "
+            "the dataset file, not the other tables.",
+        ])
+        return "\n".join(lines) + "\n"
+    
+    def _bars_prompt(self, bars: Dict[str, Dict[str, Any]]) -> str:
+        """Prompt section pointing time-series questions at the pre-aggregated bars"""
+        lines = [
+            "",
+            "Time series:",
+            "- Per-symbol OHLCV bars are precomputed from the dataset (columns Symbol, Time, Open, High, Low, Close, "
+            "Volume, VWAP, Ticks; Time already parsed). Read one with pd.read_feather(path):",
+        ]
+        lines.extend(f"- {level} bars: '{info['path']}' ({info['rows']:,} rows)" for level, info in bars.items())
+        lines.append("- For trends, candlesticks, VWAP or resampling use the coarsest level that is fine enough for "
+                     "the question (resample it further if needed) instead of parsing and resampling the raw rows.")
+        return "\n".join(lines) + "\n"
+    
+    def _session_prompt(self, session_context: Dict[str, Any]) -> str:
+        """Prompt section describing the live kernel of a conversational session"""
+        lines = [
+            "",
+            "Session:",
+            "- The Python kernel is persistent: variables from earlier answers are still in memory.",
+            "- The dataset is already loaded as the pandas DataFrame `df`; use it instead of reading the CSV again.",
+            "- Reuse existing variables for follow-up questions (e.g. \"group that by Sector\") instead of recomputing them.",
+        ]
+        variables = session_context.get('variables') or {}
+        if variables:
+            lines.append("Variables that already exist in the kernel:")
+            lines.extend(f"- {name}: {description}" for name, description in variables.items())
+        return "\n".join(lines) + "\n"
\ No newline at end of file
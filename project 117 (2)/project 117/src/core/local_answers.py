@@ -0,0 +1,77 @@
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from src.core.profile_answers import ProfileQueryMatcher, answer_from_profile
+from src.core.rollup_cube import CubeQueryMatcher
+from src.core.table_results import TableResult
+from src.utils.metrics import get_metrics, MetricsRecorder
+
+
+class LocalAnswerer:
+    """Answers questions from structures precomputed at ingestion, without the LLM or a sandbox
+
+    Group-bys come from the rollup cube, descriptive statistics from the cached
+    profile. ``answer`` returns the same ``(results, response, code)`` triple
+    as ``LLMClient.chat_with_llm``, so callers render it the usual way, or None
+    when the question needs the LLM path. Hits, misses and the latency saved
+    against the LLM path's average are recorded as metrics.
+    """
+
+    def __init__(self, metrics: Optional[MetricsRecorder] = None):
+        self.logger = logging.getLogger(__name__)
+        self.metrics = metrics or get_metrics()
+        self.cube_matcher = CubeQueryMatcher()
+        self.profile_matcher = ProfileQueryMatcher()
+
+    def answer(self, dataset: Dict[str, Any], question: str,
+               dataset_path: Optional[str] = None) -> Optional[Tuple[List[Any], str, str]]:
+        started = time.perf_counter()
+        dataset_path = dataset_path or f"./{dataset['name']}"
+        answer = None
+        for source in (self._from_cube, self._from_profile):
+            try:
+                answer = source(dataset, question, dataset_path)
+            except Exception as e:
+                self.logger.warning(f"Local answer failed, using the LLM: {str(e)}")
+            if answer is not None:
+                break
+        if answer is None:
+            self.metrics.increment('local_answers.misses')
+            return None
+
+        source, results, response, code = answer
+        elapsed = time.perf_counter() - started
+        self.metrics.increment('local_answers.hits', source=source)
+        self.metrics.observe('local_answers.latency', elapsed, source=source)
+        baseline = self.metrics.summary('llm.answer_latency').get('mean')
+        if baseline is not None:
+            self.metrics.observe('local_answers.latency_saved', max(0.0, baseline - elapsed))
+        self.logger.info(f"Answered locally from the {source} in {elapsed * 1000:.1f} ms: {question!r}")
+        return results, response + f"\n\n_Answered locally in {elapsed * 1000:.0f} ms._", code
+
+    def _from_cube(self, dataset: Dict[str, Any], question: str,
+                   dataset_path: str) -> Optional[Tuple[str, List[Any], str, str]]:
+        cube = dataset.get('cube')
+        query = self.cube_matcher.match(question, cube) if cube is not None else None
+        if query is None:
+            return None
+        result = cube.answer(query)
+        description = query.describe()
+        response = (f"⚡ **{description[:1].upper() + description[1:]}**, answered from the dataset's pre-aggregated "
+                    f"rollup cube ({len(result):,} rows) without an LLM call or sandbox run.")
+        return 'cube', [TableResult.from_frame('result', result)], response, query.pandas_code(dataset_path)
+
+    def _from_profile(self, dataset: Dict[str, Any], question: str,
+                      dataset_path: str) -> Optional[Tuple[str, List[Any], str, str]]:
+        analysis = dataset.get('analysis')
+        query = self.profile_matcher.match(question, analysis, dataset.get('value_counts'))
+        if query is None:
+            return None
+        tables, code = answer_from_profile(query, analysis, dataset.get('value_counts', {}), dataset_path)
+        if not tables:
+            return None
+        response = (f"⚡ **{', '.join(name[:1].upper() + name[1:] for name, _ in tables)}** of "
+                    f"{len(query.columns)} column(s), read from the cached dataset profile without an LLM call "
+                    f"or sandbox run.")
+        return 'profile', [TableResult.from_frame(name, table) for name, table in tables], response, code
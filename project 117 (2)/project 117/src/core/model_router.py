@@ -0,0 +1,127 @@
+import re
+import threading
+from typing import Dict, List, Any, Optional, Tuple
+import logging
+
+from src.utils.metrics import get_metrics, MetricsRecorder
+from config.models import TOGETHER_MODELS, MODEL_TIERS, COMPLEXITY_TIERS
+from config.settings import ROUTER_CONFIG
+
+# Words that point at multi-step analysis rather than a single aggregate (stems match
+# any word starting with them: 'correlat' → correlation, correlated)
+COMPLEX_TERMS = (
+    'predict', 'forecast', 'regression', 'model', 'cluster', 'correlat', 'compare', 'trend',
+    'why', 'explain', 'dashboard', 'segment', 'anomal', 'outlier', 'simulat', 'optimi',
+    'backtest', 'volatility', 'distribution', 'relationship', 'insight'
+)
+# Whole words only, so 'min' does not match 'minute', 'sum' 'summary' or 'top' 'stop'
+SIMPLE_TERMS = (
+    'how many', 'count', 'average', 'mean', 'median', 'max', 'maximum', 'min', 'minimum', 'sum', 'total',
+    'top', 'list', 'show', 'what is', 'which'
+)
+COMPLEX_PATTERNS = [re.compile(rf'\b{re.escape(term)}') for term in COMPLEX_TERMS]
+SIMPLE_PATTERNS = [re.compile(rf'\b{re.escape(term)}\b') for term in SIMPLE_TERMS]
+CLAUSE_SEPARATORS = re.compile(r'\band then\b|\bthen\b|\band\b|\balso\b|[,;]|\bfor each\b|\bper\b')
+
+
+class ModelRouter:
+    """Routes each question to a model tier by estimated complexity.
+
+    Simple aggregates go to the fast tier, multi-step analyses to the strong
+    tier. When a model fails (no code block, rejected by pre-flight or failed
+    execution) the client escalates along the returned chain. Within a tier,
+    models are ordered by the latency and success statistics recorded in
+    ``MetricsRecorder``; models without enough samples are tried first.
+    """
+
+    TIER_ORDER = ('fast', 'balanced', 'strong')
+
+    def __init__(self, metrics: Optional[MetricsRecorder] = None):
+        self.logger = logging.getLogger(__name__)
+        self.metrics = metrics or get_metrics()
+
+    def classify(self, query: str) -> str:
+        """'simple', 'moderate' or 'complex'"""
+        text = query.lower()
+        complex_hits = sum(bool(pattern.search(text)) for pattern in COMPLEX_PATTERNS)
+        simple_hits = sum(bool(pattern.search(text)) for pattern in SIMPLE_PATTERNS)
+        clauses = len(CLAUSE_SEPARATORS.findall(text))
+        score = 2 * complex_hits + clauses + len(text.split()) / 25
+        if complex_hits == 0 and simple_hits and score <= 1.5:
+            return 'simple'
+        if score >= 4:
+            return 'complex'
+        return 'moderate'
+
+    def route(self, query: str) -> Tuple[str, List[str]]:
+        """Complexity of the query and the model ids to try, in escalation order"""
+        complexity = self.classify(query)
+        start = self.TIER_ORDER.index(COMPLEXITY_TIERS[complexity])
+        chain = []
+        for tier in self.TIER_ORDER[start:]:
+            chain.append(self.ranked(tier)[0])
+        # Fill the remaining attempts with the next-best models of the strongest tier
+        for model in self.ranked(self.TIER_ORDER[-1]):
+            if len(chain) >= ROUTER_CONFIG['max_attempts']:
+                break
+            if model not in chain:
+                chain.append(model)
+        self.metrics.increment('router.routed', complexity=complexity)
+        return complexity, chain[:ROUTER_CONFIG['max_attempts']]
+
+    def ranked(self, tier: str) -> List[str]:
+        """Model ids of a tier, best first"""
+        def key(item):
+            order, model = item
+            stats = self.model_stats(model)
+            if stats['requests'] < ROUTER_CONFIG['min_samples']:
+                return (0, 0.0, order)  # explore until the statistics mean something
+            demoted = stats['success_rate'] < ROUTER_CONFIG['min_success_rate']
+            return (1 + demoted, stats['p50_latency'] or 0.0, order)
+
+        models = [TOGETHER_MODELS[name] for name in MODEL_TIERS[tier]]
+        return [model for _, model in sorted(enumerate(models), key=key)]
+
+    def record_latency(self, model: str, seconds: float):
+        """One LLM completion round trip"""
+        self.metrics.observe('llm.latency', seconds, model=model)
+
+    def record_outcome(self, model: str, success: bool):
+        """Whether the model's answer produced code that ran"""
+        self.metrics.increment('llm.requests', model=model)
+        if not success:
+            self.metrics.increment('llm.failures', model=model)
+
+    def model_stats(self, model: str) -> Dict[str, Any]:
+        requests = self.metrics.counter('llm.requests', model=model)
+        failures = self.metrics.counter('llm.failures', model=model)
+        latency = self.metrics.summary('llm.latency', model=model)
+        return {
+            'requests': int(requests),
+            'success_rate': (requests - failures) / requests if requests else None,
+            'p50_latency': latency.get('p50'),
+            'p95_latency': latency.get('p95'),
+        }
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Per-model statistics for display, in tier order"""
+        rows = []
+        for tier in self.TIER_ORDER:
+            for name in MODEL_TIERS[tier]:
+                stats = self.model_stats(TOGETHER_MODELS[name])
+                if stats['requests']:
+                    rows.append({'Model': name, 'Tier': tier, **stats})
+        return rows
+
+
+_default_router: Optional[ModelRouter] = None
+_default_router_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    """Process-wide router sharing the recorded metrics"""
+    global _default_router
+    with _default_router_lock:
+        if _default_router is None:
+            _default_router = ModelRouter()
+        return _default_router
@@ -0,0 +1,273 @@
+import ast
+import difflib
+import posixpath
+import re
+import textwrap
+from typing import Dict, List, Any, Optional, Set, Tuple
+import logging
+
+from src.utils.code_parser import CodeParser
+from config.settings import PREFLIGHT_CONFIG
+
+READ_FUNCTIONS = {'read_csv', 'read_excel', 'read_json', 'read_parquet', 'read_table'}
+# Frame methods whose string arguments are column names
+COLUMN_METHODS = {'groupby', 'sort_values', 'value_counts', 'pivot_table', 'set_index', 'drop_duplicates', 'nlargest', 'nsmallest'}
+COLUMN_KEYWORDS = {'by', 'columns', 'subset', 'values', 'index'}
+# Frame methods that keep the columns of the frame they are called on
+SCHEMA_PRESERVING_METHODS = {
+    'copy', 'dropna', 'fillna', 'head', 'tail', 'sample', 'sort_values', 'reset_index',
+    'query', 'drop_duplicates', 'nlargest', 'nsmallest', 'ffill', 'bfill'
+}
+# File names models make up for "the uploaded dataset"
+PLACEHOLDER_STEMS = {'data', 'dataset', 'df', 'file', 'input', 'your_file', 'your_dataset', 'your_data',
+                     'filename', 'file_name', 'dataset_path', 'path_to_dataset', 'path_to_file'}
+
+
+class PreflightChecker:
+    """Static checks on generated code before it is sent to the sandbox.
+
+    The code is compiled and parsed, reads of the dataset are pointed at the real
+    dataset path, and string column references on the dataset frame are checked
+    against the cached schema. Unambiguous problems are repaired in the source;
+    the rest are returned as issues to send back to the LLM.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.code_parser = CodeParser()
+
+    def check(self, code: str, dataset_path: str, columns: Optional[List[str]] = None,
+              session: bool = False) -> Dict[str, Any]:
+        """Return ``{'code', 'ok', 'repairs', 'issues'}`` for a generated code block
+
+        With ``session`` the code runs in a persistent kernel whose ``df`` may
+        hold columns earlier turns created, so only frames the code reads
+        itself are checked against ``columns``.
+        """
+        result = {'code': code, 'ok': True, 'repairs': [], 'issues': []}
+
+        tree = self._parse(result)
+        if tree is None:
+            result['ok'] = False
+            return result
+
+        edits: List[Tuple[ast.Constant, str]] = []
+        for node in ast.walk(tree):
+            if self._is_dataset_read(node):
+                edits.extend(self._check_path(node, dataset_path, result))
+
+        if columns:
+            frame_names = self._dataset_frames(tree, session)
+            edits.extend(self._check_columns(tree, frame_names, [str(col) for col in columns], result))
+
+        if edits:
+            result['code'] = self._apply_edits(result['code'], edits)
+        result['ok'] = not result['issues']
+        return result
+
+    def replace_path(self, code: str, path: str, replacement: str) -> Optional[str]:
+        """``code`` with every string constant equal to ``path`` replaced, or None when there is none"""
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            return None
+        edits = [(node, repr(replacement)) for node in ast.walk(tree)
+                 if isinstance(node, ast.Constant) and isinstance(node.value, str) and node.value == path]
+        return self._apply_edits(code, edits) if edits else None
+
+    def _parse(self, result: Dict[str, Any]) -> Optional[ast.AST]:
+        """Parse the code, repairing stray indentation and leftover markdown fences"""
+        code = result['code']
+        if not self.code_parser.validate_python_code(code):
+            repaired = textwrap.dedent('\n'.join(
+                line for line in code.splitlines() if not line.strip().startswith('```')
+            ))
+            if repaired != code and self.code_parser.validate_python_code(repaired):
+                result['code'] = repaired
+                result['repairs'].append("Removed stray indentation / markdown fences")
+            else:
+                try:
+                    ast.parse(code)
+                except SyntaxError as e:
+                    result['issues'].append(f"SyntaxError on line {e.lineno}: {e.msg}")
+                return None
+        try:
+            return ast.parse(result['code'])
+        except SyntaxError as e:
+            result['issues'].append(f"SyntaxError on line {e.lineno}: {e.msg}")
+            return None
+
+    @staticmethod
+    def _call_name(node: ast.AST) -> Optional[str]:
+        if isinstance(node, ast.Call):
+            if isinstance(node.func, ast.Attribute):
+                return node.func.attr
+            if isinstance(node.func, ast.Name):
+                return node.func.id
+        return None
+
+    def _is_dataset_read(self, node: ast.AST) -> bool:
+        return self._call_name(node) in READ_FUNCTIONS
+
+    def _check_path(self, node: ast.Call, dataset_path: str, result: Dict[str, Any]) -> List[Tuple[ast.Constant, str]]:
+        """Point reads of a made-up or misspelled dataset file name at the uploaded file"""
+        path_node = node.args[0] if node.args else next(
+            (kw.value for kw in node.keywords if kw.arg in ('filepath_or_buffer', 'io', 'path')), None
+        )
+        if not isinstance(path_node, ast.Constant) or not isinstance(path_node.value, str):
+            return []
+        path = path_node.value
+        if path == dataset_path or posixpath.normpath(path) == posixpath.normpath(dataset_path):
+            return []
+        if re.match(r'^[a-z]+://', path):
+            result['issues'].append(f"Code reads a remote file '{path}' instead of the dataset at '{dataset_path}'")
+            return []
+        if not self._names_dataset(path, dataset_path):
+            # Another file (bars, samples, files the code wrote): a missing one fails in the sandbox
+            return []
+        result['repairs'].append(f"Replaced dataset path '{path}' with '{dataset_path}'")
+        return [(path_node, repr(dataset_path))]
+
+    @staticmethod
+    def _names_dataset(path: str, dataset_path: str) -> bool:
+        """Whether ``path`` looks like a wrong name for the dataset file rather than another file"""
+        if posixpath.normpath(path).startswith(posixpath.normpath(dataset_path)):
+            return False  # files derived from the dataset, e.g. '<dataset>.bars_1min.feather'
+        stem, extension = posixpath.splitext(posixpath.basename(path))
+        dataset_stem, dataset_extension = posixpath.splitext(posixpath.basename(dataset_path))
+        if extension and extension.lower() != dataset_extension.lower():
+            return False
+        stem, dataset_stem = stem.lower(), dataset_stem.lower()
+        return (stem in PLACEHOLDER_STEMS or stem == dataset_stem or
+                difflib.SequenceMatcher(None, stem, dataset_stem).ratio() >= PREFLIGHT_CONFIG['path_match_cutoff'])
+
+    def _dataset_frames(self, tree: ast.AST, session: bool = False) -> Set[str]:
+        """Names that always hold the dataset's columns (reads, filters and copies of it)
+
+        ``df`` is assumed to be the dataset unless ``session`` is set, where the
+        kernel's ``df`` may have gained columns in earlier turns.
+        """
+        assignments: Dict[str, List[ast.AST]] = {}
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Assign):
+                for target in node.targets:
+                    if isinstance(target, ast.Name):
+                        assignments.setdefault(target.id, []).append(node.value)
+
+        frame_names = {name for name, values in assignments.items()
+                       if any(self._is_dataset_read(value) for value in values)}
+        if not session:
+            frame_names.add('df')
+
+        def preserves_schema(value: ast.AST) -> bool:
+            if self._is_dataset_read(value):
+                return True
+            if isinstance(value, ast.Subscript) and isinstance(value.value, ast.Name):
+                # df[mask] keeps the columns, df['col'] / df[['a', 'b']] does not
+                return value.value.id in frame_names and not isinstance(value.slice, (ast.Constant, ast.List))
+            if (isinstance(value, ast.Call) and isinstance(value.func, ast.Attribute)
+                    and value.func.attr in SCHEMA_PRESERVING_METHODS):
+                return preserves_schema(value.func.value) or (
+                    isinstance(value.func.value, ast.Name) and value.func.value.id in frame_names)
+            return False
+
+        changed = True
+        while changed:
+            changed = False
+            for name in list(frame_names):
+                if any(not preserves_schema(value) for value in assignments.get(name, [])):
+                    frame_names.discard(name)
+                    changed = True
+        return frame_names
+
+    def _check_columns(self, tree: ast.AST, frame_names: Set[str], columns: List[str],
+                       result: Dict[str, Any]) -> List[Tuple[ast.Constant, str]]:
+        """Check string column references on the dataset frame against the schema"""
+        known = set(columns)
+        created = self._created_columns(tree)
+        normalized = {self._normalize(col): col for col in columns}
+        edits = []
+        for const in self._column_references(tree, frame_names):
+            name = const.value
+            if name in known or name in created:
+                continue
+            match = normalized.get(self._normalize(name))
+            if match is None:
+                close = difflib.get_close_matches(name, columns, n=2, cutoff=PREFLIGHT_CONFIG['column_match_cutoff'])
+                match = close[0] if len(close) == 1 else None
+            if match is not None:
+                result['repairs'].append(f"Replaced unknown column '{name}' with '{match}'")
+                edits.append((const, repr(match)))
+            else:
+                issue = f"Column '{name}' does not exist. Available columns: {columns}"
+                if issue not in result['issues']:
+                    result['issues'].append(issue)
+        return edits
+
+    def _column_references(self, tree: ast.AST, frame_names: Set[str]) -> List[ast.Constant]:
+        """String constants used as column names of the dataset frame"""
+        references = []
+
+        def strings(node: ast.AST) -> List[ast.Constant]:
+            if isinstance(node, ast.Constant) and isinstance(node.value, str):
+                return [node]
+            if isinstance(node, (ast.List, ast.Tuple)):
+                return [elt for elt in node.elts if isinstance(elt, ast.Constant) and isinstance(elt.value, str)]
+            return []
+
+        def is_frame(node: ast.AST) -> bool:
+            return isinstance(node, ast.Name) and node.id in frame_names
+
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Subscript) and isinstance(node.ctx, ast.Load) and (
+                    is_frame(node.value)
+                    # df.groupby(...)['col']
+                    or (isinstance(node.value, ast.Call) and isinstance(node.value.func, ast.Attribute)
+                        and node.value.func.attr == 'groupby' and is_frame(node.value.func.value))):
+                references.extend(strings(node.slice))
+            elif (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                    and is_frame(node.func.value) and node.func.attr in COLUMN_METHODS):
+                if node.args:
+                    references.extend(strings(node.args[0]))
+                for kw in node.keywords:
+                    if kw.arg in COLUMN_KEYWORDS:
+                        references.extend(strings(kw.value))
+        return references
+
+    def _created_columns(self, tree: ast.AST) -> Set[str]:
+        """Column names the code defines itself (assignments, assign(), rename())"""
+        created = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Subscript) and isinstance(node.ctx, ast.Store):
+                if isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str):
+                    created.add(node.slice.value)
+            elif isinstance(node, ast.Call) and self._call_name(node) == 'assign':
+                created.update(kw.arg for kw in node.keywords if kw.arg)
+            elif isinstance(node, ast.Call) and self._call_name(node) == 'rename':
+                for kw in node.keywords:
+                    if kw.arg == 'columns' and isinstance(kw.value, ast.Dict):
+                        created.update(v.value for v in kw.value.values
+                                       if isinstance(v, ast.Constant) and isinstance(v.value, str))
+        return created
+
+    @staticmethod
+    def _normalize(name: str) -> str:
+        return re.sub(r'[\s_]+', ' ', name).strip().lower()
+
+    @staticmethod
+    def _apply_edits(code: str, edits: List[Tuple[ast.Constant, str]]) -> str:
+        """Replace constant nodes in the source text, keeping everything else as written"""
+        lines = code.splitlines(keepends=True)
+        seen = set()
+        ordered = []
+        for node, replacement in edits:
+            position = (node.lineno, node.col_offset)
+            if position not in seen and node.lineno == node.end_lineno:
+                seen.add(position)
+                ordered.append((node, replacement))
+        for node, replacement in sorted(ordered, key=lambda edit: (edit[0].lineno, edit[0].col_offset), reverse=True):
+            # AST offsets are UTF-8 byte offsets
+            line = lines[node.lineno - 1].encode('utf-8')
+            line = line[:node.col_offset] + replacement.encode('utf-8') + line[node.end_col_offset:]
+            lines[node.lineno - 1] = line.decode('utf-8')
+        return ''.join(lines)
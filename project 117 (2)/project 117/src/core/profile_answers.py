@@ -0,0 +1,159 @@
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+import pandas as pd
+
+from config.settings import PROFILE_ANSWER_CONFIG
+
+# Question wording → statistic read from the cached profile (``DataProcessor.analyze_dataframe``)
+STATISTIC_PATTERNS = {
+    'summary': r'\b(describe|summary|summari[sz]e|descriptive statistics|statistical overview)\b',
+    'mean': r'\b(means?|averages?|avg)\b',
+    'median': r'\b(medians?)\b',
+    'std': r'\b(std|standard deviations?)\b',
+    'min': r'\b(min|minimums?|lowest|smallest)\b',
+    'max': r'\b(max|maximums?|highest|largest)\b',
+    'count': r'\b(counts?|non-null)\b',
+    'nulls': r'(?<!non-)\b(nulls?|missing|nans?)\b',
+    'unique': r'\b(unique|distinct|cardinality)\b',
+    'top': r'\b(top|most (common|frequent)|frequent|modes?)\b',
+}
+
+# describe() keys behind the numeric statistics, with their display names
+NUMERIC_STATISTICS = {'count': ('count', 'Count'), 'mean': ('mean', 'Mean'), 'std': ('std', 'Std'),
+                      'min': ('min', 'Min'), 'median': ('50%', 'Median'), 'max': ('max', 'Max')}
+
+# Questions about whole groups of columns rather than named ones
+SCOPE_PATTERN = re.compile(r'\b(each|every|all)\b.*\bcolumns?\b|\bnumeric(al)?\b|\bcategorical\b|\bdataset\b|'
+                           r'\bthe data\b|\bcolumns\b', re.IGNORECASE)
+
+UNSUPPORTED_PATTERN = re.compile(
+    r'\b(by|per|group\w*|across|plot|chart|graph|visuali[sz]\w*|draw|heatmap|trend|over time|correlat\w*|'
+    r'regress\w*|predict\w*|forecast\w*|where|filter\w*|only|except|exclud\w*|between|compar\w*|when|if|after|'
+    r'before|since|outlier\w*|distribution|histogram|percentile|quantile|quartile|ratio|weighted|rolling|'
+    r'moving|cumulative|\d+)\b',
+    re.IGNORECASE
+)
+
+# Time windows and qualifiers that restrict the rows a statistic is computed over
+FILTER_PATTERN = re.compile(
+    r'\b(today|yesterday|now|current\w*|latest|recent\w*|last|past|this|next|previous|morning|afternoon|evening|'
+    r'session|intraday|hours?|hourly|minutes?|days?|daily|weeks?|weekly|months?|monthly|years?|yearly|quarters?|'
+    r'large|small|mid|caps?|positive|negative|above|below|greater|less|more|than|over|under|stocks?|shares?|'
+    r'companies|company|gainers?|losers?)\b',
+    re.IGNORECASE
+)
+
+
+@dataclass
+class ProfileQuery:
+    """Descriptive ``statistics`` of ``columns``, answerable from the cached profile"""
+    statistics: List[str]
+    columns: List[Any]
+    top_n: int
+
+
+class ProfileQueryMatcher:
+    """Recognizes descriptive questions ("mean of each numerical column", "missing values per column")
+
+    Like ``CubeQueryMatcher`` it only matches questions it can answer exactly
+    from the profile; everything else goes to the LLM.
+    """
+
+    def match(self, question: str, analysis: Dict[str, Any],
+              value_counts: Optional[Dict[str, pd.Series]] = None) -> Optional[ProfileQuery]:
+        """The profile query for ``question``, or None when it may restrict the rows (a time window,
+        a qualifier or a value of a categorical column from ``value_counts``, e.g. "Volume of TCS")"""
+        if not analysis:
+            return None
+        text = ' '.join(question.split())
+        top_n = PROFILE_ANSWER_CONFIG['top_n']
+        top = re.search(r'\btop\s+(\d+)\b', text, re.IGNORECASE)
+        if top:
+            top_n = int(top.group(1))
+            text = text[:top.start()] + 'top' + text[top.end():]
+
+        remainder, columns = text, []
+        for column in sorted(analysis['columns'], key=lambda name: len(str(name)), reverse=True):
+            pattern = re.compile(rf'(?<!\w){re.escape(str(column))}(?!\w)', re.IGNORECASE)
+            if pattern.search(remainder):
+                columns.append(column)
+                remainder = pattern.sub(' ', remainder)
+        # "values per column" asks for every column, not a group-by
+        remainder = re.sub(r'\b(per|by|for each|in each|of each)\s+columns?\b', ' columns ', remainder,
+                           flags=re.IGNORECASE)
+
+        statistics = [name for name, pattern in STATISTIC_PATTERNS.items()
+                      if re.search(pattern, remainder, re.IGNORECASE)]
+        if not statistics or UNSUPPORTED_PATTERN.search(remainder) or FILTER_PATTERN.search(remainder):
+            return None
+        for counts in (value_counts or {}).values():
+            values = (str(value) for value in counts.index if pd.notna(value))
+            if any(re.search(rf'(?<!\w){re.escape(value)}(?!\w)', remainder)
+                   for value in values if value.strip() and value in remainder):
+                return None
+        if not columns and not SCOPE_PATTERN.search(remainder):
+            return None
+
+        numeric, categorical = analysis['numeric_columns'], analysis['categorical_columns']
+        scope = columns or analysis['columns']
+        if re.search(r'\bnumeric(al)?\b', remainder, re.IGNORECASE) and not columns:
+            scope = numeric
+        elif re.search(r'\bcategorical\b', remainder, re.IGNORECASE) and not columns:
+            scope = categorical
+        for statistic in statistics:
+            supported = (analysis['columns'] if statistic == 'nulls' else
+                         categorical if statistic in ('unique', 'top') else numeric)
+            # Named columns the profile has no such statistic for (e.g. the mean of a text column)
+            if columns and any(column not in supported for column in columns):
+                return None
+        return ProfileQuery(statistics=statistics, columns=list(scope), top_n=top_n)
+
+
+def answer_from_profile(query: ProfileQuery, analysis: Dict[str, Any], value_counts: Dict[str, pd.Series],
+                        dataset_path: str) -> Tuple[List[Tuple[str, pd.DataFrame]], str]:
+    """Tables answering ``query`` from the cached profile, and the equivalent pandas code"""
+    tables, code = [], ["import pandas as pd", "", f"df = pd.read_csv({dataset_path!r})"]
+    numeric = [column for column in query.columns if column in analysis['numeric_columns']]
+    categorical = [column for column in query.columns if column in analysis['categorical_columns']]
+    summary = analysis.get('numeric_summary', {})
+
+    numeric_statistics = [name for name in NUMERIC_STATISTICS if name in query.statistics]
+    if 'summary' in query.statistics and numeric:
+        tables.append(('summary', pd.DataFrame({column: summary[column] for column in numeric}).T
+                       .rename_axis('Column').reset_index()))
+        code.append(f"df[{numeric!r}].describe().T")
+    elif numeric_statistics and numeric:
+        tables.append((', '.join(numeric_statistics), pd.DataFrame(
+            {label: [summary[column][key] for column in numeric]
+             for key, label in (NUMERIC_STATISTICS[name] for name in numeric_statistics)},
+            index=pd.Index(numeric, name='Column')
+        ).reset_index()))
+        code.append(f"df[{numeric!r}].agg({numeric_statistics!r}).T")
+
+    if 'nulls' in query.statistics:
+        rows = analysis['shape'][0]
+        nulls = pd.DataFrame({'Column': query.columns,
+                              'Missing': [int(analysis['null_counts'].get(column, 0)) for column in query.columns]})
+        nulls['Missing %'] = (nulls['Missing'] / rows * 100).round(2) if rows else 0.0
+        tables.append(('missing values', nulls))
+        code.append(f"df[{query.columns!r}].isnull().sum()")
+
+    if 'unique' in query.statistics and categorical:
+        tables.append(('unique values', pd.DataFrame({
+            'Column': categorical, 'Unique values': [len(value_counts[column]) for column in categorical]
+        })))
+        code.append(f"df[{categorical!r}].nunique()")
+
+    if 'top' in query.statistics and categorical:
+        rows = []
+        for column in categorical:
+            counts = value_counts[column]
+            total = counts.sum()
+            for value, count in counts.head(query.top_n).items():
+                rows.append({'Column': column, 'Value': value, 'Count': int(count),
+                             'Share %': round(count / total * 100, 2) if total else 0.0})
+        tables.append((f"top {query.top_n} values", pd.DataFrame(rows)))
+        code.append(f"{{column: df[column].value_counts().head({query.top_n}) for column in {categorical!r}}}")
+
+    return tables, "\n".join(code)
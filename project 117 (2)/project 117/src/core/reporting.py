@@ -0,0 +1,47 @@
+import contextlib
+from typing import Any, Iterator
+import streamlit as st
+
+
+class Reporter:
+    """Where pipeline code sends user-facing status messages.
+
+    The base class discards everything; ``StreamlitReporter`` renders into the
+    current script run and ``JobReporter`` (see ``job_queue``) records into a
+    background job's progress store.
+    """
+
+    def info(self, message: str):
+        pass
+
+    def warning(self, message: str):
+        pass
+
+    def error(self, message: str):
+        pass
+
+    def partial(self, name: str, value: Any):
+        """An intermediate result (e.g. the LLM response before its code has run)"""
+
+    @contextlib.contextmanager
+    def stage(self, message: str) -> Iterator[None]:
+        """A long-running step"""
+        yield
+
+
+class StreamlitReporter(Reporter):
+    """Renders messages directly in the running Streamlit script"""
+
+    def info(self, message: str):
+        st.info(message)
+
+    def warning(self, message: str):
+        st.warning(message)
+
+    def error(self, message: str):
+        st.error(message)
+
+    @contextlib.contextmanager
+    def stage(self, message: str) -> Iterator[None]:
+        with st.spinner(message):
+            yield
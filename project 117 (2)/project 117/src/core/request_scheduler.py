@@ -0,0 +1,258 @@
+import contextvars
+import hashlib
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Any, Optional
+import logging
+
+from together import APIConnectionError, APITimeoutError
+
+from src.utils.metrics import get_metrics, MetricsRecorder
+from config.settings import SCHEDULER_CONFIG
+
+
+class DeadlineExceeded(TimeoutError):
+    """A request could not be completed before its deadline"""
+
+
+class TokenBucket:
+    """Token-bucket rate limiter: ``rate`` requests per second, bursts up to ``capacity``"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def acquire(self, deadline: float) -> bool:
+        """Wait for a token; False if none becomes available before ``deadline``"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                delay = (1 - self.tokens) / self.rate
+            if now + delay > deadline:
+                return False
+            time.sleep(delay)
+
+
+class RequestScheduler:
+    """Shared gate in front of the LLM provider for all Streamlit sessions.
+
+    ``submit(api_key, model, call)`` runs ``call`` (one provider request) once
+    there is capacity:
+
+    - at most ``max_per_key`` requests per API key and ``max_per_model`` per
+      model in flight; waiting requests are admitted earliest deadline first
+    - a token bucket per API key limits the request rate
+    - 429 and 5xx responses (and connection errors) are retried with jittered
+      exponential backoff, honouring ``Retry-After``
+    - when a request runs longer than the model's p95 latency a duplicate is
+      sent and the first answer wins
+    - anything that cannot finish before its deadline raises ``DeadlineExceeded``
+
+    Queue depth, queue wait, latency, retries and hedges are recorded in
+    ``MetricsRecorder`` under ``scheduler.*``.
+    """
+
+    def __init__(self, metrics: Optional[MetricsRecorder] = None, **overrides):
+        self.logger = logging.getLogger(__name__)
+        self.metrics = metrics or get_metrics()
+        self.config = {**SCHEDULER_CONFIG, **overrides}
+        self._cond = threading.Condition()
+        self._waiting: list = []
+        self._sequence = itertools.count()
+        self._per_key: Dict[str, int] = defaultdict(int)
+        self._per_model: Dict[str, int] = defaultdict(int)
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(4, 4 * self.config['max_per_key']), thread_name_prefix='llm-request'
+        )
+
+    def submit(self, api_key: str, model: str, call: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """Run ``call`` under the scheduler's limits and return its result"""
+        deadline = time.monotonic() + (self.config['deadline'] if timeout is None else timeout)
+        key = hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:12]
+        for attempt in range(self.config['max_attempts']):
+            try:
+                return self._dispatch(key, model, call, deadline)
+            except DeadlineExceeded:
+                self.metrics.increment('scheduler.expired', model=model)
+                raise
+            except Exception as e:
+                status = getattr(e, 'status_code', None)
+                if not self._retriable(e, status) or attempt == self.config['max_attempts'] - 1:
+                    raise
+                delay = self._backoff(attempt, e)
+                self.metrics.increment('scheduler.retries', model=model, status=status or 'connection')
+                if time.monotonic() + delay >= deadline:
+                    self.metrics.increment('scheduler.expired', model=model)
+                    raise DeadlineExceeded(f"No time left to retry {model} after {status or 'connection'} error") from e
+                self.logger.warning(f"Retrying {model} in {delay:.2f}s after {status or 'connection'} error")
+                time.sleep(delay)
+
+    # Admission ----------------------------------------------------------------
+
+    def _has_capacity(self, key: str, model: str) -> bool:
+        return (self._per_key[key] < self.config['max_per_key']
+                and self._per_model[model] < self.config['max_per_model'])
+
+    def _admissible(self, entry: list) -> bool:
+        """Capacity is free and no earlier-deadline waiter competes for the same key or model"""
+        for other in sorted(self._waiting):
+            if other is entry:
+                break
+            if (other[2] == entry[2] or other[3] == entry[3]) and self._has_capacity(other[2], other[3]):
+                return False
+        return self._has_capacity(entry[2], entry[3])
+
+    def _acquire_slot(self, key: str, model: str, deadline: float):
+        with self._cond:
+            entry = [deadline, next(self._sequence), key, model]
+            heapq.heappush(self._waiting, entry)
+            self.metrics.set_gauge('scheduler.queue_depth', len(self._waiting))
+            try:
+                while not self._admissible(entry):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise DeadlineExceeded(f"Request to {model} expired in the queue")
+                    self._cond.wait(remaining)
+                self._per_key[key] += 1
+                self._per_model[model] += 1
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self.metrics.set_gauge('scheduler.queue_depth', len(self._waiting))
+                self._cond.notify_all()
+
+    def _try_acquire_slot(self, key: str, model: str) -> bool:
+        with self._cond:
+            if self._waiting or not self._has_capacity(key, model):
+                return False
+            self._per_key[key] += 1
+            self._per_model[model] += 1
+            return True
+
+    def _release_slot(self, key: str, model: str):
+        with self._cond:
+            self._per_key[key] -= 1
+            self._per_model[model] -= 1
+            self._cond.notify_all()
+
+    def _bucket(self, key: str) -> TokenBucket:
+        with self._cond:
+            if key not in self._buckets:
+                self._buckets[key] = TokenBucket(self.config['rate_per_second'], self.config['burst'])
+            return self._buckets[key]
+
+    # Dispatch -----------------------------------------------------------------
+
+    def _dispatch(self, key: str, model: str, call: Callable[[], Any], deadline: float) -> Any:
+        """One attempt: queue for a slot, then run the request, hedging it if it is slow"""
+        queued = time.monotonic()
+        self._acquire_slot(key, model, deadline)
+        if not self._bucket(key).acquire(deadline):
+            self._release_slot(key, model)
+            raise DeadlineExceeded(f"Rate limit left no time for a request to {model}")
+        self.metrics.observe('scheduler.wait', time.monotonic() - queued, model=model)
+
+        started = time.monotonic()
+        primary = self._start(key, model, call)
+        pending = {primary}
+        hedge_delay = self._hedge_delay(model)
+        first_error = None
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded(f"Request to {model} did not finish before its deadline")
+            if hedge_delay is not None:
+                remaining = min(remaining, max(0.0, started + hedge_delay - time.monotonic()))
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    first_error = first_error or e
+                    continue
+                if future is not primary:
+                    self.metrics.increment('scheduler.hedge_wins', model=model)
+                return result
+            if hedge_delay is not None and pending and time.monotonic() - started >= hedge_delay:
+                hedge_delay = None
+                if self._try_acquire_slot(key, model):
+                    if self._bucket(key).try_acquire():
+                        self.metrics.increment('scheduler.hedges', model=model)
+                        pending.add(self._start(key, model, call))
+                    else:
+                        self._release_slot(key, model)
+        raise first_error
+
+    def _start(self, key: str, model: str, call: Callable[[], Any]) -> Future:
+        """Run ``call`` on the request pool; the slot is held until the provider answers"""
+        def run():
+            started = time.monotonic()
+            try:
+                result = call()
+                self.metrics.observe('scheduler.latency', time.monotonic() - started, model=model)
+                return result
+            finally:
+                self._release_slot(key, model)
+
+        # Carry the caller's trace id onto the request thread
+        return self._pool.submit(contextvars.copy_context().run, run)
+
+    def _hedge_delay(self, model: str) -> Optional[float]:
+        latency = self.metrics.summary('scheduler.latency', model=model)
+        if latency['count'] < self.config['hedge_min_samples']:
+            return None
+        return latency['p95']
+
+    @staticmethod
+    def _retriable(error: Exception, status: Optional[int]) -> bool:
+        if status is not None:
+            return status == 429 or status >= 500
+        return isinstance(error, (APIConnectionError, APITimeoutError, ConnectionError, TimeoutError))
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Full-jitter exponential backoff, at least the server's Retry-After"""
+        delay = random.uniform(0, min(self.config['backoff_max'], self.config['backoff_base'] * 2 ** attempt))
+        response = getattr(error, 'response', None)
+        retry_after = getattr(response, 'headers', {}).get('retry-after') if response is not None else None
+        try:
+            return max(delay, float(retry_after)) if retry_after else delay
+        except ValueError:
+            return delay
+
+
+_default_scheduler: Optional[RequestScheduler] = None
+_default_scheduler_lock = threading.Lock()
+
+
+def get_request_scheduler() -> RequestScheduler:
+    """Process-wide scheduler shared by every Streamlit session"""
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = RequestScheduler()
+        return _default_scheduler
@@ -0,0 +1,227 @@
+import itertools
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import logging
+
+from config.settings import ROLLUP_CONFIG
+
+# Question wording → aggregate answered from the statistics
+AGGREGATE_PATTERNS = {
+    'mean': r'\b(mean|average|avg)\b',
+    'sum': r'\b(sum|total)\b',
+    'count': r'\b(count|how many|number of)\b',
+    'min': r'\b(min|minimum|lowest|smallest)\b',
+    'max': r'\b(max|maximum|highest|largest|biggest)\b',
+    'std': r'\b(std|standard deviation|volatility)\b',
+    'var': r'\b(var|variance)\b',
+}
+
+# Anything the cube cannot answer exactly goes to the LLM
+UNSUPPORTED_PATTERN = re.compile(
+    r'\b(plot|chart|graph|visuali[sz]\w*|draw|heatmap|trend|over time|correlat\w*|regress\w*|predict\w*|'
+    r'forecast\w*|top|bottom|rank\w*|sort\w*|order\w*|where|filter\w*|only|except|exclud\w*|between|compar\w*|'
+    r'median|percentile|quantile|distribution|histogram|outlier\w*|unique|distinct|ratio|percent\w*|share|'
+    r'weighted|growth|rolling|moving|cumulative|\d+)\b',
+    re.IGNORECASE
+)
+
+GROUPING_WORDS = r'(?:by|per|for each|for every|across|each|grouped by)'
+
+# Besides column names and aggregate/grouping words, a matched question may only contain these;
+# anything else ("today", "large caps", "positive", "stocks") may be a filter the cube cannot apply
+STOP_WORDS = frozenset(
+    "a an the of for in on each every all per by across group grouped and or what what's whats is are was "
+    "show me display calculate compute find give get list tell can could you please i want need to see would "
+    "like do does value values column columns row rows record records entry entries how many much number "
+    "table data dataset its their".split()
+)
+
+
+@dataclass
+class CubeQuery:
+    """A group-by the cube can answer: ``aggregates`` of ``measures`` by ``dimensions``"""
+    aggregates: List[str]
+    measures: List[str]
+    dimensions: Tuple[str, ...]
+
+    def describe(self) -> str:
+        what = ', '.join(self.aggregates) + (' of ' + ', '.join(f"`{m}`" for m in self.measures) if self.measures
+                                             else ' of rows')
+        return what + (' by ' + ', '.join(f"`{d}`" for d in self.dimensions) if self.dimensions else '')
+
+    def pandas_code(self, dataset_path: str) -> str:
+        """Equivalent pandas code, shown with the answer"""
+        lines = ["import pandas as pd", "", f"df = pd.read_csv({dataset_path!r})"]
+        grouped = f"df.groupby({list(self.dimensions)!r}, dropna=False)" if self.dimensions else "df"
+        if self.measures:
+            lines.append(f"result = {grouped}[{self.measures!r}].agg({self.aggregates!r})")
+        else:
+            lines.append(f"result = {grouped}.size()" if self.dimensions else "result = len(df)")
+        lines.append("result")
+        return "\n".join(lines)
+
+
+class RollupCube:
+    """Pre-aggregated group-bys over a dataset's low-cardinality columns
+
+    One cuboid is kept per combination of up to ``max_group_columns``
+    dimensions (plus the grand total), holding count, sum, min, max and sum of
+    squares of every numeric measure. These statistics merge, so appended rows
+    are folded in by aggregating just the new rows (``merged``), and mean,
+    standard deviation and variance follow from them exactly.
+    """
+
+    def __init__(self, dimensions: List[str], measures: List[str],
+                 cuboids: Dict[Tuple[str, ...], Dict[str, Any]]):
+        self.logger = logging.getLogger(__name__)
+        self.dimensions = dimensions
+        self.measures = measures
+        self.cuboids = cuboids
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, analysis: Dict[str, Any],
+                   value_counts: Dict[str, pd.Series]) -> Optional['RollupCube']:
+        """Build the cube from ``DataProcessor.analyze_dataframe`` output, or None if there is nothing to roll up"""
+        config = ROLLUP_CONFIG
+        cardinality = {column: len(counts) for column, counts in value_counts.items()
+                       if column in analysis.get('categorical_columns', [])
+                       and len(counts) <= config['max_cardinality']}
+        dimensions = sorted(cardinality, key=cardinality.get)[:config['max_dimensions']]
+        measures = list(analysis.get('numeric_columns', []))
+        if not dimensions or not measures:
+            return None
+
+        cuboids = {}
+        for size in range(config['max_group_columns'] + 1):
+            for group in itertools.combinations(dimensions, size):
+                if np.prod([cardinality[column] for column in group]) <= config['max_cells']:
+                    cuboids[group] = cls._aggregate(df, group, measures)
+        return cls(dimensions, measures, cuboids)
+
+    @staticmethod
+    def _aggregate(df: pd.DataFrame, group: Tuple[str, ...], measures: List[str]) -> Dict[str, Any]:
+        values = df[measures].apply(pd.to_numeric, errors='coerce')
+        keys = [df[column] for column in group] if group else np.zeros(len(df), dtype=int)
+        grouped = values.groupby(keys, dropna=False, observed=True, sort=True)
+        return {
+            'rows': grouped.size(),
+            'count': grouped.count(),
+            'sum': grouped.sum(),
+            'min': grouped.min(),
+            'max': grouped.max(),
+            'sumsq': (values ** 2).groupby(keys, dropna=False, observed=True, sort=True).sum(),
+        }
+
+    def merged(self, tail: pd.DataFrame) -> 'RollupCube':
+        """A new cube with ``tail`` rows folded in"""
+        cuboids = {}
+        for group, stats in self.cuboids.items():
+            new = self._aggregate(tail, group, self.measures)
+            cuboids[group] = {}
+            for name, frame in stats.items():
+                combined = pd.concat([frame, new[name]])
+                how = name if name in ('min', 'max') else 'sum'
+                cuboids[group][name] = combined.groupby(level=list(range(combined.index.nlevels)),
+                                                        dropna=False, sort=True).agg(how)
+        return RollupCube(self.dimensions, self.measures, cuboids)
+
+    def _cuboid_key(self, dimensions) -> Tuple[str, ...]:
+        return tuple(sorted(dimensions, key=self.dimensions.index))
+
+    def covers(self, query: CubeQuery) -> bool:
+        return (all(dimension in self.dimensions for dimension in query.dimensions)
+                and self._cuboid_key(query.dimensions) in self.cuboids
+                and all(measure in self.measures for measure in query.measures))
+
+    def answer(self, query: CubeQuery) -> pd.DataFrame:
+        """The group-by result, computed from the cuboid's statistics (grouped in the question's column order)"""
+        stats = self.cuboids[self._cuboid_key(query.dimensions)]
+        columns = {}
+        if not query.measures:
+            columns['Rows'] = stats['rows']
+        for measure in query.measures:
+            count, total = stats['count'][measure], stats['sum'][measure]
+            for aggregate in query.aggregates:
+                name = measure if len(query.aggregates) == 1 else f"{measure} ({aggregate})"
+                columns[name] = self._statistic(aggregate, stats, measure, count, total)
+        result = pd.DataFrame(columns)
+        if query.dimensions:
+            if result.index.nlevels > 1:
+                result = result.reorder_levels(list(query.dimensions)).sort_index()
+            return result.reset_index()
+        return result.reset_index(drop=True)
+
+    @staticmethod
+    def _statistic(aggregate: str, stats: Dict[str, Any], measure: str, count: pd.Series,
+                   total: pd.Series) -> pd.Series:
+        if aggregate in ('sum', 'min', 'max', 'count'):
+            return stats[aggregate][measure]
+        mean = total / count.where(count > 0)
+        if aggregate == 'mean':
+            return mean
+        variance = ((stats['sumsq'][measure] - total * mean) / (count - 1).where(count > 1)).clip(lower=0)
+        return variance if aggregate == 'var' else np.sqrt(variance)
+
+    def dimension_values(self) -> List[str]:
+        """Every value of every dimension, as text"""
+        values = set()
+        for group, stats in self.cuboids.items():
+            if len(group) == 1:
+                values.update(str(value) for value in stats['rows'].index if pd.notna(value))
+        return sorted(values)
+
+
+class CubeQueryMatcher:
+    """Recognizes plain group-by questions ("mean P Change by Sector") that a ``RollupCube`` answers exactly
+
+    Deliberately conservative: a question with any word besides column names,
+    aggregate and grouping words and ``STOP_WORDS`` (a filter value, a time
+    window, ranking, charting...) is not matched and takes the LLM path.
+    """
+
+    def match(self, question: str, cube: RollupCube) -> Optional[CubeQuery]:
+        text = ' '.join(question.split())
+        aggregates = [name for name, pattern in AGGREGATE_PATTERNS.items() if re.search(pattern, text, re.IGNORECASE)]
+        if not aggregates:
+            return None
+
+        # Longest names first so "P Change" is not also read as "Change"
+        columns = sorted(cube.dimensions + cube.measures, key=len, reverse=True)
+        names = '|'.join(re.escape(column) for column in columns)
+        listing = rf'(?:(?:the|each)\s+)?(?<!\w)(?:{names})(?!\w)'
+        grouping = re.compile(rf'\b{GROUPING_WORDS}\s+({listing}(?:\s*(?:,|and|&)\s*{listing})*)', re.IGNORECASE)
+        grouped_text = ' '.join(match.group(1) for match in grouping.finditer(text))
+
+        mentioned, dimensions, remainder = [], [], text
+        for column in columns:
+            pattern = re.compile(rf'(?<!\w){re.escape(column)}(?!\w)', re.IGNORECASE)
+            if not pattern.search(remainder):
+                continue
+            grouped = pattern.search(grouped_text) is not None
+            if (column in cube.dimensions) != grouped:
+                return None  # a dimension used as a filter, or grouping by a measure
+            (dimensions if grouped else mentioned).append(column)
+            remainder = pattern.sub(' ', remainder)
+            grouped_text = pattern.sub(' ', grouped_text)
+
+        if UNSUPPORTED_PATTERN.search(remainder):
+            return None
+        for pattern in AGGREGATE_PATTERNS.values():
+            remainder = re.sub(pattern, ' ', remainder, flags=re.IGNORECASE)
+        if any(word not in STOP_WORDS for word in re.findall(r"[\w']+", remainder.lower())):
+            return None
+        if any(re.search(rf'(?<!\w){re.escape(value)}(?!\w)', remainder) for value in cube.dimension_values()):
+            return None
+        if not mentioned and aggregates != ['count']:
+            return None
+        if len(dimensions) > ROLLUP_CONFIG['max_group_columns']:
+            return None
+
+        measures = [column for column in cube.measures if column in mentioned]
+        position = text.lower().find
+        query = CubeQuery(aggregates=aggregates, measures=measures,
+                          dimensions=tuple(sorted(dimensions, key=lambda column: position(column.lower()))))
+        return query if cube.covers(query) else None
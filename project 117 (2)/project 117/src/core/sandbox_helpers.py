@@ -0,0 +1,53 @@
+from pathlib import Path
+from typing import Dict
+from config.settings import EXECUTION_BUDGET_CONFIG, TABLE_TRANSPORT_CONFIG, VIZ_CONFIG
+
+_SANDBOX_DIR = Path(__file__).resolve().parents[1] / 'sandbox'
+
+# Kernel-side modules (src/sandbox), executed as source before every analysis
+SANDBOX_HELPER_MODULES = ('table_transport', 'viz_helpers')
+SANDBOX_HELPER_SOURCES: Dict[str, str] = {
+    name: (_SANDBOX_DIR / f"{name}.py").read_text() for name in SANDBOX_HELPER_MODULES
+}
+
+# Soft address-space ceiling for the kernel; skipped if the kernel already uses more or
+# the platform has no RLIMIT_AS / procfs (the helpers are set up either way)
+MEMORY_LIMIT_CELL = """def _budget_limit_memory(limit):
+    import resource
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    with open('/proc/self/statm') as statm:
+        used = int(statm.read().split()[0]) * resource.getpagesize()
+    if used < limit:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+try:
+    _budget_limit_memory({limit})
+except Exception as _budget_error:
+    print(f"Memory limit not set: {{_budget_error}}")
+del _budget_limit_memory"""
+
+
+def memory_limit_cell() -> str:
+    """Cell run before the setup cell: the kernel's memory ceiling, on its own so failures can't skip the helpers"""
+    return MEMORY_LIMIT_CELL.format(limit=EXECUTION_BUDGET_CONFIG['memory_limit_mb'] * 1024 * 1024)
+
+
+def setup_cell() -> str:
+    """Cell run before the generated code: helper modules, fresh table and chart state"""
+    return '\n'.join([
+        *(SANDBOX_HELPER_SOURCES[name] for name in SANDBOX_HELPER_MODULES),
+        f"_configure_viz(**{dict(VIZ_CONFIG)!r})",
+        "_reset_tables(globals().get('_'))",
+    ])
+
+
+def collect_cell() -> str:
+    """Cell run after a successful execution; prints the table descriptors and chart reports as one JSON object"""
+    config = TABLE_TRANSPORT_CONFIG
+    return (
+        "print(_json.dumps({"
+        f"'tables': _collect_tables(globals().get('_'), {config['compression']!r}, {config['max_table_bytes']}, "
+        f"{config['max_tables']}), "
+        "'charts': _collect_chart_reports()}))"
+    )
@@ -0,0 +1,107 @@
+import contextlib
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Iterator, List, Optional
+from e2b_code_interpreter import Sandbox
+import logging
+
+from src.core.code_executor import restart_kernel
+from src.utils.metrics import get_metrics, MetricsRecorder
+from config.settings import SANDBOX_POOL_CONFIG
+
+
+class SandboxPool:
+    """Warm E2B sandboxes reused across requests.
+
+    ``lease(api_key)`` hands out an idle sandbox for that key (or starts one)
+    and takes it back afterwards with a fresh kernel: variables are reset by
+    restarting the code context, while uploaded files stay, so ``FileHandler``
+    can skip re-uploading a dataset the sandbox already holds. At most
+    ``max_per_key`` sandboxes per key are leased at once; a sandbox whose lease
+    raised is killed rather than reused.
+    """
+
+    def __init__(self, factory: Optional[Callable[[str], Sandbox]] = None,
+                 metrics: Optional[MetricsRecorder] = None):
+        self.logger = logging.getLogger(__name__)
+        self.metrics = metrics or get_metrics()
+        self.factory = factory or (lambda api_key: Sandbox(api_key=api_key,
+                                                           timeout=SANDBOX_POOL_CONFIG['sandbox_timeout']))
+        self._idle: Dict[str, List[Sandbox]] = defaultdict(list)
+        self._limits: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def lease(self, api_key: str) -> Iterator[Sandbox]:
+        with self._lock:
+            limit = self._limits.setdefault(api_key, threading.BoundedSemaphore(SANDBOX_POOL_CONFIG['max_per_key']))
+        limit.acquire()
+        sandbox = None
+        try:
+            sandbox = self._take(api_key)
+            yield sandbox
+        except BaseException:
+            if sandbox is not None:
+                self._discard(sandbox)
+                sandbox = None
+            raise
+        finally:
+            if sandbox is not None:
+                self._give_back(api_key, sandbox)
+            limit.release()
+
+    def _take(self, api_key: str) -> Sandbox:
+        while True:
+            with self._lock:
+                sandbox = self._idle[api_key].pop() if self._idle[api_key] else None
+            if sandbox is None:
+                self.metrics.increment('sandbox_pool.started')
+                return self.factory(api_key)
+            try:
+                if sandbox.is_running():
+                    sandbox.set_timeout(SANDBOX_POOL_CONFIG['sandbox_timeout'])
+                    self.metrics.increment('sandbox_pool.reused')
+                    return sandbox
+            except Exception as e:
+                self.logger.warning(f"Dropping unhealthy pooled sandbox: {str(e)}")
+            self._discard(sandbox)
+
+    def _give_back(self, api_key: str, sandbox: Sandbox):
+        try:
+            restart_kernel(sandbox)
+        except Exception as e:
+            self.logger.warning(f"Could not reset pooled sandbox kernel: {str(e)}")
+            self._discard(sandbox)
+            return
+        with self._lock:
+            if len(self._idle[api_key]) < SANDBOX_POOL_CONFIG['max_idle_per_key']:
+                self._idle[api_key].append(sandbox)
+                return
+        self._discard(sandbox)
+
+    def _discard(self, sandbox: Sandbox):
+        try:
+            sandbox.kill()
+        except Exception as e:
+            self.logger.warning(f"Failed to stop sandbox: {str(e)}")
+
+    def close(self):
+        """Stop every idle sandbox"""
+        with self._lock:
+            idle = [sandbox for sandboxes in self._idle.values() for sandbox in sandboxes]
+            self._idle.clear()
+        for sandbox in idle:
+            self._discard(sandbox)
+
+
+_default_sandbox_pool: Optional[SandboxPool] = None
+_default_sandbox_pool_lock = threading.Lock()
+
+
+def get_sandbox_pool() -> SandboxPool:
+    """Process-wide sandbox pool"""
+    global _default_sandbox_pool
+    with _default_sandbox_pool_lock:
+        if _default_sandbox_pool is None:
+            _default_sandbox_pool = SandboxPool()
+        return _default_sandbox_pool
@@ -0,0 +1,154 @@
+import json
+from typing import Optional, List, Dict, Any
+import streamlit as st
+from e2b_code_interpreter import Sandbox
+import logging
+
+from src.utils.file_handler import FileHandler
+from config.settings import SESSION_CONFIG
+
+# Runs inside the sandbox kernel; prints a JSON map of user variables to short descriptions
+_INSPECT_VARIABLES = """
+def __describe_session_variables(limit):
+    import json, types
+    import pandas as _pd
+    hidden = {'In', 'Out', 'exit', 'quit', 'get_ipython', 'open'}
+    described = {}
+    for name, value in list(globals().items()):
+        if name.startswith('_') or name in hidden or isinstance(value, types.ModuleType):
+            continue
+        if isinstance(value, _pd.DataFrame):
+            columns = [str(col) for col in value.columns[:25]]
+            described[name] = f"DataFrame {value.shape[0]:,} rows x {value.shape[1]} columns {columns}"
+        elif isinstance(value, _pd.Series):
+            described[name] = f"Series {len(value):,} values, name={value.name!r}, dtype={value.dtype}"
+        elif isinstance(value, (int, float, str, bool)):
+            described[name] = f"{type(value).__name__} = {value!r}"[:120]
+        elif isinstance(value, (list, tuple, dict, set)):
+            described[name] = f"{type(value).__name__} of {len(value)} items"
+        elif callable(value):
+            continue
+        else:
+            described[name] = type(value).__name__
+        if len(described) >= limit:
+            break
+    print(json.dumps(described))
+__describe_session_variables({limit})
+"""
+
+
+class SessionKernel:
+    """A sandbox kernel kept alive across the questions of one Streamlit session.
+
+    The dataset is read once into ``df`` and anything the generated code defines
+    stays in the kernel, so follow-up questions can build on earlier results
+    instead of re-reading the CSV.
+    """
+
+    def __init__(self, api_key: str):
+        self.logger = logging.getLogger(__name__)
+        self.api_key = api_key
+        self.sandbox: Optional[Sandbox] = None
+        self.dataset_path: Optional[str] = None
+        self.dataset: Optional[Dict[str, Any]] = None
+        self.variables: Dict[str, str] = {}
+        self.history: List[Dict[str, str]] = []
+
+    def ensure_sandbox(self) -> Sandbox:
+        """Return the session sandbox, starting a new one if it is missing or expired"""
+        if self.sandbox is not None:
+            try:
+                if self.sandbox.is_running():
+                    self.sandbox.set_timeout(SESSION_CONFIG['sandbox_timeout'])
+                    return self.sandbox
+            except Exception as e:
+                self.logger.warning(f"Session sandbox unavailable, starting a new one: {str(e)}")
+
+        self.sandbox = Sandbox(api_key=self.api_key, timeout=SESSION_CONFIG['sandbox_timeout'])
+        self.dataset_path = None
+        self.dataset = None
+        self.variables = {}
+        self.history = []
+        self.sandbox.run_code(
+            "import pandas as pd\nimport numpy as np\nimport matplotlib.pyplot as plt"
+        )
+        return self.sandbox
+
+    def load_dataset(self, file_handler: FileHandler, uploaded_file, dataset: Dict[str, Any]) -> str:
+        """Make sure the kernel's ``df`` holds this version of the dataset"""
+        sandbox = self.ensure_sandbox()
+        previous = self.dataset
+        dataset_path = file_handler.upload_to_sandbox(sandbox, uploaded_file, dataset)
+        if previous is not None and previous['fingerprint'] == dataset['fingerprint'] and dataset_path == self.dataset_path:
+            return dataset_path
+
+        # Generated code may have rebound or mutated ``df``, so a new version is
+        # always read from the (incrementally uploaded) file
+        if previous is None or dataset['parent'] != previous['fingerprint']:
+            self.history = []
+        code = f"import pandas as pd\ndf = pd.read_csv({dataset_path!r})"
+        execution = sandbox.run_code(code)
+        if execution.error:
+            raise RuntimeError(f"Failed to load dataset into the session kernel: {execution.error.value}")
+
+        self.dataset_path = dataset_path
+        self.dataset = dataset
+        self.refresh_variables()
+        return dataset_path
+
+    def refresh_variables(self):
+        """Re-read the user variables defined in the kernel"""
+        try:
+            execution = self.sandbox.run_code(_INSPECT_VARIABLES.replace('{limit}', str(SESSION_CONFIG['max_variables'])))
+            self.variables = json.loads(''.join(execution.logs.stdout) or '{}')
+            if self.dataset is not None and 'df' not in self.variables:
+                # The kernel was restarted (e.g. after an execution timeout): reload on the next question
+                self.logger.warning("Session kernel lost its state; the dataset will be reloaded")
+                self.dataset = None
+                self.dataset_path = None
+                self.history = []
+        except Exception as e:
+            self.logger.warning(f"Could not inspect session variables: {str(e)}")
+            self.variables = {}
+
+    def record_turn(self, question: str, code: str):
+        """Remember an answered question so follow-ups can refer to it"""
+        if code:
+            self.history.append({'question': question, 'code': code})
+            self.history = self.history[-SESSION_CONFIG['history_turns']:]
+        self.refresh_variables()
+
+    def prompt_context(self) -> Dict[str, Any]:
+        """What the LLM needs to know about the live kernel"""
+        return {'variables': dict(self.variables), 'history': list(self.history)}
+
+    def close(self):
+        """Shut down the session sandbox"""
+        if self.sandbox is not None:
+            try:
+                self.sandbox.kill()
+            except Exception as e:
+                self.logger.warning(f"Failed to stop session sandbox: {str(e)}")
+        self.sandbox = None
+        self.dataset = None
+        self.dataset_path = None
+        self.variables = {}
+        self.history = []
+
+
+def get_session_kernel() -> SessionKernel:
+    """The kernel of the current Streamlit session, recreated when the E2B key changes"""
+    kernel = st.session_state.get('session_kernel')
+    if kernel is None or kernel.api_key != st.session_state.e2b_api_key:
+        if kernel is not None:
+            kernel.close()
+        kernel = SessionKernel(st.session_state.e2b_api_key)
+        st.session_state.session_kernel = kernel
+    return kernel
+
+
+def reset_session_kernel():
+    """Drop the current session's kernel and everything defined in it"""
+    kernel = st.session_state.pop('session_kernel', None)
+    if kernel is not None:
+        kernel.close()
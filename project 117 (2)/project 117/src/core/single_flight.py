@@ -0,0 +1,151 @@
+import queue
+import re
+import threading
+from typing import Callable, Dict, Any, Optional, Tuple
+import logging
+
+from src.utils.metrics import get_metrics, MetricsRecorder
+
+_DONE = object()
+
+
+def coalescing_key(fingerprint: str, model: str, query: str, *variant) -> Tuple:
+    """Key under which identical analyses are coalesced: dataset, model and normalized question"""
+    normalized = re.sub(r'\s+', ' ', query).strip().lower().rstrip('?.! ')
+    return (fingerprint, model, normalized) + variant
+
+
+class _Flight:
+    """One in-flight run and the update queues of the sessions waiting on it"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.updates = []
+        self.subscribers = []
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Coalesces concurrent identical requests onto one run.
+
+    The first caller for a key (the leader) runs ``fn(publish)``; callers that
+    arrive with the same key while it is running wait for it and receive the
+    same result (or exception). Everything the leader passes to ``publish`` is
+    delivered to every caller's ``on_update`` on that caller's own thread,
+    including updates published before a follower joined. Nothing is cached
+    after the run finishes.
+    """
+
+    def __init__(self, metrics: Optional[MetricsRecorder] = None):
+        self.logger = logging.getLogger(__name__)
+        self.metrics = metrics or get_metrics()
+        self._flights: Dict[Any, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Any, fn: Callable[[Callable[[Any], None]], Any],
+           on_update: Optional[Callable[[Any], None]] = None,
+           check: Optional[Callable[[], None]] = None) -> Any:
+        """Run ``fn`` for ``key`` or join the run already in flight
+
+        A waiting caller calls ``check`` periodically; it may raise to stop
+        waiting (e.g. when the caller's job is cancelled).
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+            else:
+                updates: queue.Queue = queue.Queue()
+                with flight.lock:
+                    for update in flight.updates:
+                        updates.put(update)
+                    flight.subscribers.append(updates)
+            self.metrics.set_gauge('singleflight.in_flight', len(self._flights))
+
+        if leader:
+            self.metrics.increment('singleflight.runs')
+            return self._lead(key, flight, fn, on_update)
+
+        self.metrics.increment('singleflight.coalesced')
+        self.logger.info(f"Joined in-flight analysis for {key!r}")
+        try:
+            while True:
+                try:
+                    update = updates.get(timeout=0.5)
+                except queue.Empty:
+                    if check is not None:
+                        check()
+                    continue
+                if update is _DONE:
+                    break
+                if on_update is not None:
+                    on_update(update)
+        except BaseException:
+            # A follower that stops waiting no longer counts as one
+            with flight.lock:
+                flight.subscribers.remove(updates)
+            raise
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def in_flight(self, key: Any) -> bool:
+        with self._lock:
+            return key in self._flights
+
+    def followers(self, key: Any) -> int:
+        """Callers still waiting on the run in flight for ``key``"""
+        with self._lock:
+            flight = self._flights.get(key)
+        if flight is None:
+            return 0
+        with flight.lock:
+            return len(flight.subscribers)
+
+    def _lead(self, key: Any, flight: _Flight, fn: Callable, on_update: Optional[Callable[[Any], None]]) -> Any:
+        def publish(update: Any):
+            if on_update is not None:
+                on_update(update)
+            self._publish(flight, update)
+
+        try:
+            flight.result = fn(publish)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        except BaseException:
+            # The leader was stopped (script rerun, job cancelled); followers get an ordinary error
+            flight.error = RuntimeError("The shared analysis run was interrupted")
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                self.metrics.set_gauge('singleflight.in_flight', len(self._flights))
+            self._publish(flight, _DONE)
+
+    @staticmethod
+    def _publish(flight: _Flight, update: Any):
+        with flight.lock:
+            if update is not _DONE:
+                flight.updates.append(update)
+            subscribers = list(flight.subscribers)
+        for subscriber in subscribers:
+            subscriber.put(update)
+
+
+_default_single_flight: Optional[SingleFlight] = None
+_default_single_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    """Process-wide coalescer shared by every Streamlit session"""
+    global _default_single_flight
+    with _default_single_flight_lock:
+        if _default_single_flight is None:
+            _default_single_flight = SingleFlight()
+        return _default_single_flight
@@ -0,0 +1,222 @@
+import io
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import pyarrow as pa
+import pyarrow.csv
+import logging
+
+from src.core.dataset_store import fingerprint_bytes
+from src.utils.metrics import get_metrics
+from config.settings import SQL_ENGINE_CONFIG
+
+try:
+    import duckdb
+except ImportError:  # SQL mode is unavailable; questions take the sandbox path
+    duckdb = None
+
+# Generated SQL may only read the registered tables
+READ_ONLY_START = re.compile(r'^\s*(select|with|from|values)\b', re.IGNORECASE)
+FORBIDDEN_SQL = re.compile(
+    r'\b(insert|update|delete|create|drop|alter|copy|attach|detach|install|load|pragma|export|import|set|reset|'
+    r'call|checkpoint|vacuum|read_\w+|\w+_scan|glob|sniff_csv|duckdb_\w+|pragma_\w+|getenv|current_setting)\b',
+    re.IGNORECASE
+)
+
+
+def table_name(file_name: str) -> str:
+    """SQL identifier for an uploaded file ("NSE Data (1).csv" → nse_data_1)"""
+    stem = os.path.splitext(os.path.basename(file_name))[0]
+    name = re.sub(r'\W+', '_', stem).strip('_').lower() or 'data'
+    return f"t_{name}" if name[0].isdigit() else name
+
+
+def check_select(sql: str) -> str:
+    """The query without comments and trailing semicolons; raises ValueError unless it is a single read-only query"""
+    query = re.sub(r'--[^\n]*|/\*.*?\*/', ' ', sql, flags=re.DOTALL).strip().rstrip(';').strip()
+    # String literals and quoted identifiers may contain anything; only the rest of the query is checked
+    code = re.sub(r'"(?:[^"]|"")*"', '""', re.sub(r"'(?:[^']|'')*'", "''", query))
+    # A quoted name after FROM/JOIN is a file read in DuckDB
+    if re.search(r"\b(from|join)\s*\(?\s*'", query, re.IGNORECASE):
+        raise ValueError("files cannot be read; query the registered tables only")
+    if not READ_ONLY_START.match(code):
+        raise ValueError("only SELECT queries can be run")
+    if ';' in code:
+        raise ValueError("only a single query can be run")
+    forbidden = FORBIDDEN_SQL.search(code)
+    if forbidden:
+        raise ValueError(f"'{forbidden.group(0)}' is not allowed; query the registered tables only")
+    return query
+
+
+class SQLEngine:
+    """Embedded DuckDB databases holding uploaded CSV files as columnar tables
+
+    Uploads are parsed straight into Arrow (multi-threaded, without pandas)
+    once per content fingerprint. Each set of uploads queried together (one
+    session's dataset and the files joined with it) gets its own in-memory
+    database holding only those tables, under their file names, so relational
+    questions join several files on the host with DuckDB's vectorized,
+    multi-core execution and cannot see other sessions' uploads. Once loaded, a
+    database has external access disabled and its configuration locked, so
+    generated SQL cannot read host files. The least recently used uploads and
+    databases are dropped beyond ``max_tables`` and ``max_databases``.
+    """
+
+    def __init__(self, threads: Optional[int] = None, memory_limit: Optional[str] = None,
+                 max_tables: Optional[int] = None, max_rows: Optional[int] = None,
+                 max_databases: Optional[int] = None):
+        self.logger = logging.getLogger(__name__)
+        self.metrics = get_metrics()
+        self.threads = threads or SQL_ENGINE_CONFIG['threads'] or os.cpu_count() or 1
+        self.memory_limit = memory_limit or SQL_ENGINE_CONFIG['memory_limit']
+        self.max_tables = max_tables or SQL_ENGINE_CONFIG['max_tables']
+        self.max_rows = max_rows or SQL_ENGINE_CONFIG['max_rows']
+        self.max_databases = max_databases or SQL_ENGINE_CONFIG['max_databases']
+        self._tables: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._databases: "OrderedDict[Tuple[str, ...], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return duckdb is not None
+
+    def register(self, name: str, data: bytes, fingerprint: str) -> str:
+        """Parse an uploaded CSV (once per fingerprint); returns the table name it is queried by"""
+        if not self.available:
+            raise RuntimeError("The SQL engine needs the duckdb package")
+        with self._lock:
+            if fingerprint in self._tables:
+                self._tables.move_to_end(fingerprint)
+                return self._tables[fingerprint]['name']
+
+        started = time.perf_counter()
+        arrow_table = pyarrow.csv.read_csv(io.BytesIO(data))
+        with self._lock:
+            self._tables[fingerprint] = {'name': table_name(name), 'arrow': arrow_table}
+            while len(self._tables) > self.max_tables:
+                self._tables.popitem(last=False)
+
+        elapsed = time.perf_counter() - started
+        self.metrics.increment('sql.registered_rows', arrow_table.num_rows)
+        self.metrics.observe('sql.register_latency', elapsed)
+        self.logger.info(f"Registered {name} as SQL table {table_name(name)} ({arrow_table.num_rows:,} rows) "
+                         f"in {elapsed * 1000:.0f} ms")
+        return table_name(name)
+
+    def register_uploads(self, uploads: List[Any]) -> List[str]:
+        """Register uploaded files (anything with ``name`` and ``getvalue()``); returns their fingerprints"""
+        fingerprints = []
+        for upload in uploads:
+            data = upload.getvalue()
+            fingerprint = fingerprint_bytes(data)
+            self.register(upload.name, data, fingerprint)
+            fingerprints.append(fingerprint)
+        return fingerprints
+
+    def _session_tables(self, fingerprints: List[str]) -> List[Tuple[str, pa.Table]]:
+        """(name, table) of each registered upload, with repeated file names numbered; call with the lock held"""
+        tables, names = [], set()
+        for fingerprint in dict.fromkeys(fingerprints):
+            if fingerprint not in self._tables:
+                continue
+            entry = self._tables[fingerprint]
+            name, suffix = entry['name'], 2
+            while name in names:
+                name, suffix = f"{entry['name']}_{suffix}", suffix + 1
+            names.add(name)
+            tables.append((name, entry['arrow']))
+        return tables
+
+    def describe(self, fingerprints: List[str]) -> List[str]:
+        """One line per table (name, rows, columns and types), for the LLM prompt"""
+        with self._lock:
+            tables = self._session_tables(fingerprints)
+        return [f"{name} ({table.num_rows:,} rows): " +
+                ", ".join(f'"{field.name}" {field.type}' for field in table.schema) for name, table in tables]
+
+    def _database(self, fingerprints: List[str]) -> Dict[str, Any]:
+        """The database holding exactly the tables of ``fingerprints``, loaded on first use"""
+        key = tuple(sorted(set(fingerprints)))
+        with self._lock:
+            database = self._databases.get(key)
+            if database is not None:
+                self._databases.move_to_end(key)
+                return database
+            missing = [fingerprint for fingerprint in key if fingerprint not in self._tables]
+            if missing:
+                raise KeyError(f"{len(missing)} table(s) are no longer loaded; upload the files again")
+            tables = self._session_tables(fingerprints)
+
+        connection = duckdb.connect(database=':memory:',
+                                    config={'threads': self.threads, 'memory_limit': self.memory_limit})
+        for name, table in tables:
+            connection.register('_upload', table)
+            connection.execute(f'CREATE TABLE "{name}" AS SELECT * FROM _upload')
+            connection.unregister('_upload')
+        # From here on queries only see the tables above: no files, extensions or setting changes
+        connection.execute("SET enable_external_access = false")
+        connection.execute("SET lock_configuration = true")
+        database = {'connection': connection, 'tables': {name for name, _ in tables}, 'lock': threading.Lock()}
+
+        with self._lock:
+            self._databases[key] = database
+            while len(self._databases) > self.max_databases:
+                _, evicted = self._databases.popitem(last=False)
+                with evicted['lock']:
+                    evicted['connection'].close()
+        return database
+
+    def query(self, sql: str, fingerprints: List[str]) -> pa.Table:
+        """Run a read-only query against the tables of ``fingerprints``; at most ``max_rows`` rows are returned"""
+        if not self.available:
+            raise RuntimeError("The SQL engine needs the duckdb package")
+        query = check_select(sql)
+        database = self._database(fingerprints)
+
+        started = time.perf_counter()
+        with database['lock']:
+            try:
+                # Allow-list from DuckDB's own parser: only the session's tables (and CTEs) may be referenced
+                ctes = {match.lower() for match in re.findall(r'(?:\bwith|,)\s*"?(\w+)"?\s+as\s*\(', query,
+                                                              re.IGNORECASE)}
+                referenced = database['connection'].get_table_names(query)
+                unknown = sorted(name for name in referenced
+                                 if name not in database['tables'] and name.lower() not in ctes)
+                if unknown:
+                    raise ValueError(f"unknown table(s) {', '.join(unknown)}; "
+                                     f"available: {', '.join(sorted(database['tables']))}")
+                cursor = database['connection'].cursor()
+                try:
+                    result = cursor.execute(f"SELECT * FROM ({query}) LIMIT {self.max_rows + 1}").fetch_arrow_table()
+                finally:
+                    cursor.close()
+            except Exception:
+                self.metrics.increment('sql.queries', status='failed')
+                raise
+
+        elapsed = time.perf_counter() - started
+        self.metrics.increment('sql.queries', status='ok')
+        self.metrics.observe('sql.latency', elapsed)
+        if result.num_rows > self.max_rows:
+            self.metrics.increment('sql.truncated')
+            self.logger.warning(f"SQL result truncated to {self.max_rows:,} rows")
+            result = result.slice(0, self.max_rows)
+        self.logger.info(f"SQL query returned {result.num_rows:,} rows in {elapsed * 1000:.1f} ms")
+        return result
+
+
+_default_engine: Optional[SQLEngine] = None
+_default_engine_lock = threading.Lock()
+
+
+def get_sql_engine() -> SQLEngine:
+    """Process-wide SQL engine, so uploads are parsed once for all sessions"""
+    global _default_engine
+    with _default_engine_lock:
+        if _default_engine is None:
+            _default_engine = SQLEngine()
+        return _default_engine
@@ -0,0 +1,172 @@
+import io
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+import logging
+
+from src.core.table_results import TableResult
+from config.settings import PROGRESSIVE_CONFIG
+
+# Missing stratum values form a stratum of their own
+MISSING_STRATUM = '<missing>'
+
+
+class StratifiedSample:
+    """A stratified random sample of a large dataset, for approximate previews
+
+    Rows are drawn per stratum (a low-cardinality column such as Sector or
+    Symbol) in proportion to its size, with at least ``min_per_stratum`` rows
+    so small strata still show up. Generated code is first run on the sample;
+    ``annotate`` then recognizes result columns that are per-stratum or overall
+    means and sums of a dataset column, scales sums up to the full data and adds
+    confidence bounds. Instances are not modified after construction.
+    """
+
+    def __init__(self, sample: pd.DataFrame, stratum: Optional[str], population: pd.Series, rows: int):
+        self.logger = logging.getLogger(__name__)
+        self.sample = sample
+        self.stratum = stratum
+        self.population = population  # full-data rows per stratum
+        self.rows = rows
+        self.sizes = self._strata(sample).value_counts()  # sample rows per stratum
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, analysis: Dict[str, Any], value_counts: Dict[str, pd.Series],
+                   sample_rows: Optional[int] = None, min_rows: Optional[int] = None) -> Optional['StratifiedSample']:
+        """Draw the sample, or None when ``df`` is small enough to answer on the full data"""
+        config = PROGRESSIVE_CONFIG
+        sample_rows = sample_rows or config['sample_rows']
+        if len(df) < (min_rows or config['min_rows']) or len(df) <= sample_rows:
+            return None
+
+        stratum = cls._choose_stratum(analysis, value_counts)
+        keys = cls._keys(df, stratum)
+        population = keys.value_counts()
+        quota = np.maximum(np.round(population * sample_rows / len(df)), config['min_per_stratum'])
+        quota = np.minimum(quota, population).astype(int)
+
+        # A random rank within each stratum keeps the first ``quota`` rows of it, in the original row order
+        rng = np.random.default_rng(config['seed'])
+        rank = pd.Series(rng.random(len(df)), index=df.index).groupby(keys.to_numpy()).rank(method='first')
+        sample = df[rank.to_numpy() <= keys.map(quota).to_numpy()]
+        instance = cls(sample, stratum, population, len(df))
+        instance.logger.info(f"Drew a stratified sample of {len(sample):,} of {len(df):,} rows "
+                             f"({len(population)} strata of {stratum or 'the whole dataset'})")
+        return instance
+
+    @staticmethod
+    def _choose_stratum(analysis: Dict[str, Any], value_counts: Dict[str, pd.Series]) -> Optional[str]:
+        """The first configured stratum column present, else the categorical column with fewest values"""
+        config = PROGRESSIVE_CONFIG
+        candidates = {column: len(counts) for column, counts in value_counts.items()
+                      if column in analysis.get('categorical_columns', []) and 1 < len(counts) <= config['max_strata']}
+        preferred = [column for column in config['stratum_columns'] if column in candidates]
+        if preferred:
+            return preferred[0]
+        return min(candidates, key=candidates.get) if candidates else None
+
+    @staticmethod
+    def _keys(df: pd.DataFrame, stratum: Optional[str]) -> pd.Series:
+        if stratum is None:
+            return pd.Series(MISSING_STRATUM, index=df.index)
+        return df[stratum].astype(object).where(df[stratum].notna(), MISSING_STRATUM)
+
+    def _strata(self, df: pd.DataFrame) -> pd.Series:
+        return self._keys(df, self.stratum)
+
+    @property
+    def fraction(self) -> float:
+        return len(self.sample) / self.rows if self.rows else 1.0
+
+    def to_csv(self) -> bytes:
+        """The sample as a CSV file, uploaded next to the dataset"""
+        buffer = io.BytesIO()
+        self.sample.to_csv(buffer, index=False)
+        return buffer.getvalue()
+
+    def describe(self) -> str:
+        strata = f"stratified on `{self.stratum}` ({len(self.population)} strata)" if self.stratum else "uniform"
+        return f"{len(self.sample):,} of {self.rows:,} rows ({self.fraction:.1%}), {strata}"
+
+    def annotate(self, table: pd.DataFrame) -> Optional[pd.DataFrame]:
+        """``table`` with recognized sums scaled to the full data and ``± 95%`` bound columns, or None
+
+        A numeric result column named after a dataset column is recognized
+        when, row by row, it equals the sample mean or sum of that column in
+        the row's stratum (tables grouped by the stratum column) or over the
+        whole sample (single-row tables). Anything else is left as computed on
+        the sample.
+        """
+        if self.stratum is not None and self.stratum not in table.columns and self.stratum in table.index.names:
+            table = table.reset_index()
+        grouped = self.stratum is not None and self.stratum in table.columns
+        if not grouped and len(table) != 1:
+            return None
+
+        annotated, changed = table.copy(), False
+        for column in table.columns:
+            if (column == self.stratum or column not in self.sample.columns
+                    or not pd.api.types.is_numeric_dtype(table[column])
+                    or not pd.api.types.is_numeric_dtype(self.sample[column])):
+                continue
+            strata = (table[self.stratum].astype(object).where(table[self.stratum].notna(), MISSING_STRATUM)
+                      if grouped else None)
+            estimate = self._estimate(column, table[column], strata)
+            if estimate is None:
+                continue
+            values, bounds = estimate
+            annotated[column] = values
+            position = annotated.columns.get_loc(column) + 1
+            annotated.insert(position, f"{column} ± 95%", bounds)
+            changed = True
+        return annotated if changed else None
+
+    def _estimate(self, column: str, values: pd.Series, strata: Optional[pd.Series]):
+        """Full-data estimates and bounds for a result column recognized as a mean or sum, else None"""
+        z = PROGRESSIVE_CONFIG['confidence_z']
+        sample = pd.to_numeric(self.sample[column], errors='coerce')
+        keys = self._strata(self.sample)
+        by_stratum = sample.groupby(keys.to_numpy())
+        stats = pd.DataFrame({'n': by_stratum.count(), 'mean': by_stratum.mean(), 'sum': by_stratum.sum(),
+                              'var': by_stratum.var()})
+        stats['N'] = self.population.reindex(stats.index).astype(float) * stats['n'] / self.sizes.reindex(stats.index)
+        stats['var'] = stats['var'].fillna(0.0)
+        stats['fpc'] = (1 - stats['n'] / stats['N']).clip(lower=0)
+
+        if strata is not None:
+            stats = stats.reindex(strata.to_numpy())
+            for kind in ('mean', 'sum'):
+                if np.allclose(values.to_numpy(dtype=float), stats[kind].to_numpy(), rtol=1e-6, equal_nan=True):
+                    se = np.sqrt(stats['fpc'] * stats['var'] / stats['n'])
+                    if kind == 'mean':
+                        return values.to_numpy(), (z * se).to_numpy()
+                    scale = (stats['N'] / stats['n']).to_numpy()
+                    return values.to_numpy() * scale, (z * stats['N'] * se).to_numpy()
+            return None
+
+        value = float(values.iloc[0])
+        weights = stats['N'] / stats['N'].sum()
+        if np.isclose(value, sample.mean(), rtol=1e-6):
+            # Proportional allocation: the sample mean is (close to) the stratified estimate
+            estimate = float((weights * stats['mean']).sum())
+            se = np.sqrt((weights ** 2 * stats['fpc'] * stats['var'] / stats['n']).sum())
+            return [estimate], [z * se]
+        if np.isclose(value, sample.sum(), rtol=1e-6):
+            estimate = float((stats['N'] * stats['mean']).sum())
+            se = np.sqrt((stats['N'] ** 2 * stats['fpc'] * stats['var'] / stats['n']).sum())
+            return [estimate], [z * se]
+        return None
+
+    def annotate_results(self, results: List[Any]) -> List[Any]:
+        """Replace sandbox tables by their annotated version where ``annotate`` recognizes columns"""
+        annotated = []
+        for result in results:
+            if isinstance(result, TableResult):
+                try:
+                    table = self.annotate(result.table.to_pandas())
+                    if table is not None:
+                        result = TableResult.from_frame(result.name, table)
+                except Exception as e:
+                    self.logger.warning(f"Could not add error bounds to {result.name}: {str(e)}")
+            annotated.append(result)
+        return annotated
@@ -0,0 +1,58 @@
+import io
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv
+
+
+@dataclass
+class TableResult:
+    """A DataFrame result received from the sandbox as an Arrow IPC file
+
+    ``table`` reads its buffers straight out of ``data`` (after decompression),
+    so the table is never converted to pandas on the host; pages are zero-copy
+    slices and ``data`` can be downloaded as-is.
+    """
+    name: str
+    data: bytes
+    table: pa.Table = field(repr=False)
+
+    @classmethod
+    def from_ipc(cls, name: str, data: bytes) -> 'TableResult':
+        table = pa.ipc.open_file(pa.py_buffer(data)).read_all()
+        return cls(name=name, data=bytes(data), table=table)
+
+    @classmethod
+    def from_frame(cls, name: str, df: pd.DataFrame) -> 'TableResult':
+        """A table computed on the host (e.g. a local answer), shown like sandbox tables"""
+        return cls.from_arrow(name, pa.Table.from_pandas(df, preserve_index=False))
+
+    @classmethod
+    def from_arrow(cls, name: str, table: pa.Table) -> 'TableResult':
+        """An Arrow table computed on the host (e.g. a SQL engine result)"""
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        return cls(name=name, data=sink.getvalue().to_pybytes(), table=table)
+
+    @property
+    def num_rows(self) -> int:
+        return self.table.num_rows
+
+    @property
+    def column_names(self) -> List[str]:
+        return self.table.column_names
+
+    def page(self, page: int, page_size: int) -> pa.Table:
+        return self.table.slice(page * page_size, page_size)
+
+    def to_csv(self) -> bytes:
+        buffer = io.BytesIO()
+        pyarrow.csv.write_csv(self.table, buffer)
+        return buffer.getvalue()
+
+    def preview(self, rows: int) -> Dict[str, Any]:
+        """JSON-friendly summary with the first ``rows`` rows"""
+        return {'name': self.name, 'rows': self.num_rows, 'columns': self.column_names,
+                'preview': self.table.slice(0, rows).to_pylist()}
\ No newline at end of file
@@ -0,0 +1,202 @@
+import io
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather
+import logging
+
+from src.utils.metrics import get_metrics
+from config.settings import TIMESERIES_CONFIG
+
+# Columns of the bars handed out; FirstTime/LastTime only serve merging
+BAR_COLUMNS = ['Symbol', 'Time', 'Open', 'High', 'Low', 'Close', 'Volume', 'VWAP', 'Ticks']
+
+
+def _first_present(df: pd.DataFrame, candidates: List[str]) -> Optional[str]:
+    return next((column for column in candidates if column in df.columns), None)
+
+
+def _combine(bars: pd.DataFrame, freq: str) -> pd.DataFrame:
+    """Merge bars into ``freq`` buckets per symbol
+
+    Bars are mergeable aggregates, so the same step builds a level from ticks
+    (one-tick bars), rolls a level up into a coarser one and folds new ticks
+    into existing buckets, even when they arrive out of order.
+    """
+    bars = bars.assign(Time=bars['Time'].dt.floor(freq))
+    groups = bars.groupby(['Symbol', 'Time'], sort=True, observed=True)
+    combined = groups.agg(High=('High', 'max'), Low=('Low', 'min'), Volume=('Volume', 'sum'), PV=('PV', 'sum'),
+                          Ticks=('Ticks', 'sum'), FirstTime=('FirstTime', 'min'), LastTime=('LastTime', 'max'))
+    combined['Open'] = bars['Open'].to_numpy()[bars.index.get_indexer(groups['FirstTime'].idxmin())]
+    combined['Close'] = bars['Close'].to_numpy()[bars.index.get_indexer(groups['LastTime'].idxmax())]
+    return combined.reset_index()
+
+
+class TimeSeriesIndex:
+    """Intraday ticks parsed, sorted and partitioned by symbol once, with OHLCV/VWAP bar pyramids
+
+    Bars are kept per level of ``TIMESERIES_CONFIG['levels']`` (1m → 5m → 1h →
+    1d), each rolled up from the one below. ``bars`` serves a request from the
+    coarsest level that is still fine enough, and ``extended`` folds appended
+    rows into a new index touching only the buckets they fall in. Instances are
+    not modified after construction, so cached dataset entries can share them.
+    """
+
+    def __init__(self, ticks: pd.DataFrame, levels: Dict[str, pd.DataFrame], columns: Dict[str, Optional[str]]):
+        self.logger = logging.getLogger(__name__)
+        self.metrics = get_metrics()
+        self.ticks = ticks
+        self.levels = levels
+        self.columns = columns
+        self.partitions: Dict[str, Tuple[int, int]] = self._partition(ticks)
+
+    @classmethod
+    def detect(cls, df: pd.DataFrame) -> Optional[Dict[str, Optional[str]]]:
+        """Time, symbol, price and volume columns of intraday data, or None"""
+        price = _first_present(df, TIMESERIES_CONFIG['price_columns'])
+        if price is None or not pd.api.types.is_numeric_dtype(df[price]):
+            return None
+        for column in TIMESERIES_CONFIG['time_columns']:
+            if column not in df.columns:
+                continue
+            sample = df[column].dropna().head(100)
+            if len(sample) and pd.to_datetime(sample, errors='coerce').notna().mean() >= 0.9:
+                return {
+                    'time': column,
+                    'symbol': _first_present(df, TIMESERIES_CONFIG['symbol_columns']),
+                    'price': price,
+                    'volume': _first_present(df, TIMESERIES_CONFIG['volume_columns']),
+                }
+        return None
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> Optional['TimeSeriesIndex']:
+        """Build the index for ``df``, or None if it has no time and price columns"""
+        columns = cls.detect(df)
+        if columns is None:
+            return None
+        started = time.perf_counter()
+        ticks = cls._ticks(df, columns)
+        levels = {}
+        bars = ticks
+        for level in TIMESERIES_CONFIG['levels']:
+            bars = _combine(bars, level)
+            levels[level] = bars
+        index = cls(ticks, levels, columns)
+        index.logger.info(f"Built time-series index: {len(ticks):,} ticks, {len(index.partitions)} symbols, "
+                          f"levels {', '.join(f'{level}={len(bars):,}' for level, bars in levels.items())} "
+                          f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return index
+
+    @staticmethod
+    def _ticks(df: pd.DataFrame, columns: Dict[str, Optional[str]]) -> pd.DataFrame:
+        """Rows as one-tick bars, timestamps parsed once, sorted by symbol and time"""
+        price = pd.to_numeric(df[columns['price']], errors='coerce')
+        volume = (pd.to_numeric(df[columns['volume']], errors='coerce').fillna(0) if columns['volume']
+                  else pd.Series(0, index=df.index))
+        when = pd.to_datetime(df[columns['time']], errors='coerce')
+        symbol = df[columns['symbol']].astype(str) if columns['symbol'] else pd.Series('', index=df.index)
+        ticks = pd.DataFrame({
+            'Symbol': symbol, 'Time': when, 'Open': price, 'High': price, 'Low': price, 'Close': price,
+            'Volume': volume, 'PV': price * volume, 'Ticks': 1, 'FirstTime': when, 'LastTime': when,
+        })
+        ticks = ticks[ticks['Time'].notna() & ticks['Open'].notna()]
+        return ticks.sort_values(['Symbol', 'Time'], kind='stable').reset_index(drop=True)
+
+    @staticmethod
+    def _partition(ticks: pd.DataFrame) -> Dict[str, Tuple[int, int]]:
+        """Row range of each symbol in the sorted ticks"""
+        symbols = ticks['Symbol'].to_numpy()
+        if not len(symbols):
+            return {}
+        starts = [0] + (np.flatnonzero(symbols[1:] != symbols[:-1]) + 1).tolist()
+        ends = starts[1:] + [len(symbols)]
+        return {symbols[start]: (start, end) for start, end in zip(starts, ends)}
+
+    def extended(self, tail: pd.DataFrame) -> 'TimeSeriesIndex':
+        """A new index with appended rows folded in; only the buckets they fall in are recomputed"""
+        started = time.perf_counter()
+        new_ticks = self._ticks(tail, self.columns)
+        ticks = pd.concat([self.ticks, new_ticks], ignore_index=True)
+        ticks = ticks.sort_values(['Symbol', 'Time'], kind='stable').reset_index(drop=True)
+        levels = {}
+        for level, bars in self.levels.items():
+            partial = _combine(new_ticks, level)
+            keys = pd.MultiIndex.from_frame(partial[['Symbol', 'Time']])
+            affected = pd.MultiIndex.from_frame(bars[['Symbol', 'Time']]).isin(keys)
+            merged = _combine(pd.concat([bars[affected], partial], ignore_index=True), level)
+            levels[level] = (pd.concat([bars[~affected], merged], ignore_index=True)
+                             .sort_values(['Symbol', 'Time']).reset_index(drop=True))
+        self.logger.info(f"Folded {len(new_ticks):,} ticks into the time-series index in "
+                         f"{(time.perf_counter() - started) * 1000:.0f} ms")
+        return TimeSeriesIndex(ticks, levels, self.columns)
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(self.partitions)
+
+    def symbol_ticks(self, symbol: str) -> pd.DataFrame:
+        """Raw ticks of one symbol (a slice of the sorted partition)"""
+        start, end = self.partitions.get(symbol, (0, 0))
+        return self.ticks.iloc[start:end]
+
+    def level_for(self, freq: str) -> Optional[str]:
+        """Coarsest stored level that ``freq`` is a whole multiple of (None if finer than all levels)"""
+        target = pd.Timedelta(freq)
+        usable = [level for level in self.levels if target % pd.Timedelta(level) == pd.Timedelta(0)]
+        return usable[-1] if usable else None
+
+    def bars(self, symbol: Optional[str] = None, freq: Optional[str] = None, start=None, end=None,
+             max_points: Optional[int] = None) -> pd.DataFrame:
+        """OHLCV/VWAP bars, from the coarsest level that is accurate enough
+
+        With ``freq`` the bars are exactly that resolution (rolled up from the
+        coarsest level dividing it). Without it, the finest level with at most
+        ``max_points`` bars in the selection is used. ``attrs['level']`` names
+        the level the answer came from.
+        """
+        max_points = max_points or TIMESERIES_CONFIG['max_points']
+        if freq is not None:
+            level = self.level_for(freq)
+            if level is None:
+                raise ValueError(f"{freq} is finer than the finest stored level ({next(iter(self.levels))})")
+            selection = self._select(self.levels[level], symbol, start, end)
+            if pd.Timedelta(freq) != pd.Timedelta(level):
+                selection = _combine(selection, freq)
+        else:
+            for level, bars in self.levels.items():
+                selection = self._select(bars, symbol, start, end)
+                if len(selection) <= max_points:
+                    break
+        self.metrics.increment('timeseries.queries', level=level)
+        return self._public(selection, level)
+
+    @staticmethod
+    def _public(bars: pd.DataFrame, level: str) -> pd.DataFrame:
+        result = bars.assign(VWAP=bars['PV'] / bars['Volume'].where(bars['Volume'] > 0))
+        result = result[BAR_COLUMNS].reset_index(drop=True)
+        result.attrs['level'] = level
+        return result
+
+    @staticmethod
+    def _select(bars: pd.DataFrame, symbol: Optional[str], start, end) -> pd.DataFrame:
+        mask = pd.Series(True, index=bars.index)
+        if symbol is not None:
+            mask &= bars['Symbol'] == symbol
+        if start is not None:
+            mask &= bars['Time'] >= pd.Timestamp(start)
+        if end is not None:
+            mask &= bars['Time'] <= pd.Timestamp(end)
+        return bars[mask]
+
+    def level_sizes(self) -> Dict[str, int]:
+        return {level: len(bars) for level, bars in self.levels.items()}
+
+    def to_feather(self, level: str) -> bytes:
+        """One level's bars as a Feather (Arrow IPC) file, as uploaded to the sandbox"""
+        bars = self._public(self.levels[level], level)
+        sink = io.BytesIO()
+        pyarrow.feather.write_feather(pa.Table.from_pandas(bars, preserve_index=False), sink)
+        return sink.getvalue()
@@ -0,0 +1,76 @@
+"""Runs inside the E2B kernel: hands DataFrame results to the host as Arrow IPC files.
+
+The host executes this module's source in the kernel (see ``CodeExecutor``),
+so it must only depend on what the sandbox has: pandas and, if installed,
+pyarrow. Without pyarrow nothing is published and the host falls back to the
+usual text/HTML representations.
+"""
+# Private names: generated code shares this namespace
+import json as _json
+import os as _os
+import uuid as _uuid
+
+_TABLE_DIR = '/tmp/agent_tables'
+
+_published_tables = []
+_previous_result = [None]
+
+
+def publish_table(df, name=None):
+    """Send ``df`` to the app as an interactive table (the cell's final DataFrame is sent automatically)"""
+    _published_tables.append((name or f"table_{len(_published_tables) + 1}", df))
+    return df
+
+
+def _reset_tables(previous_result=None):
+    """Before an execution: forget earlier tables and remember the kernel's current ``_``
+
+    ``_`` only changes when a cell displays a value, so comparing it afterwards
+    tells whether the generated code ended with a DataFrame.
+    """
+    del _published_tables[:]
+    _previous_result[0] = previous_result
+    if _os.path.isdir(_TABLE_DIR):
+        for name in _os.listdir(_TABLE_DIR):
+            _os.remove(_os.path.join(_TABLE_DIR, name))
+
+
+def _collect_tables(last_result, compression, max_bytes, max_tables):
+    """Write published frames (and a DataFrame ``last_result``) as Arrow IPC files; return their descriptors"""
+    import pandas as pd
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return []
+
+    frames = list(_published_tables)
+    if last_result is _previous_result[0]:
+        last_result = None
+    if isinstance(last_result, pd.Series):
+        last_result = last_result.to_frame()
+    if isinstance(last_result, pd.DataFrame) and not any(df is last_result for _, df in frames):
+        frames.append(('result', last_result))
+
+    _os.makedirs(_TABLE_DIR, exist_ok=True)
+    descriptors = []
+    for name, df in frames[:max_tables]:
+        try:
+            table = pa.Table.from_pandas(df)
+            # Arrow column names must be strings
+            table = table.rename_columns([str(column) for column in table.column_names])
+            path = _os.path.join(_TABLE_DIR, f"{_uuid.uuid4().hex}.arrow")
+            options = pa.ipc.IpcWriteOptions(compression=compression if pa.Codec.is_available(compression) else None)
+            with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema, options=options) as writer:
+                writer.write_table(table)
+            size = _os.path.getsize(path)
+            if size > max_bytes:
+                _os.remove(path)
+                descriptors.append({'name': name, 'skipped': 'size', 'bytes': size})
+                continue
+            descriptors.append({'name': name, 'path': path, 'bytes': size, 'rows': table.num_rows,
+                                'columns': table.num_columns})
+        except Exception as e:
+            descriptors.append({'name': name, 'skipped': f"{type(e).__name__}: {e}"})
+    del _published_tables[:]
+    _previous_result[0] = None
+    return descriptors
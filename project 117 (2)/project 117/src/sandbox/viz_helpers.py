@@ -0,0 +1,260 @@
+"""Runs inside the E2B kernel: chart helpers for datasets too large to plot point by point.
+
+Like ``table_transport`` this module's source is executed in the kernel before
+each analysis, so generated code can call ``plot_timeseries``,
+``plot_scatter``, ``hexbin_figure``, ``datashade_figure``, ``to_webgl`` and the
+``lttb_downsample`` / ``minmax_downsample`` primitives directly. Every chart
+built here is recorded (points in and out, estimated payload before and
+after, build time) for the host to collect.
+"""
+# Imported under private names: generated code shares this namespace and may rebind ``time``, ``io``...
+import base64 as _base64
+import io as _io
+import math as _math
+import time as _time
+
+import numpy as _np
+import pandas as _pd
+
+_viz_config = {'max_points': 2000, 'webgl_threshold': 1000, 'density_threshold': 200000, 'raster_size': (600, 400)}
+_chart_reports = []
+
+# viridis anchors for the raster colormap
+_RASTER_COLORS = _np.array([[68, 1, 84], [59, 82, 139], [33, 145, 140], [94, 201, 98], [253, 231, 37]], dtype=float)
+
+
+def _configure_viz(**config):
+    _viz_config.update(config)
+    del _chart_reports[:]
+
+
+def _numeric(values) -> _np.ndarray:
+    """Float view of a column (datetimes as epoch nanoseconds) for downsampling arithmetic"""
+    series = _pd.Series(values)
+    if _pd.api.types.is_datetime64_any_dtype(series):
+        return series.astype('int64').to_numpy(dtype=float)
+    return _pd.to_numeric(series, errors='coerce').to_numpy(dtype=float)
+
+
+def lttb_downsample(x, y, n_out: int) -> _np.ndarray:
+    """Indices of ``n_out`` points chosen by Largest-Triangle-Three-Buckets (keeps the visual shape)"""
+    x, y = _numeric(x), _numeric(y)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return _np.arange(n)
+    y = _np.where(_np.isnan(y), _np.nanmean(y) if _np.isfinite(y).any() else 0.0, y)
+    edges = _np.linspace(1, n - 1, n_out - 1).astype(int)
+    indices = _np.empty(n_out, dtype=_np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    selected = 0
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], max(edges[bucket + 1], edges[bucket] + 1)
+        if bucket + 2 < len(edges):
+            next_start, next_end = edges[bucket + 1], max(edges[bucket + 2], edges[bucket + 1] + 1)
+            next_x, next_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        # Twice the triangle area between the last selected point, each candidate and the next bucket's mean
+        area = _np.abs((x[selected] - next_x) * (y[start:end] - y[selected])
+                      - (x[selected] - x[start:end]) * (next_y - y[selected]))
+        selected = start + int(_np.argmax(area))
+        indices[bucket + 1] = selected
+    return indices
+
+
+def minmax_downsample(x, y, n_out: int) -> _np.ndarray:
+    """Indices of the endpoints and each bucket's minimum and maximum (keeps every spike; at most ``n_out`` points)"""
+    y = _numeric(y)
+    n = len(y)
+    if n_out >= n or n_out < 4:
+        return _np.arange(n)
+    buckets = (n_out - 2) // 2  # leaves room for the two endpoints
+    size = _math.ceil(n / buckets)
+    padding = buckets * size - n
+    lows = _np.concatenate([_np.where(_np.isnan(y), _np.inf, y), _np.full(padding, _np.inf)]).reshape(buckets, size)
+    highs = _np.concatenate([_np.where(_np.isnan(y), -_np.inf, y), _np.full(padding, -_np.inf)]).reshape(buckets, size)
+    base = _np.arange(buckets) * size
+    indices = _np.concatenate([[0, n - 1], base + lows.argmin(axis=1), base + highs.argmax(axis=1)])
+    return _np.unique(indices[indices < n])
+
+
+def _payload_estimate(columns, rows: int) -> int:
+    """JSON bytes for ``rows`` points of ``columns``, extrapolated from a sample"""
+    sample = min(rows, 5000)
+    if not sample:
+        return 0
+    encoded = sum(len(_pd.Series(column[:sample]).to_json(orient='values', date_format='iso')) for column in columns)
+    return int(encoded * rows / sample)
+
+
+def _record(kind: str, points_in: int, points_out: int, payload_before: int, fig, started: float):
+    payload_after = len(fig.to_json())
+    _chart_reports.append({
+        'kind': kind, 'points_in': int(points_in), 'points_out': int(points_out),
+        'payload_before_bytes': int(payload_before), 'payload_after_bytes': payload_after,
+        'build_ms': round((_time.perf_counter() - started) * 1000, 1),
+    })
+
+
+def to_webgl(fig, threshold: int = None):
+    """Switch scatter traces with more than ``threshold`` points to WebGL (``scattergl``)"""
+    import plotly.graph_objects as go
+    threshold = _viz_config['webgl_threshold'] if threshold is None else threshold
+    traces = []
+    for trace in fig.data:
+        if trace.type == 'scatter' and trace.x is not None and len(trace.x) > threshold:
+            properties = trace.to_plotly_json()
+            properties.pop('type', None)
+            if properties.get('line', {}).get('shape') == 'spline':
+                properties['line']['shape'] = 'linear'
+            try:
+                trace = go.Scattergl(**properties)
+            except ValueError:
+                pass
+        traces.append(trace)
+    return go.Figure(data=traces, layout=fig.layout)
+
+
+def plot_timeseries(df: _pd.DataFrame, x: str, y, max_points: int = None, method: str = 'lttb', title: str = None):
+    """Line chart of one or more ``y`` columns, downsampled per series (``method``: 'lttb' or 'minmax')"""
+    import plotly.graph_objects as go
+    started = _time.perf_counter()
+    max_points = max_points or _viz_config['max_points']
+    columns = [y] if isinstance(y, str) else list(y)
+    data = df.sort_values(x) if not df[x].is_monotonic_increasing else df
+    pick = lttb_downsample if method == 'lttb' else minmax_downsample
+
+    fig = go.Figure()
+    points_out = 0
+    for column in columns:
+        indices = pick(data[x], data[column], max_points)
+        points_out += len(indices)
+        trace_type = go.Scattergl if len(indices) > _viz_config['webgl_threshold'] else go.Scatter
+        fig.add_trace(trace_type(x=data[x].iloc[indices], y=data[column].iloc[indices], mode='lines',
+                                 name=str(column)))
+    points_in = len(data) * len(columns)
+    shown = f" ({method}: {points_out:,} of {points_in:,} points)" if points_out < points_in else ""
+    fig.update_layout(title=(title or ', '.join(map(str, columns))) + shown, xaxis_title=x)
+    _record('timeseries', points_in, points_out,
+            _payload_estimate([data[x]] + [data[column] for column in columns], len(data)), fig, started)
+    return fig
+
+
+def plot_scatter(df: _pd.DataFrame, x: str, y: str, color: str = None, title: str = None, kind: str = 'auto'):
+    """Scatter plot that scales: SVG for few points, WebGL for many, binned (``kind``: 'datashade' or 'hexbin') beyond"""
+    import plotly.express as px
+    n = len(df)
+    if kind == 'auto':
+        kind = 'datashade' if n > _viz_config['density_threshold'] else 'points'
+    if kind == 'datashade':
+        return datashade_figure(df, x, y, title=title)
+    if kind == 'hexbin':
+        return hexbin_figure(df, x, y, title=title)
+
+    started = _time.perf_counter()
+    render_mode = 'webgl' if n > _viz_config['webgl_threshold'] else 'svg'
+    fig = px.scatter(df, x=x, y=y, color=color, title=title, render_mode=render_mode)
+    _record('scatter', n, n, _payload_estimate([df[x], df[y]], n), fig, started)
+    return fig
+
+
+def hexbin_figure(df: _pd.DataFrame, x: str, y: str, gridsize: int = 60, title: str = None):
+    """Hexagonal binning of a large scatter: one marker per occupied hexagon, coloured by count"""
+    import plotly.graph_objects as go
+    started = _time.perf_counter()
+    xs, ys = _numeric(df[x]), _numeric(df[y])
+    valid = _np.isfinite(xs) & _np.isfinite(ys)
+    xs, ys = xs[valid], ys[valid]
+    nx, ny = gridsize, max(1, int(gridsize / _math.sqrt(3)))
+    sx = (xs.max() - xs.min()) / nx or 1.0
+    sy = (ys.max() - ys.min()) / ny or 1.0
+    xn, yn = (xs - xs.min()) / sx, (ys - ys.min()) / sy
+    # Two offset rectangular lattices; each point goes to the nearer centre
+    i1, j1 = _np.floor(xn + 0.5), _np.floor(yn + 0.5)
+    i2, j2 = _np.floor(xn), _np.floor(yn)
+    first = (xn - i1) ** 2 + 3 * (yn - j1) ** 2 < (xn - i2 - 0.5) ** 2 + 3 * (yn - j2 - 0.5) ** 2
+    cx = _np.where(first, i1, i2 + 0.5) * sx + xs.min()
+    cy = _np.where(first, j1, j2 + 0.5) * sy + ys.min()
+    centres, counts = _np.unique(_np.column_stack([cx, cy]), axis=0, return_counts=True)
+
+    fig = go.Figure(go.Scattergl(
+        x=centres[:, 0], y=centres[:, 1], mode='markers',
+        marker=dict(symbol='hexagon', size=max(4, int(600 / gridsize)), color=_np.log10(counts + 1),
+                    colorscale='Viridis', colorbar=dict(title='log10 count')),
+        text=counts, hovertemplate='%{text} points<extra></extra>'
+    ))
+    fig.update_layout(title=title or f"{y} vs {x} ({len(xs):,} points, hexbin)", xaxis_title=x, yaxis_title=y)
+    _record('hexbin', len(df), len(centres), _payload_estimate([df[x], df[y]], len(df)), fig, started)
+    return fig
+
+
+def datashade_figure(df: _pd.DataFrame, x: str, y: str, width: int = None, height: int = None, title: str = None):
+    """Rasterize a large scatter into a log-shaded density image (the idea behind datashader)"""
+    import plotly.graph_objects as go
+    started = _time.perf_counter()
+    default_width, default_height = _viz_config['raster_size']
+    width, height = width or default_width, height or default_height
+    xs, ys = _numeric(df[x]), _numeric(df[y])
+    valid = _np.isfinite(xs) & _np.isfinite(ys)
+    counts, x_edges, y_edges = _np.histogram2d(xs[valid], ys[valid], bins=[width, height])
+    shade = _np.log1p(counts.T[::-1])  # rows top to bottom
+    shade = shade / shade.max() if shade.max() > 0 else shade
+
+    fig = go.Figure()
+    try:
+        from PIL import Image
+        position = shade * (len(_RASTER_COLORS) - 1)
+        lower = _np.clip(_np.floor(position).astype(int), 0, len(_RASTER_COLORS) - 2)
+        fraction = (position - lower)[..., None]
+        rgb = _RASTER_COLORS[lower] * (1 - fraction) + _RASTER_COLORS[lower + 1] * fraction
+        alpha = _np.where(counts.T[::-1] > 0, 255, 0)[..., None]
+        buffer = _io.BytesIO()
+        Image.fromarray(_np.concatenate([rgb, alpha], axis=2).astype(_np.uint8), 'RGBA').save(buffer, 'PNG')
+        fig.add_trace(go.Image(
+            source='data:image/png;base64,' + _base64.b64encode(buffer.getvalue()).decode(),
+            x0=x_edges[0], dx=(x_edges[-1] - x_edges[0]) / width,
+            y0=y_edges[-1], dy=-(y_edges[-1] - y_edges[0]) / height,
+        ))
+        fig.update_yaxes(autorange=True)
+    except ImportError:
+        fig.add_trace(go.Heatmap(z=_np.log1p(counts.T), x=(x_edges[:-1] + x_edges[1:]) / 2,
+                                 y=(y_edges[:-1] + y_edges[1:]) / 2, colorscale='Viridis'))
+    fig.update_layout(title=title or f"{y} vs {x} ({int(valid.sum()):,} points, density)", xaxis_title=x,
+                      yaxis_title=y)
+    _record('datashade', len(df), width * height, _payload_estimate([df[x], df[y]], len(df)), fig, started)
+    return fig
+
+
+def _collect_chart_reports():
+    """Reports of the charts built since the last collection"""
+    reports = list(_chart_reports)
+    del _chart_reports[:]
+    return reports
+
+
+def benchmark(rows: int = 200000, seed: int = 0) -> dict:
+    """Build and serialize intraday-style charts with and without the helpers (milliseconds and bytes)"""
+    import plotly.express as px
+    rng = _np.random.default_rng(seed)
+    df = _pd.DataFrame({
+        'Timestamp': _pd.date_range('2024-01-01 09:15', periods=rows, freq='s'),
+        'LTP': 1000 + _np.cumsum(rng.normal(0, 0.5, rows)),
+        'Volume': rng.lognormal(8, 1, rows),
+    })
+    df['Change'] = df['LTP'].pct_change().fillna(0) * 100
+
+    def measure(build):
+        started = _time.perf_counter()
+        payload = len(build().to_json())
+        return {'ms': round((_time.perf_counter() - started) * 1000, 1), 'bytes': payload}
+
+    report = {
+        'line': {'before': measure(lambda: px.line(df, x='Timestamp', y='LTP', render_mode='svg')),
+                 'after': measure(lambda: plot_timeseries(df, 'Timestamp', 'LTP'))},
+        'scatter': {'before': measure(lambda: px.scatter(df, x='Volume', y='Change', render_mode='svg')),
+                    'after': measure(lambda: plot_scatter(df, 'Volume', 'Change', kind='datashade'))},
+    }
+    for row in report.values():
+        row['payload_reduction'] = round(row['before']['bytes'] / row['after']['bytes'], 1)
+    del _chart_reports[:]
+    return report
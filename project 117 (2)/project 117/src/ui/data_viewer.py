@@ -0,0 +1,156 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import streamlit as st
+import logging
+
+from src.core.dataset_store import dataframe_fingerprint
+from config.settings import VIEWER_CONFIG
+
+_COMPARISON = re.compile(r"^\s*(<=|>=|!=|==|=|<|>)\s*(-?(?:\d+\.?\d*|\.\d+)(?:e[-+]?\d+)?)\s*$", re.IGNORECASE)
+
+
+class DataPager:
+    """Server-side pagination with filter/sort pushed down to pandas.
+
+    The row order of a (dataset, filter, sort) view is computed once and kept,
+    so moving between pages is a positional slice. Recently served pages are
+    cached as well.
+    """
+
+    def __init__(self, max_cached_pages: Optional[int] = None, max_cached_orders: Optional[int] = None):
+        self.logger = logging.getLogger(__name__)
+        self.max_cached_pages = max_cached_pages or VIEWER_CONFIG['max_cached_pages']
+        self.max_cached_orders = max_cached_orders or VIEWER_CONFIG['max_cached_orders']
+        self._orders: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._pages: "OrderedDict[tuple, pd.DataFrame]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def row_order(self, df: pd.DataFrame, fingerprint: str, sort_by: Optional[str] = None, ascending: bool = True,
+                  filter_column: Optional[str] = None, filter_value: Optional[str] = None) -> np.ndarray:
+        """Row positions of the filtered and sorted view"""
+        key = (fingerprint, sort_by, ascending, filter_column, filter_value or None)
+        order = self._cache_get(self._orders, key)
+        if order is not None:
+            return order
+
+        positions = np.arange(len(df))
+        if filter_column and filter_value:
+            positions = np.flatnonzero(self._filter_mask(df[filter_column], filter_value))
+        if sort_by:
+            values = pd.Series(df[sort_by].to_numpy()[positions], index=positions)
+            try:
+                values = values.sort_values(ascending=ascending, kind='mergesort', na_position='last')
+            except TypeError:
+                # Object column holding mixed types: order by the values as shown
+                values = values.sort_values(ascending=ascending, kind='mergesort', na_position='last',
+                                            key=lambda s: s.astype(str))
+            positions = values.index.to_numpy()
+
+        self._cache_put(self._orders, key, positions, self.max_cached_orders)
+        return positions
+
+    def get_page(self, df: pd.DataFrame, fingerprint: str, page: int, page_size: int,
+                 columns: Optional[List[str]] = None, **view) -> Tuple[pd.DataFrame, int]:
+        """Return one page (0-based) of the view and the total row count of the view"""
+        order = self.row_order(df, fingerprint, **view)
+        columns = list(columns) if columns else list(df.columns)
+        key = (fingerprint, tuple(sorted(view.items())), tuple(columns), page_size, page)
+        cached = self._cache_get(self._pages, key)
+        if cached is not None:
+            return cached, len(order)
+
+        rows = order[page * page_size:(page + 1) * page_size]
+        column_positions = [df.columns.get_loc(col) for col in columns]
+        page_df = df.iloc[rows, column_positions]
+        self._cache_put(self._pages, key, page_df, self.max_cached_pages)
+        return page_df, len(order)
+
+    def _filter_mask(self, series: pd.Series, filter_value: str) -> np.ndarray:
+        """Numeric comparisons (``> 100``) on numeric columns, substring match otherwise"""
+        match = _COMPARISON.match(filter_value)
+        if match and pd.api.types.is_numeric_dtype(series):
+            op, number = match.group(1), float(match.group(2))
+            ops = {
+                '<': series.lt, '<=': series.le, '>': series.gt, '>=': series.ge,
+                '=': series.eq, '==': series.eq, '!=': series.ne,
+            }
+            return ops[op](number).to_numpy()
+        return series.astype(str).str.contains(filter_value, case=False, regex=False, na=False).to_numpy()
+
+    def _cache_get(self, cache: OrderedDict, key: tuple):
+        with self._lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+            return value
+
+    def _cache_put(self, cache: OrderedDict, key: tuple, value, max_items: int):
+        with self._lock:
+            cache[key] = value
+            while len(cache) > max_items:
+                cache.popitem(last=False)
+
+
+_default_pager: Optional[DataPager] = None
+_default_pager_lock = threading.Lock()
+
+
+def get_data_pager() -> DataPager:
+    """Process-wide pager shared by all Streamlit sessions"""
+    global _default_pager
+    with _default_pager_lock:
+        if _default_pager is None:
+            _default_pager = DataPager()
+        return _default_pager
+
+
+def display_paginated_dataframe(df: pd.DataFrame, fingerprint: Optional[str] = None, key: str = "dataset_viewer"):
+    """Display a DataFrame one page at a time; only the visible page is sent to the browser"""
+    fingerprint = fingerprint or dataframe_fingerprint(df)
+    pager = get_data_pager()
+    all_columns = list(df.columns)
+
+    col1, col2, col3 = st.columns([3, 2, 1])
+    with col1:
+        columns = st.multiselect("Columns", all_columns, default=all_columns, key=f"{key}_columns")
+    with col2:
+        sort_by = st.selectbox("Sort by", [None] + all_columns, key=f"{key}_sort",
+                               format_func=lambda col: "(original order)" if col is None else col)
+    with col3:
+        descending = st.checkbox("Descending", key=f"{key}_desc")
+
+    col1, col2, col3 = st.columns([2, 3, 1])
+    with col1:
+        filter_column = st.selectbox("Filter column", all_columns, key=f"{key}_filter_col")
+    with col2:
+        filter_value = st.text_input("Filter (text or e.g. > 100)", key=f"{key}_filter")
+    with col3:
+        page_sizes = VIEWER_CONFIG['page_sizes']
+        page_size = st.selectbox("Rows per page", page_sizes, key=f"{key}_page_size",
+                                 index=page_sizes.index(VIEWER_CONFIG['default_page_size']))
+
+    view = {
+        'sort_by': sort_by,
+        'ascending': not descending,
+        'filter_column': filter_column if filter_value else None,
+        'filter_value': filter_value or None,
+    }
+    total = len(pager.row_order(df, fingerprint, **view))
+    page_count = max(1, -(-total // page_size))
+    page_key = f"{key}_page"
+    if st.session_state.get(page_key, 1) > page_count:
+        st.session_state[page_key] = page_count
+    page = st.number_input("Page", min_value=1, max_value=page_count, step=1, key=page_key)
+
+    page_df, total = pager.get_page(df, fingerprint, int(page) - 1, page_size, columns or all_columns, **view)
+    st.dataframe(page_df, use_container_width=True)
+
+    start = (int(page) - 1) * page_size
+    caption = f"Page {int(page):,} of {page_count:,} · rows {min(start + 1, total):,}–{start + len(page_df):,} of {total:,}"
+    if total != len(df):
+        caption += f" (filtered from {len(df):,})"
+    st.caption(caption)
@@ -0,0 +1,68 @@
+from typing import Dict, Any
+import streamlit as st
+
+from src.core.job_queue import JobQueue, ACTIVE_STATUSES
+from src.ui.output_handler import OutputHandler
+from src.ui.profile_panel import display_profile
+from config.settings import JOB_CONFIG
+
+_MESSAGE_RENDERERS = {'info': st.info, 'warning': st.warning, 'error': st.error}
+
+
+def display_job(job_queue: JobQueue, job_id: str, output_handler: OutputHandler):
+    """Show a background analysis: live progress while it runs, its results once finished"""
+    job = job_queue.get(job_id)
+    if job is None:
+        st.session_state.pop('analysis_job', None)
+        return
+
+    if job['status'] in ACTIVE_STATUSES:
+        _display_job_progress(job_queue, job_id, output_handler)
+        return
+
+    _display_messages(job)
+    if job['status'] == 'completed' and job['result'] is not None:
+        output_handler.display_results(*job['result'])
+    elif job['status'] == 'failed':
+        st.error(f"❌ Error: {job['error']}")
+    elif job['status'] == 'cancelled':
+        st.warning("✖️ Analysis cancelled.")
+
+    if 'profile' in job['partial']:
+        display_profile("🐞 Analysis profile", job['partial']['profile'], 'analysis',
+                        sandbox_profile=job['partial'].get('sandbox_profile'))
+
+
+@st.fragment(run_every=JOB_CONFIG['poll_interval'])
+def _display_job_progress(job_queue: JobQueue, job_id: str, output_handler: OutputHandler):
+    """Polls the job store; reruns the whole app once the job has finished (replacing any preview)"""
+    job = job_queue.get(job_id)
+    if job is None or job['status'] not in ACTIVE_STATUSES:
+        st.rerun()
+
+    label = job['progress'][-1] if job['progress'] else "⏳ Waiting for a free worker..."
+    with st.status(label, state='running', expanded=True):
+        for step in job['progress'][:-1]:
+            st.write(f"✔️ {step}")
+        _display_messages(job)
+        if 'response' in job['partial']:
+            with st.expander("View Full Response", expanded=False):
+                st.markdown(job['partial']['response'])
+        if 'code' in job['partial']:
+            with st.expander("View Python Code", expanded=False):
+                st.code(job['partial']['code'], language='python')
+        if 'stdout' in job['partial']:
+            st.code(job['partial']['stdout'][-2000:], language='text')
+
+    if job['partial'].get('preview'):
+        output_handler.display_preview(job['partial']['preview']['results'], job['partial']['preview']['note'])
+
+    if job['cancel_requested']:
+        st.caption("Cancelling...")
+    elif st.button("✖️ Cancel analysis", key=f"cancel_{job_id}"):
+        job_queue.cancel(job_id)
+
+
+def _display_messages(job: Dict[str, Any]):
+    for level, message in job['messages']:
+        _MESSAGE_RENDERERS.get(level, st.info)(message)
@@ -1,17 +1,56 @@
 import streamlit as st
+import streamlit.components.v1
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
 from PIL import Image
 import base64
+import hashlib
+import struct
 from io import BytesIO
-from typing import List, Any, Optional
+from typing import List, Any, Optional, Tuple
 import json
 import logging
 
+from src.core.correlation_engine import CorrelationEngine
+from src.core.dataset_store import dataframe_fingerprint
+from src.core.table_results import TableResult
+from src.core.timeseries_store import TimeSeriesIndex
+from src.utils.metrics import get_metrics
+from src.utils.result_cache import get_result_cache
+from config.settings import CORRELATION_CONFIG, RENDER_CONFIG, TABLE_TRANSPORT_CONFIG
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+_ARTIFACT_FORMATS = ('png', 'jpeg', 'svg', 'html', 'markdown', 'json', 'text', 'extra')
+
+
+def image_dimensions(image_data: bytes) -> Optional[Tuple[int, int]]:
+    """Width and height read from the image header, without decoding any pixels"""
+    if image_data[:8] == _PNG_SIGNATURE and image_data[12:16] == b'IHDR':
+        return struct.unpack('>II', image_data[16:24])
+    try:
+        with Image.open(BytesIO(image_data)) as image:  # lazy: parses the header only
+            return image.size
+    except Exception:
+        return None
+
+
+def artifact_key(result: Any) -> str:
+    """Content hash of an output, used to show identical outputs once"""
+    if isinstance(result, str):
+        payload = result
+    elif isinstance(result, TableResult):
+        return hashlib.sha1(result.data).hexdigest()
+    else:
+        payload = repr([(fmt, getattr(result, fmt, None)) for fmt in _ARTIFACT_FORMATS])
+    return hashlib.sha1(payload.encode('utf-8', errors='replace')).hexdigest()
+
+
 class OutputHandler:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
+        self.result_cache = get_result_cache()
+        self.metrics = get_metrics()
     
     def display_results(self, code_results: Optional[List[Any]], llm_response: str, exec_code: str):
         """Display execution results with proper formatting"""
@@ -33,145 +72,304 @@ class OutputHandler:
         else:
             st.info("No output generated from code execution.")
     
+    def display_preview(self, code_results: List[Any], note: str):
+        """Approximate results from a stratified sample, shown while the full-data run continues"""
+        st.subheader("🔭 Preview")
+        st.caption(note)
+        self._process_results(code_results)
+    
     def _process_results(self, results: List[Any]):
-        """Process and display different types of results"""
-        for i, result in enumerate(results):
-            if hasattr(result, 'is_main_result') and result.is_main_result:
-                if result.text:
-                    st.text(result.text)
-                
-                if hasattr(result, 'formats'):
-                    self._display_formats(result.formats)
-            else:
-                # Handle string results
-                if isinstance(result, str):
-                    # Try to parse as JSON for structured data
-                    try:
-                        json_data = json.loads(result)
-                        st.json(json_data)
-                    except:
-                        st.text(result)
-                else:
-                    st.write(result)
-    
-    def _display_formats(self, formats):
-        """Display different format types (images, tables, etc.)"""
-        for format_item in formats:
-            if hasattr(format_item, 'type'):
-                if format_item.type == 'image':
-                    self._display_image(format_item)
-                elif format_item.type == 'html':
-                    self._display_html(format_item)
-                elif format_item.type == 'json':
-                    self._display_json(format_item)
-                else:
-                    st.write(format_item)
+        """Process and display different types of results
+
+        Identical outputs are shown once, and outputs after the first
+        ``eager_outputs`` are only rendered when asked for.
+        """
+        unique, keys = [], []
+        for result in results:
+            key = artifact_key(result)
+            if key in keys:
+                self.metrics.increment('render.duplicates_skipped')
+                continue
+            keys.append(key)
+            unique.append(result)
+        
+        eager = RENDER_CONFIG['eager_outputs']
+        for result in unique[:eager]:
+            self._display_result(result)
+        below_fold = unique[eager:]
+        if below_fold and st.toggle(f"Show {len(below_fold)} more outputs",
+                                    key=f"more_outputs_{hashlib.sha1(''.join(keys).encode()).hexdigest()[:12]}"):
+            for result in below_fold:
+                self._display_result(result)
+    
+    def _display_result(self, result: Any):
+        """Display one output in its richest available format"""
+        if isinstance(result, str):
+            # Try to parse as JSON for structured data
+            try:
+                json_data = json.loads(result)
+                st.json(json_data)
+            except:
+                st.text(result)
+            return
+        if isinstance(result, TableResult):
+            self._display_table(result)
+            return
+        if not hasattr(result, 'formats'):
+            st.write(result)
+            return
+        
+        plotly_spec = next((value for name, value in (getattr(result, 'extra', None) or {}).items()
+                            if 'plotly' in name), None)
+        if plotly_spec is not None:
+            st.plotly_chart(plotly_spec)
+        elif getattr(result, 'png', None) or getattr(result, 'jpeg', None):
+            self._display_image(result)
+        elif getattr(result, 'svg', None):
+            st.image(result.svg)
+        elif getattr(result, 'html', None):
+            self._display_html(result.html)
+        elif getattr(result, 'markdown', None):
+            st.markdown(result.markdown)
+        elif getattr(result, 'json', None):
+            self._display_json(result.json)
+        elif getattr(result, 'text', None):
+            st.text(result.text)
+    
+    def _display_table(self, table: TableResult):
+        """Interactive table straight from the Arrow result, paged on the server"""
+        page_size = TABLE_TRANSPORT_CONFIG['page_size']
+        pages = max(1, -(-table.num_rows // page_size))
+        key = f"table_{hashlib.sha1(table.data).hexdigest()[:12]}"
+        st.caption(f"🧮 {table.name}: {table.num_rows:,} rows × {len(table.column_names)} columns")
+        page = 1
+        if pages > 1:
+            page = st.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, value=1, key=f"{key}_page")
+        st.dataframe(table.page(page - 1, page_size), hide_index=True)
+        
+        csv_column, arrow_column = st.columns(2)
+        with csv_column:
+            st.download_button("📥 Download CSV", data=table.to_csv, file_name=f"{table.name}.csv",
+                               mime='text/csv', key=f"{key}_csv")
+        with arrow_column:
+            st.download_button("📥 Download Arrow", data=table.data, file_name=f"{table.name}.arrow",
+                               mime='application/vnd.apache.arrow.file', key=f"{key}_arrow")
     
     def _display_image(self, image_result):
-        """Display image results"""
+        """Display image results, passing the encoded bytes through whenever they fit"""
         try:
-            if hasattr(image_result, 'data'):
-                # Decode base64 image
-                image_data = base64.b64decode(image_result.data)
-                image = Image.open(BytesIO(image_data))
-                st.image(image, caption="Generated Visualization", use_column_width=True)
+            image_format = 'png' if getattr(image_result, 'png', None) else 'jpeg'
+            encoded = getattr(image_result, image_format)
+            image_data, output_format = self.result_cache.get_or_compute(
+                ('rendered_image', hashlib.sha1(encoded.encode()).hexdigest()),
+                lambda: self._prepare_image(encoded, image_format)
+            )
+            st.image(image_data, caption="Generated Visualization", output_format=output_format, width='stretch')
         except Exception as e:
             self.logger.error(f"Error displaying image: {str(e)}")
             st.error("Failed to display image")
     
-    def _display_html(self, html_result):
-        """Display HTML results"""
+    def _prepare_image(self, encoded: str, image_format: str) -> Tuple[bytes, str]:
+        """Image bytes for ``st.image``: unchanged, or downscaled once if wider than the display"""
+        image_data = base64.b64decode(encoded)
+        output_format = 'PNG' if image_format == 'png' else 'JPEG'
+        size = image_dimensions(image_data)
+        max_width = RENDER_CONFIG['max_image_width']
+        if size is None or size[0] <= max_width:
+            self.metrics.increment('render.images_passthrough')
+            return image_data, output_format
+        
+        width, height = size
+        with Image.open(BytesIO(image_data)) as image:
+            resized = image.resize((max_width, max(1, round(height * max_width / width))), Image.LANCZOS)
+        buffer = BytesIO()
+        resized.save(buffer, format=output_format, **({'quality': 90} if output_format == 'JPEG' else {}))
+        self.metrics.increment('render.images_downscaled')
+        return buffer.getvalue(), output_format
+    
+    def _display_html(self, html: str):
+        """Display HTML results inline; scripted or very large HTML goes into a scrollable frame"""
         try:
-            if hasattr(html_result, 'data'):
-                st.components.v1.html(html_result.data, height=400)
+            size = len(html.encode('utf-8'))
+            if size > RENDER_CONFIG['max_inline_html_bytes']:
+                key = f"html_{hashlib.sha1(html.encode()).hexdigest()[:12]}"
+                if not st.toggle(f"Show HTML output ({size / 1024:,.0f} KB)", key=key):
+                    return
+            if '<script' in html.lower() or size > RENDER_CONFIG['max_inline_html_bytes']:
+                st.components.v1.html(html, height=RENDER_CONFIG['html_height'], scrolling=True)
+            else:
+                st.html(html)
         except Exception as e:
             self.logger.error(f"Error displaying HTML: {str(e)}")
             st.error("Failed to display HTML content")
     
-    def _display_json(self, json_result):
+    def _display_json(self, json_data):
         """Display JSON results"""
         try:
-            if hasattr(json_result, 'data'):
-                st.json(json_result.data)
+            st.json(json_data)
         except Exception as e:
             self.logger.error(f"Error displaying JSON: {str(e)}")
             st.error("Failed to display JSON content")
     
-    def display_dataframe_analysis(self, df: pd.DataFrame):
-        """Display comprehensive DataFrame analysis"""
+    def display_dataframe_analysis(self, df: pd.DataFrame, fingerprint: Optional[str] = None,
+                                   timeseries: Optional[TimeSeriesIndex] = None):
+        """Display comprehensive DataFrame analysis
+
+        Only the selected view is computed, and every table and figure is cached
+        by dataset fingerprint, so reruns and view switches reuse earlier work.
+        Intraday data with a ``timeseries`` index also gets a candlestick view.
+        """
         st.subheader("📈 Data Analysis")
+        fingerprint = fingerprint or dataframe_fingerprint(df)
+        views = ["Summary", "Statistics", "Correlations", "Missing Data"]
+        if timeseries is not None:
+            views.append("Time Series")
         
-        tabs = st.tabs(["Summary", "Statistics", "Correlations", "Missing Data"])
-        
-        with tabs[0]:
-            self._display_basic_info(df)
-        
-        with tabs[1]:
-            self._display_statistics(df)
-        
-        with tabs[2]:
-            self._display_correlations(df)
+        view = st.radio(
+            "Analysis view",
+            views,
+            horizontal=True,
+            key=f"analysis_view_{fingerprint[:12]}",
+            label_visibility="collapsed"
+        )
         
-        with tabs[3]:
-            self._display_missing_data(df)
+        if view == "Summary":
+            self._display_basic_info(df, fingerprint)
+        elif view == "Statistics":
+            self._display_statistics(df, fingerprint)
+        elif view == "Correlations":
+            self._display_correlations(df, fingerprint)
+        elif view == "Time Series":
+            self._display_timeseries(timeseries, fingerprint)
+        else:
+            self._display_missing_data(df, fingerprint)
+    
+    def _cached(self, fingerprint: str, name: str, compute):
+        """Compute a per-dataset result once and reuse it"""
+        return self.result_cache.get_or_compute((fingerprint, 'analysis', name), compute)
     
-    def _display_basic_info(self, df: pd.DataFrame):
+    def _numeric_columns(self, df: pd.DataFrame, fingerprint: str) -> List[str]:
+        return self._cached(fingerprint, 'numeric_columns',
+                            lambda: df.select_dtypes(include=['number']).columns.tolist())
+    
+    def _display_basic_info(self, df: pd.DataFrame, fingerprint: str):
         """Display basic DataFrame information"""
+        info = self._cached(fingerprint, 'basic_info', lambda: {
+            'shape': df.shape,
+            'memory_kb': df.memory_usage(deep=True).sum() / 1024,
+            'dtype_counts': df.dtypes.value_counts().to_dict()
+        })
         col1, col2 = st.columns(2)
         
         with col1:
-            st.write("**Shape:**", df.shape)
-            st.write("**Memory Usage:**", f"{df.memory_usage(deep=True).sum() / 1024:.1f} KB")
+            st.write("**Shape:**", info['shape'])
+            st.write("**Memory Usage:**", f"{info['memory_kb']:.1f} KB")
             
         with col2:
             st.write("**Column Types:**")
-            dtype_counts = df.dtypes.value_counts()
-            for dtype, count in dtype_counts.items():
+            for dtype, count in info['dtype_counts'].items():
                 st.write(f"- {dtype}: {count}")
     
-    def _display_statistics(self, df: pd.DataFrame):
+    def _display_statistics(self, df: pd.DataFrame, fingerprint: str):
         """Display statistical summary"""
-        numeric_df = df.select_dtypes(include=['number'])
-        if not numeric_df.empty:
+        numeric_columns = self._numeric_columns(df, fingerprint)
+        if numeric_columns:
             st.write("**Numeric Columns Summary:**")
-            st.dataframe(numeric_df.describe())
+            st.dataframe(self._cached(fingerprint, 'describe', lambda: df[numeric_columns].describe()))
         else:
             st.info("No numeric columns found for statistical analysis.")
     
-    def _display_correlations(self, df: pd.DataFrame):
-        """Display correlation matrix"""
-        numeric_df = df.select_dtypes(include=['number'])
-        if len(numeric_df.columns) > 1:
-            corr_matrix = numeric_df.corr()
+    def _display_correlations(self, df: pd.DataFrame, fingerprint: str):
+        """Display correlation matrix
+
+        Wide frames show the strongest pairs and a clustered heatmap of the
+        most relevant columns instead of the full dense matrix.
+        """
+        numeric_columns = self._numeric_columns(df, fingerprint)
+        if len(numeric_columns) > 1:
+            method = st.selectbox("Method", list(CorrelationEngine.METHODS), key=f"corr_method_{fingerprint[:12]}",
+                                  format_func=str.title)
+            engine = CorrelationEngine()
             
-            # Create heatmap using Plotly
-            fig = px.imshow(
-                corr_matrix,
-                title="Correlation Matrix",
-                color_continuous_scale="RdBu",
-                aspect="auto"
-            )
-            st.plotly_chart(fig, use_container_width=True)
+            if len(numeric_columns) <= CORRELATION_CONFIG['dense_max_columns']:
+                def build_figure():
+                    corr_matrix = engine.correlation_matrix(df, method, fingerprint)
+                    # Create heatmap using Plotly
+                    fig = px.imshow(
+                        corr_matrix,
+                        title="Correlation Matrix",
+                        color_continuous_scale="RdBu",
+                        aspect="auto"
+                    )
+                    return self._figure_spec(fig)
+                
+                st.plotly_chart(self._cached(fingerprint, f'correlation_figure_{method}', build_figure),
+                                use_container_width=True)
+                return
+            
+            st.caption(f"{len(numeric_columns):,} numeric columns: showing the strongest pairs "
+                       f"and a clustered heatmap of the most related columns.")
+            mode = st.radio("Correlation view", ["Strongest pairs", "Clustered heatmap"], horizontal=True,
+                            key=f"corr_mode_{fingerprint[:12]}", label_visibility="collapsed")
+            if mode == "Strongest pairs":
+                st.dataframe(engine.top_pairs(df, method=method, fingerprint=fingerprint), use_container_width=True)
+            else:
+                def build_clustered_figure():
+                    fig = px.imshow(
+                        engine.clustered_matrix(df, method=method, fingerprint=fingerprint),
+                        title="Clustered Correlation Matrix (most related columns)",
+                        color_continuous_scale="RdBu",
+                        zmin=-1,
+                        zmax=1,
+                        aspect="auto"
+                    )
+                    return self._figure_spec(fig)
+                
+                st.plotly_chart(self._cached(fingerprint, f'clustered_correlation_figure_{method}', build_clustered_figure),
+                                use_container_width=True)
         else:
             st.info("Need at least 2 numeric columns for correlation analysis.")
     
-    def _display_missing_data(self, df: pd.DataFrame):
-        """Display missing data analysis"""
-        missing_data = df.isnull().sum()
-        missing_pct = (missing_data / len(df)) * 100
-        
-        missing_df = pd.DataFrame({
-            'Column': missing_data.index,
-            'Missing Count': missing_data.values,
-            'Missing Percentage': missing_pct.values
-        })
+    def _display_timeseries(self, timeseries: TimeSeriesIndex, fingerprint: str):
+        """Candlesticks with VWAP for one symbol, served from the bar level that fits the chart"""
+        col1, col2 = st.columns(2)
+        with col1:
+            symbol = st.selectbox("Symbol", timeseries.symbols, key=f"ts_symbol_{fingerprint[:12]}")
+        with col2:
+            resolution = st.selectbox("Resolution", ["Auto"] + list(timeseries.levels),
+                                      key=f"ts_resolution_{fingerprint[:12]}")
         
-        missing_df = missing_df[missing_df['Missing Count'] > 0].sort_values(
-            'Missing Count', ascending=False
-        )
+        def build_figure():
+            bars = timeseries.bars(symbol, freq=None if resolution == "Auto" else resolution)
+            fig = go.Figure([
+                go.Candlestick(x=bars['Time'], open=bars['Open'], high=bars['High'], low=bars['Low'],
+                               close=bars['Close'], name=symbol),
+                go.Scatter(x=bars['Time'], y=bars['VWAP'], mode='lines', name='VWAP'),
+            ])
+            fig.update_layout(title=f"{symbol} ({bars.attrs['level']} bars)", xaxis_rangeslider_visible=False)
+            return self._figure_spec(fig), bars.attrs['level'], len(bars)
         
-        if not missing_df.empty:
-            st.dataframe(missing_df, use_container_width=True)
+        figure, level, count = self._cached(fingerprint, f'timeseries_{symbol}_{resolution}', build_figure)
+        st.caption(f"{count:,} {level} bars from the precomputed pyramid")
+        st.plotly_chart(figure, use_container_width=True)
+    
+    def _display_missing_data(self, df: pd.DataFrame, fingerprint: str):
+        """Display missing data analysis"""
+        def build_missing():
+            missing_data = df.isnull().sum()
+            missing_pct = (missing_data / len(df)) * 100
+            
+            missing_df = pd.DataFrame({
+                'Column': missing_data.index,
+                'Missing Count': missing_data.values,
+                'Missing Percentage': missing_pct.values
+            })
+            
+            missing_df = missing_df[missing_df['Missing Count'] > 0].sort_values(
+                'Missing Count', ascending=False
+            )
+            if missing_df.empty:
+                return missing_df, None
             
             # Create bar chart for missing data
             fig = px.bar(
@@ -181,6 +379,15 @@ class OutputHandler:
                 title="Missing Data by Column",
                 labels={'Missing Percentage': 'Missing %'}
             )
-            st.plotly_chart(fig, use_container_width=True)
+            return missing_df, self._figure_spec(fig)
+        
+        missing_df, figure_spec = self._cached(fingerprint, 'missing_data', build_missing)
+        if not missing_df.empty:
+            st.dataframe(missing_df, use_container_width=True)
+            st.plotly_chart(figure_spec, use_container_width=True)
         else:
-            st.success("No missing data found!")
\ No newline at end of file
+            st.success("No missing data found!")
+    
+    def _figure_spec(self, fig: go.Figure) -> dict:
+        """Serialize a figure to its JSON spec once so cached renders skip figure building"""
+        return json.loads(fig.to_json())
\ No newline at end of file
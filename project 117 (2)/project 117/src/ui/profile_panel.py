@@ -0,0 +1,37 @@
+from typing import Dict, Any, Optional
+import pandas as pd
+import streamlit as st
+
+from src.ui.components import create_download_button
+from src.utils.profiler import report_json
+
+
+def display_profile(title: str, report: Dict[str, Any], name: str, sandbox_profile: Optional[str] = None):
+    """Debug-mode expander with a request profile and its downloads
+
+    ``name`` distinguishes the download files (and their buttons) of
+    different profiles shown on the same page.
+    """
+    with st.expander(title, expanded=False):
+        stages = pd.DataFrame([{key: value for key, value in stage.items() if key != 'top_allocations'}
+                               for stage in report['stages']])
+        if not stages.empty:
+            st.dataframe(stages.rename(columns={
+                'stage': 'Stage', 'duration_ms': 'Time (ms)', 'peak_kb': 'Peak memory (KiB)', 'net_kb': 'Net (KiB)'
+            }), hide_index=True)
+        for stage in report['stages']:
+            if stage['top_allocations']:
+                st.caption(f"Top allocations: {stage['stage']}")
+                st.dataframe(pd.DataFrame(stage['top_allocations']), hide_index=True)
+
+        st.caption("cProfile (cumulative)")
+        st.code(report['cprofile'], language='text')
+        if sandbox_profile:
+            st.caption("cProfile of the generated code (in the sandbox)")
+            st.code(sandbox_profile, language='text')
+
+        create_download_button(report_json(report, sandbox_profile), f"{name}-profile.json",
+                               f"Download {name} profile")
+        if report['folded']:
+            create_download_button(report['folded'], f"{name}.folded",
+                                   f"Download {name} flamegraph stacks (flamegraph.pl / speedscope)")
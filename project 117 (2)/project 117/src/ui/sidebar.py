@@ -1,5 +1,11 @@
 import streamlit as st
-from config.models import TOGETHER_MODELS, MODEL_DESCRIPTIONS
+import pandas as pd
+from config.models import TOGETHER_MODELS, MODEL_DESCRIPTIONS, AUTO_MODEL, AUTO_MODEL_ID
+from config.settings import RACING_CONFIG
+from src.core.model_router import get_model_router
+from src.core.session_kernel import reset_session_kernel
+from src.core.sql_engine import get_sql_engine
+from src.utils.metrics import get_metrics
 
 def setup_sidebar():
     """Setup sidebar with API keys and model configuration"""
@@ -40,16 +46,79 @@ def setup_sidebar():
         st.subheader("🤖 Model Selection")
         selected_model = st.selectbox(
             "Choose AI Model",
-            list(TOGETHER_MODELS.keys()),
+            list(TOGETHER_MODELS.keys()) + [AUTO_MODEL],
             index=0,
             help="Select the AI model for data analysis"
         )
-        st.session_state.model_name = TOGETHER_MODELS[selected_model]
+        if selected_model == AUTO_MODEL:
+            st.session_state.model_name = AUTO_MODEL_ID
+            st.info("ℹ️ Simple questions go to fast models, multi-step analyses to larger ones; "
+                    "failed answers are retried with a larger model")
+        else:
+            st.session_state.model_name = TOGETHER_MODELS[selected_model]
         
         # Show model description
         if selected_model in MODEL_DESCRIPTIONS:
             st.info(f"ℹ️ {MODEL_DESCRIPTIONS[selected_model]}")
         
+        st.checkbox(
+            "Race models",
+            key="race_mode",
+            help="Send each question to several models at once and keep the first answer "
+                 "whose code runs; costs extra tokens, cuts tail latency"
+        )
+        if st.session_state.get('race_mode'):
+            st.multiselect(
+                "Race against",
+                list(TOGETHER_MODELS.keys()),
+                default=RACING_CONFIG['partners'],
+                key="race_models",
+                max_selections=RACING_CONFIG['max_models'] - 1
+            )
+        
+        # Conversational session
+        st.subheader("💬 Session")
+        st.checkbox(
+            "Conversational session mode",
+            key="session_mode",
+            help="Keep one sandbox kernel for this session: the dataset stays loaded as `df` "
+                 "and earlier results stay in memory for follow-up questions"
+        )
+        if st.session_state.get('session_mode'):
+            kernel = st.session_state.get('session_kernel')
+            if kernel is not None and kernel.variables:
+                st.caption("Kernel variables: " + ", ".join(f"`{name}`" for name in kernel.variables))
+            if st.button("🔄 Reset session"):
+                reset_session_kernel()
+        
+        st.checkbox(
+            "Answer simple questions locally",
+            value=True,
+            key="local_answers",
+            help="Descriptive statistics and plain group-bys are answered from the cached profile and rollup "
+                 "cube without an LLM call; not used in conversational session mode"
+        )
+        st.checkbox(
+            "Progressive answers on large datasets",
+            key="progressive_mode",
+            help="Run the generated code on a stratified sample first and show the approximate result "
+                 "(with error bounds where possible) while the full-data run continues; "
+                 "not used in conversational session mode"
+        )
+        
+        # Embedded SQL engine
+        st.subheader("🦆 SQL Engine")
+        sql_available = get_sql_engine().available
+        st.checkbox(
+            "Answer relational questions with SQL",
+            key="sql_mode",
+            disabled=not sql_available,
+            help="Uploaded files become DuckDB tables on the host: filters, aggregations and joins "
+                 "between several files run as SQL; charts still use the Python sandbox"
+        )
+        if not sql_available:
+            st.caption("Install the `duckdb` package to enable the SQL engine")
+        
         # API Status Check
         st.subheader("📊 Status")
         if st.session_state.together_api_key:
@@ -62,8 +131,82 @@ def setup_sidebar():
         else:
             st.error("❌ E2B: Not connected")
         
+        with st.expander("📈 Pipeline Metrics"):
+            metrics = get_metrics()
+            failures_per_answer = metrics.ratio('execution.failed', 'questions.answered')
+            st.metric("Answered questions", int(metrics.counter('questions.answered')))
+            st.metric("Failed executions / answer",
+                      "–" if failures_per_answer is None else f"{failures_per_answer:.2f}")
+            st.caption(f"Pre-flight: {int(metrics.counter('preflight.repaired'))} repaired, "
+                       f"{int(metrics.counter('preflight.rejected'))} sent back to the LLM")
+            queue_depth = metrics.gauge('scheduler.queue_depth')
+            if queue_depth is not None:
+                waits = [metrics.summary('scheduler.wait', **dict(labels)).get('p95', 0.0)
+                         for labels in metrics.labels_of('scheduler.wait')]
+                st.caption(f"Provider queue: {int(queue_depth)} waiting, "
+                           f"p95 wait {max(waits, default=0.0):.2f}s")
+            local_hits = {dict(labels)['source']: metrics.counter('local_answers.hits', **dict(labels))
+                          for labels in metrics.labels_of('local_answers.hits')}
+            if local_hits:
+                hits = sum(local_hits.values())
+                saved = metrics.summary('local_answers.latency_saved')
+                sources = ', '.join(f"{int(count)} {source}" for source, count in sorted(local_hits.items()))
+                asked = hits + metrics.counter('local_answers.misses')
+                st.caption(f"Answered locally: {int(hits)} of {int(asked)} questions ({sources})"
+                           + (f", ~{saved['count'] * saved['mean']:.0f}s saved" if saved['count'] else ""))
+            sql_queries = metrics.counter('sql.queries', status='ok')
+            if sql_queries:
+                sql_latency = metrics.summary('sql.latency')
+                st.caption(f"SQL engine: {int(sql_queries)} queries "
+                           f"({int(metrics.counter('sql.queries', status='failed'))} failed), "
+                           f"p50 {sql_latency['p50'] * 1000:.0f} ms")
+            previews = metrics.summary('progressive.preview_latency')
+            if previews.get('count'):
+                full = metrics.summary('progressive.full_latency')
+                st.caption(f"Progressive: {previews['count']} previews, p50 {previews['p50']:.1f}s"
+                           + (f" vs {full['p50']:.1f}s on the full data" if full.get('count') else ""))
+            charts = sum(metrics.counter('viz.charts', **dict(labels)) for labels in metrics.labels_of('viz.charts'))
+            if charts:
+                st.caption(f"Large-data charts: {int(charts)}, payload "
+                           f"{metrics.counter('viz.payload_bytes', stage='before') / 1e6:.1f} MB → "
+                           f"{metrics.counter('viz.payload_bytes', stage='after') / 1e6:.1f} MB")
+            model_stats = get_model_router().stats()
+            if model_stats:
+                st.caption(f"Model router: {int(metrics.counter('router.escalations'))} escalations")
+                st.dataframe(pd.DataFrame(model_stats).rename(columns={
+                    'requests': 'Requests', 'success_rate': 'Success rate',
+                    'p50_latency': 'p50 latency (s)', 'p95_latency': 'p95 latency (s)'
+                }), hide_index=True)
+            race_rows = race_statistics(metrics)
+            if race_rows:
+                st.caption("Model races")
+                st.dataframe(pd.DataFrame(race_rows), hide_index=True)
+        
         # Additional Settings
         with st.expander("⚙️ Advanced Settings"):
             st.slider("Temperature", 0.0, 1.0, 0.7, 0.1, key="temperature")
             st.slider("Max Tokens", 1000, 8000, 4000, 500, key="max_tokens")
-            st.checkbox("Enable Debug Mode", key="debug_mode")
\ No newline at end of file
+            st.checkbox("Enable Debug Mode", key="debug_mode",
+                        help="Profile each request (cProfile, allocations, flamegraph stacks)")
+            st.checkbox("Profile generated code in the sandbox", key="profile_sandbox",
+                        disabled=not st.session_state.get('debug_mode'))
+
+
+def race_statistics(metrics) -> list:
+    """Win rate, latency saved and extra tokens per raced model set"""
+    names = {model: name for name, model in TOGETHER_MODELS.items()}
+    rows = []
+    for labels in metrics.labels_of('race.runs'):
+        race = dict(labels)['race']
+        runs = metrics.counter('race.runs', race=race)
+        saved = metrics.summary('race.latency_saved', race=race)
+        racers = race.split(',')
+        for model in racers:
+            rows.append({
+                'Race': ' vs '.join(names.get(racer, racer) for racer in racers),
+                'Model': names.get(model, model),
+                'Win rate': metrics.counter('race.wins', race=race, model=model) / runs,
+                'Extra tokens': int(metrics.counter('race.extra_tokens', race=race, model=model)),
+                'Mean latency saved (s)': saved.get('mean'),
+            })
+    return rows
\ No newline at end of file
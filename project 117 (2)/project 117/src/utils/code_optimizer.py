@@ -0,0 +1,370 @@
+import ast
+import os
+import tempfile
+import time
+from typing import Dict, List, Any, Optional, Tuple
+import logging
+
+# Helpers injected at the top of rewritten code; names are prefixed to avoid clashes
+OPTIMIZER_PRELUDE = '''import pandas as _opt_pd
+
+def _opt_as_frame(obj):
+    if isinstance(obj, _opt_pd.DataFrame):
+        return obj
+    if isinstance(obj, _opt_pd.Series):
+        return obj.to_frame().T
+    if isinstance(obj, dict):
+        return _opt_pd.DataFrame([obj])
+    return _opt_pd.DataFrame(obj)
+
+_opt_read_cache = {}
+
+def _opt_cached_read(reader, *args, **kwargs):
+    key = (reader, repr(args), repr(sorted(kwargs.items())))
+    if key not in _opt_read_cache:
+        _opt_read_cache[key] = getattr(_opt_pd, reader)(*args, **kwargs)
+    return _opt_read_cache[key].copy()
+
+'''
+
+VECTORIZABLE_BINOPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+VECTORIZABLE_COMPARISONS = (ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+READERS = {'read_csv', 'read_excel', 'read_json', 'read_parquet', 'read_table'}
+WRITERS = {'to_csv', 'to_excel', 'to_json', 'to_parquet'}
+APPEND_KEYWORDS = {'ignore_index', 'sort', 'verify_integrity'}
+RAW_POINT_PLOTS = {('plt', 'plot'), ('plt', 'scatter'), ('sns', 'scatterplot'), ('sns', 'lineplot'), ('ax', 'plot'), ('ax', 'scatter')}
+WEBGL_PLOTS = {('px', 'scatter'), ('px', 'line')}
+
+
+class CodeOptimizer:
+    """AST pass that rewrites slow pandas idioms in generated code.
+
+    Safe cases are rewritten in the source text (comments and formatting of the
+    untouched code are kept); unsafe ones are reported as warnings:
+
+    - row-wise ``df.apply(lambda row: ..., axis=1)`` over arithmetic/comparisons
+      of ``row['col']`` becomes the equivalent column expression
+    - ``X = X.append(Y)`` inside a loop collects parts and concatenates once
+      after the loop; elsewhere ``DataFrame.append`` becomes ``pd.concat``
+    - identical ``pd.read_*`` calls on a literal path are parsed once
+    - ``px.scatter`` / ``px.line`` render with WebGL
+    - ``iterrows`` loops, other row-wise ``apply`` calls and raw matplotlib /
+      seaborn point plots are flagged
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+
+    def optimize(self, code: str) -> Tuple[str, List[str], List[str]]:
+        """Return the rewritten code, the rewrites applied and warnings for unsafe cases"""
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            return code, [], []
+
+        source = code if code.endswith('\n') else code + '\n'
+        self._line_offsets = self._compute_line_offsets(source)
+        self._source = source
+        edits: List[Tuple[int, int, str]] = []
+        rewrites: List[str] = []
+        warnings: List[str] = []
+
+        self._rewrite_append_loops(tree, edits, rewrites)
+        self._rewrite_row_apply(tree, edits, rewrites, warnings)
+        self._rewrite_repeated_reads(tree, edits, rewrites)
+        self._rewrite_plots(tree, edits, rewrites, warnings)
+        self._flag_iterrows(tree, warnings)
+
+        if not edits:
+            return code, rewrites, warnings
+        optimized = self._apply_edits(source, edits)
+        if '_opt_' in optimized:
+            optimized = OPTIMIZER_PRELUDE + optimized
+        try:
+            ast.parse(optimized)
+        except SyntaxError as e:
+            self.logger.error(f"Optimizer produced invalid code, keeping original: {str(e)}")
+            return code, [], warnings
+        return optimized, rewrites, warnings
+
+    # Source editing helpers -------------------------------------------------
+
+    @staticmethod
+    def _compute_line_offsets(source: str) -> List[int]:
+        offsets, total = [0], 0
+        for line in source.encode('utf-8').splitlines(keepends=True):
+            total += len(line)
+            offsets.append(total)
+        return offsets
+
+    def _span(self, node: ast.AST) -> Tuple[int, int]:
+        """Byte span of a node in the source"""
+        return (self._line_offsets[node.lineno - 1] + node.col_offset,
+                self._line_offsets[node.end_lineno - 1] + node.end_col_offset)
+
+    def _segment(self, node: ast.AST) -> str:
+        start, end = self._span(node)
+        return self._source.encode('utf-8')[start:end].decode('utf-8')
+
+    def _line_start(self, lineno: int) -> int:
+        return self._line_offsets[lineno - 1]
+
+    def _indent_of(self, node: ast.AST) -> str:
+        line = self._source.splitlines()[node.lineno - 1]
+        return line[:len(line) - len(line.lstrip())]
+
+    @staticmethod
+    def _apply_edits(source: str, edits: List[Tuple[int, int, str]]) -> str:
+        data = source.encode('utf-8')
+        applied_start = len(data) + 1
+        for start, end, replacement in sorted(edits, key=lambda edit: (edit[0], edit[1]), reverse=True):
+            if end > applied_start:
+                continue  # overlaps an edit already applied
+            data = data[:start] + replacement.encode('utf-8') + data[end:]
+            applied_start = start
+        return data.decode('utf-8')
+
+    @staticmethod
+    def _call_target(node: ast.AST) -> Optional[Tuple[str, str]]:
+        """('pd', 'read_csv') for pd.read_csv(...)"""
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and isinstance(node.func.value, ast.Name):
+            return node.func.value.id, node.func.attr
+        return None
+
+    # Rewrites ----------------------------------------------------------------
+
+    def _rewrite_append_loops(self, tree: ast.AST, edits: list, rewrites: list):
+        handled = set()
+        for loop in ast.walk(tree):
+            if not isinstance(loop, (ast.For, ast.While)):
+                continue
+            for statement in loop.body:
+                target = self._self_append(statement)
+                if target is None or id(statement) in handled:
+                    continue
+                name, call = target
+                # Any other read of the frame in the loop (its condition, iterable, else block, other statements)
+                # would see it before the parts are concatenated
+                inside = {id(node) for node in ast.walk(statement)}
+                other_uses = [
+                    node for node in ast.walk(loop)
+                    if isinstance(node, ast.Name) and node.id == name and id(node) not in inside
+                ] + [node for arg in call.args for node in ast.walk(arg) if isinstance(node, ast.Name) and node.id == name]
+                if other_uses:
+                    continue
+                handled.add(id(statement))
+                parts = f"_opt_{name}_parts"
+                keywords = ''.join(f", {self._segment(kw)}" for kw in call.keywords if kw.arg in APPEND_KEYWORDS)
+                indent = self._indent_of(loop)
+                edits.append((self._line_start(loop.lineno), self._line_start(loop.lineno), f"{indent}{parts} = []\n"))
+                start, end = self._span(statement)
+                edits.append((start, end, f"{parts}.append(_opt_as_frame({self._segment(call.args[0])}))"))
+                after = self._line_start(loop.end_lineno + 1)
+                edits.append((after, after, f"{indent}{name} = _opt_pd.concat([{name}] + {parts}{keywords})\n"))
+                rewrites.append(f"line {statement.lineno}: DataFrame.append in a loop -> one pd.concat after the loop")
+
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Assign) and id(node) not in handled:
+                target = self._self_append(node)
+                if target is not None:
+                    name, call = target
+                    self._append_to_concat(call, edits, rewrites)
+            elif (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == 'append'
+                  and any(kw.arg in APPEND_KEYWORDS for kw in node.keywords) and len(node.args) == 1
+                  and not self._inside_handled(node, tree, handled)):
+                self._append_to_concat(node, edits, rewrites)
+
+    def _inside_handled(self, call: ast.Call, tree: ast.AST, handled: set) -> bool:
+        for node in ast.walk(tree):
+            if id(node) in handled and any(child is call for child in ast.walk(node)):
+                return True
+        return False
+
+    def _self_append(self, statement: ast.AST) -> Optional[Tuple[str, ast.Call]]:
+        """``X = X.append(Y, ...)`` -- a list's append returns None, so X is a frame"""
+        if (isinstance(statement, ast.Assign) and len(statement.targets) == 1
+                and isinstance(statement.targets[0], ast.Name)):
+            call = statement.value
+            name = statement.targets[0].id
+            if (isinstance(call, ast.Call) and isinstance(call.func, ast.Attribute) and call.func.attr == 'append'
+                    and isinstance(call.func.value, ast.Name) and call.func.value.id == name and len(call.args) == 1):
+                return name, call
+        return None
+
+    def _append_to_concat(self, call: ast.Call, edits: list, rewrites: list):
+        keywords = ''.join(f", {self._segment(kw)}" for kw in call.keywords if kw.arg in APPEND_KEYWORDS)
+        start, end = self._span(call)
+        edits.append((start, end, f"_opt_pd.concat([{self._segment(call.func.value)}, "
+                                  f"_opt_as_frame({self._segment(call.args[0])})]{keywords})"))
+        rewrites.append(f"line {call.lineno}: DataFrame.append -> pd.concat")
+
+    def _rewrite_row_apply(self, tree: ast.AST, edits: list, rewrites: list, warnings: list):
+        for node in ast.walk(tree):
+            if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == 'apply'):
+                continue
+            axis = next((kw.value for kw in node.keywords if kw.arg == 'axis'), None)
+            if not (isinstance(axis, ast.Constant) and axis.value in (1, 'columns')):
+                continue
+            func = node.args[0] if node.args else None
+            frame = node.func.value
+            if (isinstance(func, ast.Lambda) and len(func.args.args) == 1 and len(node.args) == 1
+                    and len(node.keywords) == 1 and isinstance(frame, (ast.Name, ast.Attribute))):
+                row = func.args.args[0].arg
+                if self._vectorizable(func.body, row):
+                    frame_source = self._segment(frame)
+                    expression = self._substitute_row(func.body, row, frame_source)
+                    start, end = self._span(node)
+                    edits.append((start, end, f"({expression})"))
+                    rewrites.append(f"line {node.lineno}: row-wise apply -> vectorized column expression")
+                    continue
+            warnings.append(f"line {node.lineno}: row-wise apply(axis=1) runs Python code per row; "
+                            f"vectorize it with column operations if the frame is large")
+
+    def _vectorizable(self, node: ast.AST, row: str) -> bool:
+        """Arithmetic and single comparisons over row['col'] and numeric constants"""
+        if isinstance(node, ast.BinOp):
+            return (isinstance(node.op, VECTORIZABLE_BINOPS)
+                    and self._vectorizable(node.left, row) and self._vectorizable(node.right, row))
+        if isinstance(node, ast.UnaryOp):
+            return isinstance(node.op, (ast.USub, ast.UAdd)) and self._vectorizable(node.operand, row)
+        if isinstance(node, ast.Compare):
+            return (len(node.ops) == 1 and isinstance(node.ops[0], VECTORIZABLE_COMPARISONS)
+                    and self._vectorizable(node.left, row) and self._vectorizable(node.comparators[0], row))
+        if isinstance(node, ast.Constant):
+            return isinstance(node.value, (int, float)) and not isinstance(node.value, bool)
+        return self._row_column(node, row) is not None
+
+    @staticmethod
+    def _row_column(node: ast.AST, row: str) -> Optional[str]:
+        if (isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id == row
+                and isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str)):
+            return node.slice.value
+        return None
+
+    def _substitute_row(self, body: ast.AST, row: str, frame_source: str) -> str:
+        frame = ast.parse(frame_source, mode='eval').body
+        optimizer = self
+
+        class RowToFrame(ast.NodeTransformer):
+            def visit_Subscript(self, node):
+                column = optimizer._row_column(node, row)
+                if column is not None:
+                    return ast.Subscript(value=frame, slice=ast.Constant(column), ctx=ast.Load())
+                return self.generic_visit(node)
+
+        return ast.unparse(RowToFrame().visit(ast.parse(ast.unparse(body), mode='eval').body))
+
+    def _rewrite_repeated_reads(self, tree: ast.AST, edits: list, rewrites: list):
+        reads: Dict[str, List[ast.Call]] = {}
+        written_paths = set()
+        for node in ast.walk(tree):
+            target = self._call_target(node)
+            if target is None:
+                continue
+            if target[0] == 'pd' and target[1] in READERS and node.args and isinstance(node.args[0], ast.Constant):
+                reads.setdefault(ast.dump(node), []).append(node)
+            elif target[1] in WRITERS and node.args and isinstance(node.args[0], ast.Constant):
+                written_paths.add(node.args[0].value)
+
+        for calls in reads.values():
+            if len(calls) < 2 or calls[0].args[0].value in written_paths:
+                continue
+            for call in calls:
+                arguments = ', '.join([repr(call.func.attr)] + [self._segment(arg) for arg in call.args] +
+                                      [self._segment(kw) for kw in call.keywords])
+                start, end = self._span(call)
+                edits.append((start, end, f"_opt_cached_read({arguments})"))
+            rewrites.append(f"line {calls[0].lineno}: {len(calls)} identical pd.{calls[0].func.attr} calls -> parsed once")
+
+    def _rewrite_plots(self, tree: ast.AST, edits: list, rewrites: list, warnings: list):
+        for node in ast.walk(tree):
+            target = self._call_target(node)
+            if target in WEBGL_PLOTS and not any(kw.arg == 'render_mode' for kw in node.keywords):
+                start, end = self._span(node)
+                segment = self._segment(node)
+                closing = segment.rstrip()[:-1].rstrip()
+                separator = '' if closing.endswith('(') or closing.endswith(',') else ', '
+                edits.append((start, end, f"{closing}{separator}render_mode='webgl')"))
+                rewrites.append(f"line {node.lineno}: {target[0]}.{target[1]} rendered with WebGL")
+            elif target in RAW_POINT_PLOTS:
+                warnings.append(f"line {node.lineno}: {target[0]}.{target[1]} draws every point; "
+                                f"downsample or aggregate large frames before plotting")
+
+    def _flag_iterrows(self, tree: ast.AST, warnings: list):
+        for node in ast.walk(tree):
+            if isinstance(node, ast.For) and isinstance(node.iter, ast.Call) and isinstance(node.iter.func, ast.Attribute) \
+                    and node.iter.func.attr in ('iterrows', 'itertuples'):
+                warnings.append(f"line {node.lineno}: {node.iter.func.attr} loop runs Python code per row; "
+                                f"use vectorized column operations or groupby instead")
+
+    # Timing mode -------------------------------------------------------------
+
+    def benchmark(self, rows: int = 200_000, repeats: int = 1) -> List[Dict[str, Any]]:
+        """Time original vs optimized code for each rewrite on synthetic data"""
+        import numpy as np
+        import pandas as pd
+
+        rng = np.random.default_rng(0)
+        frame = pd.DataFrame({'a': rng.normal(size=rows), 'b': rng.normal(size=rows),
+                              'c': rng.integers(0, 100, size=rows)})
+        handle, csv_path = tempfile.mkstemp(suffix='.csv')
+        os.close(handle)
+        frame.to_csv(csv_path, index=False)
+
+        cases = [
+            ('row-wise apply', "result = df.apply(lambda row: row['a'] * 2 + row['b'] / (row['c'] + 1), axis=1)"),
+            ('append in loop', "result = pd.DataFrame()\nfor i in range(500):\n"
+                               "    result = result.append({'i': i, 'v': i * 2}, ignore_index=True)"),
+            ('repeated read_csv', f"first = pd.read_csv({csv_path!r})\nsecond = pd.read_csv({csv_path!r})\n"
+                                  f"result = pd.read_csv({csv_path!r})"),
+        ]
+        report = []
+        try:
+            for name, code in cases:
+                optimized, rewrites, _ = self.optimize(code)
+                before, before_result = self._time(code, frame, repeats, legacy_append=True)
+                after, after_result = self._time(optimized, frame, repeats)
+                equal = self._results_equal(before_result, after_result)
+                report.append({'pattern': name, 'rows': rows, 'before_s': before, 'after_s': after,
+                               'speedup': before / after if after else float('inf'),
+                               'rewrites': rewrites, 'same_result': equal})
+        finally:
+            os.remove(csv_path)
+        return report
+
+    @staticmethod
+    def _time(code: str, frame, repeats: int, legacy_append: bool = False) -> Tuple[float, Any]:
+        import pandas as pd
+
+        # DataFrame.append was removed in pandas 2; emulate it for the "before" run
+        patched = legacy_append and not hasattr(pd.DataFrame, 'append')
+        if patched:
+            pd.DataFrame.append = lambda self, other, ignore_index=False: pd.concat(
+                [self, other if isinstance(other, pd.DataFrame) else pd.DataFrame([other])], ignore_index=ignore_index)
+        try:
+            best, result = float('inf'), None
+            for _ in range(max(1, repeats)):
+                namespace = {'pd': pd, 'df': frame.copy()}
+                start = time.perf_counter()
+                exec(compile(code, '<benchmark>', 'exec'), namespace)
+                best = min(best, time.perf_counter() - start)
+                result = namespace.get('result')
+            return best, result
+        finally:
+            if patched:
+                del pd.DataFrame.append
+
+    @staticmethod
+    def _results_equal(left: Any, right: Any) -> bool:
+        import numpy as np
+        import pandas as pd
+
+        try:
+            if isinstance(left, pd.DataFrame) and isinstance(right, pd.DataFrame):
+                pd.testing.assert_frame_equal(left.reset_index(drop=True), right.reset_index(drop=True), check_dtype=False)
+                return True
+            if isinstance(left, pd.Series) and isinstance(right, pd.Series):
+                return bool(np.allclose(left.to_numpy(dtype=float), right.to_numpy(dtype=float), equal_nan=True))
+            return left == right
+        except AssertionError:
+            return False
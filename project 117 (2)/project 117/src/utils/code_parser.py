@@ -1,11 +1,15 @@
 import re
-from typing import List, Optional
+from typing import List, Optional, Tuple
 import logging
 
+from src.utils.code_optimizer import CodeOptimizer
+
 class CodeParser:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.pattern = re.compile(r"```python\n(.*?)\n```", re.DOTALL)
+        self.sql_pattern = re.compile(r"```sql\n(.*?)\n```", re.DOTALL | re.IGNORECASE)
+        self.optimizer = CodeOptimizer()
     
     def match_code_blocks(self, llm_response: str) -> str:
         """Extract Python code blocks from LLM response"""
@@ -34,6 +38,15 @@ class CodeParser:
             self.logger.error(f"Code parsing error: {str(e)}")
             return ""
     
+    def match_sql_blocks(self, llm_response: str) -> str:
+        """Extract the SQL query from an LLM response (SQL engine mode)"""
+        try:
+            match = self.sql_pattern.search(llm_response)
+            return match.group(1).strip() if match else ""
+        except Exception as e:
+            self.logger.error(f"SQL parsing error: {str(e)}")
+            return ""
+    
     def extract_all_code_blocks(self, text: str) -> List[str]:
         """Extract all code blocks from text"""
         try:
@@ -53,4 +66,15 @@ class CodeParser:
             return False
         except Exception as e:
             self.logger.error(f"Code validation error: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+    
+    def optimize_code(self, code: str) -> Tuple[str, List[str]]:
+        """Rewrite slow pandas idioms; returns the new code and warnings for unsafe cases"""
+        try:
+            optimized, rewrites, warnings = self.optimizer.optimize(code)
+            if rewrites:
+                self.logger.info(f"Optimizer rewrites: {rewrites}")
+            return optimized, warnings
+        except Exception as e:
+            self.logger.error(f"Code optimization error: {str(e)}")
+            return code, []
\ No newline at end of file
@@ -1,11 +1,17 @@
 import pandas as pd
 import json
+import shlex
 import logging
-from typing import Optional
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
 import streamlit as st
 from e2b_code_interpreter import Sandbox
 
 class FileHandler:
+    # (sandbox_id, dataset_path) -> fingerprint of the dataset version uploaded there
+    _sandbox_versions: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+    _max_tracked_sandboxes = 256
+    
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.supported_formats = ['csv', 'xlsx', 'json']
@@ -36,17 +42,96 @@ class FileHandler:
             st.error(f"Error processing file: {str(e)}")
             return None
     
-    def upload_to_sandbox(self, code_interpreter: Sandbox, uploaded_file) -> str:
-        """Upload file to E2B sandbox"""
+    def upload_to_sandbox(self, code_interpreter: Sandbox, uploaded_file, dataset: Optional[Dict[str, Any]] = None) -> str:
+        """Upload file to E2B sandbox
+
+        With a ``dataset`` entry from the ``DatasetStore``, a sandbox that already
+        holds the version this upload extends only receives the appended bytes.
+        """
         dataset_path = f"./{uploaded_file.name}"
         try:
-            code_interpreter.files.write(dataset_path, uploaded_file)
+            if dataset is None:
+                code_interpreter.files.write(dataset_path, uploaded_file)
+                return dataset_path
+            
+            key = (getattr(code_interpreter, 'sandbox_id', None), dataset_path)
+            uploaded_version = self._sandbox_versions.get(key) if key[0] else None
+            if uploaded_version == dataset['fingerprint']:
+                return dataset_path
+            if dataset['parent'] is not None and uploaded_version == dataset['parent']:
+                self.append_to_sandbox(code_interpreter, dataset_path, uploaded_file.getvalue()[dataset['offset']:])
+            else:
+                code_interpreter.files.write(dataset_path, uploaded_file.getvalue())
+            if key[0]:
+                self._remember_version(key, dataset['fingerprint'])
             return dataset_path
         except Exception as error:
             st.error(f"Error during file upload: {error}")
             self.logger.error(f"Sandbox upload error: {error}")
             raise error
     
+    def upload_bars(self, code_interpreter: Sandbox, dataset_path: str, dataset: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Upload the dataset's OHLCV bar levels next to it (Feather files)
+
+        Returns ``{level: {'path', 'rows'}}`` for the prompt; empty when the
+        dataset has no time-series index or the upload fails. A sandbox that
+        already holds this version's bars is not uploaded to again.
+        """
+        index = dataset.get('timeseries')
+        if index is None:
+            return {}
+        bars = {level: {'path': f"{dataset_path}.bars_{level}.feather", 'rows': rows}
+                for level, rows in index.level_sizes().items()}
+        key = (getattr(code_interpreter, 'sandbox_id', None), f"{dataset_path}.bars")
+        try:
+            if not key[0] or self._sandbox_versions.get(key) != dataset['fingerprint']:
+                for level, info in bars.items():
+                    code_interpreter.files.write(info['path'], index.to_feather(level))
+                if key[0]:
+                    self._remember_version(key, dataset['fingerprint'])
+            return bars
+        except Exception as e:
+            self.logger.warning(f"Could not upload time-series bars: {str(e)}")
+            return {}
+    
+    def upload_sample(self, code_interpreter: Sandbox, dataset_path: str,
+                      dataset: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Upload the dataset's stratified sample next to it (CSV, read like the dataset)
+
+        Returns ``{'path', 'sample'}`` for ``LLMClient.chat_with_llm``, or None
+        when the dataset has no sample or the upload fails.
+        """
+        sample = dataset.get('sample')
+        if sample is None:
+            return None
+        path = f"{dataset_path}.sample.csv"
+        key = (getattr(code_interpreter, 'sandbox_id', None), path)
+        try:
+            if not key[0] or self._sandbox_versions.get(key) != dataset['fingerprint']:
+                code_interpreter.files.write(path, sample.to_csv())
+                if key[0]:
+                    self._remember_version(key, dataset['fingerprint'])
+            return {'path': path, 'sample': sample}
+        except Exception as e:
+            self.logger.warning(f"Could not upload the stratified sample: {str(e)}")
+            return None
+    
+    def append_to_sandbox(self, code_interpreter: Sandbox, dataset_path: str, data: bytes):
+        """Append bytes to a file that already exists in the sandbox"""
+        if not data:
+            return
+        tail_path = f"{dataset_path}.tail"
+        code_interpreter.files.write(tail_path, data)
+        code_interpreter.commands.run(
+            f"cat {shlex.quote(tail_path)} >> {shlex.quote(dataset_path)} && rm {shlex.quote(tail_path)}"
+        )
+    
+    def _remember_version(self, key: Tuple[str, str], fingerprint: str):
+        self._sandbox_versions[key] = fingerprint
+        self._sandbox_versions.move_to_end(key)
+        while len(self._sandbox_versions) > self._max_tracked_sandboxes:
+            self._sandbox_versions.popitem(last=False)
+    
     def validate_file_size(self, file, max_size_mb=100):
         """Validate file size"""
         file_size = len(file.getvalue()) / (1024 * 1024)  # Convert to MB
@@ -0,0 +1,120 @@
+import threading
+from collections import defaultdict, deque
+from typing import Dict, Any, Optional, Tuple
+import numpy as np
+import logging
+
+MetricKey = Tuple[str, Tuple[Tuple[str, Any], ...]]
+
+
+class MetricsRecorder:
+    """In-process counters, gauges and latency samples for the analysis pipeline.
+
+    Metrics are identified by a name plus optional labels, e.g.
+    ``increment('execution.failed', model='...')``. Observations keep the most
+    recent ``max_samples`` values for percentiles.
+    """
+
+    def __init__(self, max_samples: int = 1000):
+        self.logger = logging.getLogger(__name__)
+        self.max_samples = max_samples
+        self._counters: Dict[MetricKey, float] = defaultdict(float)
+        self._gauges: Dict[MetricKey, float] = {}
+        self._samples: Dict[MetricKey, deque] = {}
+        self._totals: Dict[MetricKey, list] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, Any]) -> MetricKey:
+        return name, tuple(sorted(labels.items()))
+
+    def increment(self, name: str, value: float = 1, **labels):
+        """Add to a counter"""
+        with self._lock:
+            self._counters[self._key(name, labels)] += value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """Set a point-in-time value"""
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        """Record one sample of a distribution (latencies, sizes)"""
+        key = self._key(name, labels)
+        with self._lock:
+            if key not in self._samples:
+                self._samples[key] = deque(maxlen=self.max_samples)
+                self._totals[key] = [0, 0.0]
+            self._samples[key].append(value)
+            self._totals[key][0] += 1
+            self._totals[key][1] += value
+
+    def counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0.0)
+
+    def gauge(self, name: str, **labels) -> Optional[float]:
+        with self._lock:
+            return self._gauges.get(self._key(name, labels))
+
+    def summary(self, name: str, **labels) -> Dict[str, float]:
+        """Count, mean and percentiles of an observed distribution"""
+        key = self._key(name, labels)
+        with self._lock:
+            samples = list(self._samples.get(key, ()))
+            count, total = self._totals.get(key, (0, 0.0))
+        if not samples:
+            return {'count': 0}
+        values = np.asarray(samples, dtype=float)
+        return {
+            'count': count,
+            'mean': total / count,
+            'p50': float(np.percentile(values, 50)),
+            'p95': float(np.percentile(values, 95)),
+            'max': float(values.max()),
+        }
+
+    def ratio(self, numerator: str, denominator: str, **labels) -> Optional[float]:
+        """Ratio of two counters, None while the denominator is zero"""
+        denominator_value = self.counter(denominator, **labels)
+        if not denominator_value:
+            return None
+        return self.counter(numerator, **labels) / denominator_value
+
+    def labels_of(self, name: str) -> list:
+        """Label sets recorded for a metric name"""
+        with self._lock:
+            keys = list(self._counters) + list(self._gauges) + list(self._samples)
+        return sorted({labels for metric, labels in keys if metric == name})
+
+    def snapshot(self) -> Dict[str, Any]:
+        """All metrics as plain data (for display or export)"""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            sample_keys = list(self._samples)
+
+        def label(key: MetricKey) -> str:
+            name, labels = key
+            if not labels:
+                return name
+            return name + '{' + ','.join(f'{k}={v}' for k, v in labels) + '}'
+
+        return {
+            'counters': {label(key): value for key, value in counters.items()},
+            'gauges': {label(key): value for key, value in gauges.items()},
+            'summaries': {label(key): self.summary(key[0], **dict(key[1])) for key in sample_keys},
+        }
+
+
+_default_metrics: Optional[MetricsRecorder] = None
+_default_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRecorder:
+    """Process-wide metrics recorder"""
+    global _default_metrics
+    with _default_metrics_lock:
+        if _default_metrics is None:
+            _default_metrics = MetricsRecorder()
+        return _default_metrics
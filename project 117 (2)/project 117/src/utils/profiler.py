@@ -0,0 +1,187 @@
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Callable, Dict, Iterator, List, Any, Optional
+import logging
+
+from config.settings import PROFILER_CONFIG
+
+# tracemalloc is process-wide; it stays on while any stage (on any thread) needs it,
+# and is only stopped here when it was started here
+_tracing_users = 0
+_tracing_started = False
+_tracing_lock = threading.Lock()
+
+_ALLOCATION_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+]
+
+
+def _acquire_tracing():
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILER_CONFIG['traceback_frames'])
+            _tracing_started = True
+        _tracing_users += 1
+
+
+def _release_tracing():
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_started:
+            tracemalloc.stop()
+            _tracing_started = False
+
+
+@contextlib.contextmanager
+def memory_tracing() -> Iterator[None]:
+    """Keep tracemalloc on for the block without stopping it under other users"""
+    _acquire_tracing()
+    try:
+        yield
+    finally:
+        _release_tracing()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _StackSampler:
+    """Samples one thread's call stack (and the traced memory) at a fixed interval into folded-stack counts"""
+
+    def __init__(self, thread_id: int, interval: float, prefix: str):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.prefix = prefix
+        self.samples: Counter = Counter()
+        self.peak_memory = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if tracemalloc.is_tracing():
+                self.peak_memory = max(self.peak_memory, tracemalloc.get_traced_memory()[0])
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join([self.prefix] + stack[::-1])] += 1
+
+
+class RequestProfiler:
+    """Profile of one request's host-side work, split into named stages
+
+    Each stage records wall time, peak and top net allocations, cProfile call
+    statistics and sampled call stacks in the folded format used by
+    ``flamegraph.pl`` and speedscope. The peak is the highest traced memory
+    seen by the stack sampler, so tracemalloc's process-wide peak is never
+    reset under other requests. Stages must run on the thread that entered
+    them; tracemalloc is process-wide, so stages that overlap with other
+    threads' work also count those threads' allocations.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.stages: List[Dict[str, Any]] = []
+        self.folded: Counter = Counter()
+        self._profile = cProfile.Profile()
+        self._depth = 0
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if self._depth:
+            # Nested stages are already covered by the enclosing one
+            yield
+            return
+
+        _acquire_tracing()
+        start_memory, _ = tracemalloc.get_traced_memory()
+        before = tracemalloc.take_snapshot().filter_traces(_ALLOCATION_FILTERS)
+        sampler = _StackSampler(threading.get_ident(), PROFILER_CONFIG['sample_interval'], name)
+        sampler.start()
+        self._depth += 1
+        started = time.perf_counter()
+        self._profile.enable()
+        try:
+            yield
+        finally:
+            self._profile.disable()
+            duration_ms = (time.perf_counter() - started) * 1000
+            self._depth -= 1
+            self.folded.update(sampler.stop())
+            end_memory, _ = tracemalloc.get_traced_memory()
+            peak = max(sampler.peak_memory, end_memory)
+            after = tracemalloc.take_snapshot().filter_traces(_ALLOCATION_FILTERS)
+            _release_tracing()
+            self.stages.append({
+                'stage': name,
+                'duration_ms': round(duration_ms, 1),
+                'peak_kb': round(max(0, peak - start_memory) / 1024, 1),
+                'net_kb': round((end_memory - start_memory) / 1024, 1),
+                'top_allocations': [
+                    {'location': str(stat.traceback[0]), 'size_kb': round(stat.size_diff / 1024, 1),
+                     'count': stat.count_diff}
+                    for stat in after.compare_to(before, 'lineno')[:PROFILER_CONFIG['top_allocations']]
+                    if stat.size_diff > 0
+                ],
+            })
+
+    def stats_text(self, sort: str = 'cumulative') -> str:
+        """cProfile statistics over all stages"""
+        stream = io.StringIO()
+        try:
+            pstats.Stats(self._profile, stream=stream).sort_stats(sort).print_stats(PROFILER_CONFIG['stats_limit'])
+        except TypeError:
+            return "(no calls recorded)"
+        return stream.getvalue()
+
+    def folded_stacks(self) -> str:
+        """``stack;frames count`` lines, one per distinct sampled stack"""
+        return '\n'.join(f"{stack} {count}" for stack, count in self.folded.most_common())
+
+    def report(self) -> Dict[str, Any]:
+        """Plain-data profile (safe to store in job state or dump as JSON)"""
+        return {'stages': self.stages, 'cprofile': self.stats_text(), 'folded': self.folded_stacks()}
+
+
+def profiled_job(fn: Callable[[Any], Any], stage: str = 'analysis') -> Callable[[Any], Any]:
+    """Wrap a job function so its run is profiled; the report is published as the ``profile`` partial"""
+    def run(job):
+        profiler = RequestProfiler()
+        try:
+            with profiler.stage(stage):
+                return fn(job)
+        finally:
+            job.partial('profile', profiler.report())
+
+    return run
+
+
+def report_json(report: Dict[str, Any], sandbox_profile: Optional[str] = None) -> str:
+    return json.dumps(dict(report, sandbox=sandbox_profile), indent=2, default=str)
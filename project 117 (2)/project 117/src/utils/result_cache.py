@@ -0,0 +1,61 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+import logging
+
+from config.settings import RESULT_CACHE_CONFIG
+
+
+class ResultCache:
+    """Thread-safe LRU cache for results derived from a dataset.
+
+    Keys start with the dataset fingerprint, so a changed upload never sees
+    results computed for a previous version.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.logger = logging.getLogger(__name__)
+        self.max_entries = max_entries or RESULT_CACHE_CONFIG['max_entries']
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Return the cached value for ``key``, computing and storing it on a miss"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, fingerprint: str):
+        """Drop every result computed for a dataset"""
+        with self._lock:
+            for key in [key for key in self._entries if isinstance(key, tuple) and key and key[0] == fingerprint]:
+                del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_default_cache: Optional[ResultCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """Process-wide result cache shared by all Streamlit sessions"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResultCache()
+        return _default_cache
@@ -0,0 +1,201 @@
+import atexit
+import contextlib
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterator, Optional
+
+from config.settings import LOGGING_CONFIG
+
+_trace_id: contextvars.ContextVar = contextvars.ContextVar('trace_id', default=None)
+_stage_timings: contextvars.ContextVar = contextvars.ContextVar('stage_timings', default=None)
+
+# Attributes every LogRecord has; anything else was passed through ``extra=``
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+def current_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+@contextlib.contextmanager
+def new_trace(trace_id: Optional[str] = None) -> Iterator[str]:
+    """Tag every log record written in this context with one trace ID"""
+    trace_id = trace_id or uuid.uuid4().hex[:12]
+    trace_token = _trace_id.set(trace_id)
+    timings_token = _stage_timings.set({})
+    try:
+        yield trace_id
+    finally:
+        _stage_timings.reset(timings_token)
+        _trace_id.reset(trace_token)
+
+
+@contextlib.contextmanager
+def trace_stage(name: str, logger: Optional[logging.Logger] = None) -> Iterator[None]:
+    """Time a pipeline stage; the duration is logged and added to the trace's stage timings"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration_ms = (time.perf_counter() - started) * 1000
+        timings = _stage_timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + duration_ms
+        (logger or logging.getLogger(__name__)).info(
+            f"Stage {name} finished", extra={'stage': name, 'duration_ms': round(duration_ms, 1)}
+        )
+
+
+def stage_timings() -> Dict[str, float]:
+    """Milliseconds spent per stage in the current trace"""
+    return {name: round(ms, 1) for name, ms in (_stage_timings.get() or {}).items()}
+
+
+class TraceContextFilter(logging.Filter):
+    """Copies the trace ID onto records while still on the logging thread's context"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, 'trace_id'):
+            record.trace_id = _trace_id.get()
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """Keeps one in ``every`` DEBUG records per call site (file and line)
+
+    Call sites rather than message texts are counted, so f-string messages
+    that differ on every call are still sampled; at most ``max_sites`` counts
+    are kept, after which counting starts over.
+    """
+
+    def __init__(self, every: int, max_sites: int = 1024):
+        super().__init__()
+        self.every = max(1, every)
+        self.max_sites = max_sites
+        self._counts: Dict[tuple, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno != logging.DEBUG or self.every == 1:
+            return True
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            if key not in self._counts and len(self._counts) >= self.max_sites:
+                self._counts.clear()
+            count = self._counts[key]
+            self._counts[key] = count + 1
+        if count % self.every:
+            return False
+        record.sampled_every = self.every
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the trace ID and any ``extra=`` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName,
+        }
+        entry.update({key: value for key, value in vars(record).items()
+                      if key not in _RECORD_ATTRIBUTES and value is not None})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SizeAndTimeRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """Rotates at the configured time interval or once the file exceeds ``max_bytes``"""
+
+    def __init__(self, filename: str, max_bytes: int, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.max_bytes = max_bytes
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if super().shouldRollover(record):
+            return True
+        if self.max_bytes <= 0 or self.stream is None:
+            return False
+        self.stream.seek(0, os.SEEK_END)
+        return self.stream.tell() + len(self.format(record)) + 1 >= self.max_bytes
+
+    def rotation_filename(self, default_name: str) -> str:
+        # Size rollovers can happen several times within one time interval
+        name, counter = default_name, 1
+        while os.path.exists(name):
+            name = f"{default_name}.{counter}"
+            counter += 1
+        return name
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_configure_lock = threading.Lock()
+
+
+def configure_logging(directory: Optional[str] = None, level: Optional[str] = None) -> logging.handlers.QueueListener:
+    """Route all logging through a queue to a background writer thread (idempotent)
+
+    Callers only enqueue records; a ``QueueListener`` thread formats them as
+    JSON into a size- and time-rotated file (and plain text on the console).
+    """
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            return _listener
+
+        directory = directory or LOGGING_CONFIG['directory']
+        os.makedirs(directory, exist_ok=True)
+        handlers = []
+        if 'file' in LOGGING_CONFIG['handlers']:
+            file_handler = SizeAndTimeRotatingFileHandler(
+                os.path.join(directory, LOGGING_CONFIG['filename']), max_bytes=LOGGING_CONFIG['max_bytes'],
+                when=LOGGING_CONFIG['when'], backupCount=LOGGING_CONFIG['backup_count'], encoding='utf-8'
+            )
+            file_handler.setFormatter(JsonFormatter())
+            handlers.append(file_handler)
+        if 'console' in LOGGING_CONFIG['handlers']:
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(logging.Formatter(LOGGING_CONFIG['format']))
+            handlers.append(console_handler)
+
+        queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+        queue_handler.addFilter(TraceContextFilter())
+        queue_handler.addFilter(DebugSampler(LOGGING_CONFIG['debug_sample_every']))
+
+        root = logging.getLogger()
+        root.setLevel(level or LOGGING_CONFIG['level'])
+        root.addHandler(queue_handler)
+
+        _listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+        return _listener
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    with _configure_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            if isinstance(handler, logging.handlers.QueueHandler):
+                root.removeHandler(handler)
+        _listener = None
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import time
+import unittest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from starlette.testclient import TestClient
+
+from src.api.analysis_service import AnalysisService, create_app
+from src.api.load_generator import generate_load
+from src.core.dataset_store import DatasetStore
+from src.core.job_queue import JobQueue
+from src.utils.metrics import MetricsRecorder
+
+CSV = b"Symbol,Price\nAAA,10\nBBB,20\n"
+KEYS = {'X-Together-Api-Key': 'together', 'X-E2B-Api-Key': 'e2b'}
+
+
+def fake_pipeline(delay=0.0):
+    """Stands in for ``analysis_job``: no sandbox or LLM, just progress and a result"""
+    def build(upload, dataset, query, options, e2b_api_key):
+        def run(job):
+            job.progress("📤 Uploading dataset to the sandbox...")
+            time.sleep(delay)
+            job.partial('response', f"Answer to {query}")
+            return (['42'], f"Answer to {query}", "print(42)")
+        return run
+    return build
+
+
+class TestAnalysisService(unittest.TestCase):
+    def setUp(self):
+        self.service = AnalysisService(JobQueue(max_workers=4, metrics=MetricsRecorder()), DatasetStore(),
+                                       pipeline=fake_pipeline())
+        self.client = TestClient(create_app(self.service))
+
+    def register(self):
+        response = self.client.post('/datasets', params={'name': '../nse.csv'}, content=CSV)
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def test_register_and_stream_query(self):
+        dataset = self.register()
+        self.assertEqual(dataset['rows'], 2)
+        self.assertEqual(dataset['name'], 'nse.csv')
+
+        response = self.client.post(f"/datasets/{dataset['fingerprint']}/queries", json={'query': 'mean price'},
+                                    headers=KEYS)
+        self.assertEqual(response.status_code, 202)
+        events = self.client.get(response.json()['events']).text
+
+        names = [line.split(': ', 1)[1] for line in events.splitlines() if line.startswith('event: ')]
+        self.assertEqual(names[0], 'progress')
+        self.assertEqual(names[-1], 'completed')
+        final = json.loads(events.strip().splitlines()[-1][len('data: '):])
+        self.assertEqual(final['result']['outputs'], [{'text': '42'}])
+
+    def test_errors(self):
+        dataset = self.register()
+        unknown = self.client.post('/datasets/nope/queries', json={'query': 'q'}, headers=KEYS)
+        self.assertEqual(unknown.status_code, 404)
+        missing_query = self.client.post(f"/datasets/{dataset['fingerprint']}/queries", json={}, headers=KEYS)
+        self.assertEqual(missing_query.status_code, 400)
+        self.assertEqual(self.client.get('/queries/unknown').status_code, 404)
+
+
+class TestLoadGenerator(unittest.TestCase):
+    def test_queries_are_multiplexed(self):
+        service = AnalysisService(JobQueue(max_workers=10, metrics=MetricsRecorder()), DatasetStore(),
+                                  pipeline=fake_pipeline(delay=0.3))
+        transport = httpx.ASGITransport(app=create_app(service))
+
+        report = asyncio.run(generate_load('http://service', CSV, 'mean price', requests=10, concurrency=10,
+                                           transport=transport, headers=KEYS))
+
+        self.assertEqual(report['statuses'], {'completed': 10})
+        # Ten 0.3 s runs back to back would take 3 s
+        self.assertLess(report['elapsed_s'], 1.5)
+        self.assertGreater(report['throughput_rps'], 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,46 @@
+import ast
+import inspect
+import contextlib
+import io
+import json
+import threading
+import time
 import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
 import pandas as pd
-from unittest.mock import Mock, patch
+from unittest.mock import DEFAULT, Mock, patch
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.core.data_processor import DataProcessor
 from src.core.code_executor import CodeExecutor
+from src.core.dataset_store import DatasetStore
+from src.core.correlation_engine import CorrelationEngine
+from src.core.session_kernel import SessionKernel
+from src.core.llm_client import LLMClient
+from src.core.preflight import PreflightChecker
+from src.core.model_router import ModelRouter
+from src.core.request_scheduler import RequestScheduler, DeadlineExceeded
+from src.core.single_flight import SingleFlight, coalescing_key
+from src.core.job_queue import JobQueue
+from src.core.sandbox_pool import SandboxPool
+from src.core.reporting import Reporter
+from src.core.table_results import TableResult
+from src.core.timeseries_store import TimeSeriesIndex
+from src.core.rollup_cube import CubeQueryMatcher
+from src.core.profile_answers import ProfileQueryMatcher, answer_from_profile
+from src.core.local_answers import LocalAnswerer
+from src.core.analysis_pipeline import analysis_job
+from src.core.sandbox_helpers import memory_limit_cell
+from src.core.sql_engine import SQLEngine, check_select, duckdb
+from src.core.stratified_sample import StratifiedSample
+from e2b_code_interpreter import Sandbox
+from e2b_code_interpreter.models import Result
+from src.utils.metrics import MetricsRecorder
+from config.models import TOGETHER_MODELS, AUTO_MODEL_ID
+from config.settings import PROGRESSIVE_CONFIG
 from src.utils.code_parser import CodeParser
 from src.utils.validators import Validators
 
@@ -40,6 +74,46 @@ class TestDataProcessor(unittest.TestCase):
         # Check that missing values are filled
         self.assertEqual(cleaned_df['A'].isnull().sum(), 0)
         self.assertEqual(cleaned_df['B'].isnull().sum(), 0)
+    
+    def test_clean_data_pipeline_steps(self):
+        dirty_df = pd.DataFrame({
+            'A': [1.0, 1.0, None, 4.0],
+            'B': [' x', ' x', 'y ', None],
+            'C': ['1', '1', '2', '3']
+        })
+        
+        cleaned_df = self.processor.clean_data(dirty_df, steps=['dedupe', 'trim', 'coerce', 'impute'])
+        
+        self.assertEqual(len(cleaned_df), 3)
+        self.assertEqual(cleaned_df['B'].tolist(), ['x', 'y', 'x'])
+        self.assertEqual(cleaned_df['A'].tolist(), [1.0, 2.5, 4.0])
+        self.assertTrue(pd.api.types.is_numeric_dtype(cleaned_df['C']))
+        # The input frame is not modified
+        self.assertEqual(len(dirty_df), 4)
+        self.assertTrue(dirty_df['A'].isnull().any())
+        
+        report = self.processor.last_cleaning_report
+        self.assertEqual([step['step'] for step in report], ['dedupe', 'trim', 'coerce', 'impute'])
+        self.assertEqual(report[0]['rows_after'], 3)
+        self.assertTrue(all('seconds' in step and 'peak_memory_bytes' in step for step in report))
+    
+    def test_clean_data_in_place_chunked(self):
+        df = pd.DataFrame({'A': [1, 2, 1, 2, 3], 'B': [None, 'b', None, 'b', 'c']})
+        
+        cleaned_df = self.processor.clean_data(df, inplace=True, chunk_size=2)
+        
+        self.assertIs(cleaned_df, df)
+        self.assertEqual(len(df), 3)
+        self.assertEqual(df['B'].tolist(), ['b', 'b', 'c'])
+    
+    def test_dedupe_drops_by_position_and_confirms_hashes(self):
+        df = pd.DataFrame({'A': [1, 1, 2, 3], 'B': ['x', 'x', 'y', 'z']}, index=[0, 0, 1, 1])
+        
+        cleaned_df = self.processor.clean_data(df, steps=['dedupe'], inplace=True)
+        
+        self.assertEqual(cleaned_df['A'].tolist(), [1, 2, 3])
+        with patch('pandas.util.hash_pandas_object', side_effect=lambda rows, index: pd.Series(0, index=rows.index)):
+            self.assertEqual(len(self.processor.clean_data(df, steps=['dedupe'])), 3)
 
 class TestCodeParser(unittest.TestCase):
     def setUp(self):
@@ -101,5 +175,1187 @@ class TestValidators(unittest.TestCase):
         self.assertFalse(result['is_valid'])
         self.assertIn("Query cannot be empty", result['errors'])
 
+class TestDatasetStore(unittest.TestCase):
+    def setUp(self):
+        self.store = DatasetStore(max_entries=4)
+        self.base = b"Symbol,Price,Volume\nTCS,10.5,100\nINFY,20.0,\nTCS,11.0,300\n"
+        self.extended = self.base + b"WIPRO,5.5,50\nTCS,12.0,10\n"
+    
+    def test_ingest_is_cached_by_fingerprint(self):
+        first = self.store.ingest('nse.csv', self.base)
+        second = self.store.ingest('nse.csv', self.base)
+        self.assertIs(first['analysis'], second['analysis'])
+        self.assertEqual(first['df'].shape, (3, 3))
+    
+    def test_sessions_cannot_change_each_others_frame(self):
+        first = self.store.ingest('nse.csv', self.base)
+        first['df'].loc[0, 'Price'] = -1.0
+        first['df']['Ratio'] = 1
+        first['df'].drop(index=1, inplace=True)
+        
+        second = self.store.ingest('nse.csv', self.base)
+        self.assertEqual(second['df']['Price'].tolist()[0], 10.5)
+        self.assertEqual(list(second['df'].columns), ['Symbol', 'Price', 'Volume'])
+        self.assertEqual(len(self.store.get(second['fingerprint'])['df']), 3)
+    
+    def test_appended_upload_only_parses_tail(self):
+        base = self.store.ingest('nse.csv', self.base)
+        extended = self.store.ingest('nse.csv', self.extended)
+        
+        self.assertEqual(extended['parent'], base['fingerprint'])
+        self.assertEqual(extended['offset'], len(self.base))
+        self.assertEqual(extended['appended_rows'], 2)
+        self.assertEqual(extended['df'].shape, (5, 3))
+        
+        full = DataProcessor().analyze_dataframe(extended['df'])
+        analysis = extended['analysis']
+        self.assertEqual(analysis['shape'], full['shape'])
+        self.assertEqual(analysis['null_counts'], full['null_counts'])
+        self.assertEqual(analysis['categorical_summary'], full['categorical_summary'])
+        for col, stats in full['numeric_summary'].items():
+            for stat, value in stats.items():
+                self.assertAlmostEqual(analysis['numeric_summary'][col][stat], value, places=9)
+    
+    def test_modified_upload_is_reparsed(self):
+        self.store.ingest('nse.csv', self.base)
+        modified = self.store.ingest('nse.csv', self.base.replace(b'10.5', b'10.6') + b"WIPRO,5.5,50\n")
+        self.assertIsNone(modified['parent'])
+        self.assertEqual(modified['df'].shape, (4, 3))
+
+class TestTimeSeriesIndex(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        times = pd.date_range('2025-05-15 09:15', '2025-05-16 15:30', freq='min')
+        times = times[(times.hour >= 9) & (times.hour < 16)]
+        self.df = pd.DataFrame({
+            'Symbol': np.repeat(['TCS', 'INFY'], len(times)),
+            'Last Price': 100 + rng.normal(size=2 * len(times)).cumsum(),
+            'Volume': rng.integers(1, 1000, 2 * len(times)),
+            'Time': np.tile(times.strftime('%Y-%m-%d %H:%M:%S'), 2),
+        }).sample(frac=1, random_state=0).reset_index(drop=True)
+    
+    def test_bars_match_resampling_raw_rows(self):
+        index = TimeSeriesIndex.from_frame(self.df)
+        tcs = self.df[self.df['Symbol'] == 'TCS'].assign(Time=lambda d: pd.to_datetime(d['Time']))
+        tcs = tcs.sort_values('Time').set_index('Time')
+        
+        bars = index.bars('TCS', freq='15min')
+        expected = tcs['Last Price'].resample('15min').ohlc().dropna()
+        self.assertEqual(bars.attrs['level'], '5min')
+        np.testing.assert_allclose(bars[['Open', 'High', 'Low', 'Close']].to_numpy(), expected.to_numpy())
+        vwap = ((tcs['Last Price'] * tcs['Volume']).resample('15min').sum()
+                / tcs['Volume'].resample('15min').sum()).dropna()
+        np.testing.assert_allclose(bars['VWAP'].to_numpy(), vwap.to_numpy())
+        
+        self.assertEqual(index.bars('TCS').attrs['level'], '1min')
+        self.assertEqual(index.bars('TCS', max_points=100).attrs['level'], '1h')
+        self.assertEqual(len(index.symbol_ticks('INFY')), len(self.df) // 2)
+    
+    def test_appended_rows_update_the_pyramid(self):
+        head, tail = self.df.iloc[:500], self.df.iloc[500:]
+        base = b'Symbol,Last Price,Volume,Time\n' + head.to_csv(index=False, header=False).encode()
+        store = DatasetStore()
+        store.ingest('nse.csv', base)
+        extended = store.ingest('nse.csv', base + tail.to_csv(index=False, header=False).encode())
+        
+        self.assertEqual(extended['appended_rows'], len(tail))
+        full = TimeSeriesIndex.from_frame(self.df)
+        for level in full.levels:
+            pd.testing.assert_frame_equal(extended['timeseries'].bars(freq=level), full.bars(freq=level))
+
+class TestRollupCube(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        n = 3000
+        self.df = pd.DataFrame({
+            'Symbol': rng.choice(['TCS', 'INFY', 'SBIN', 'HDFCBANK'], n),
+            'Sector': rng.choice(['IT', 'Banking', 'Energy'], n),
+            'Date': rng.choice(['2025-05-15', '2025-05-16'], n),
+            'P Change': rng.normal(size=n).round(2),
+            'Change': rng.normal(size=n).round(2),
+            'Volume': rng.integers(1, 10000, n),
+        })
+        self.df.loc[::50, 'P Change'] = None
+        self.data = self.df.to_csv(index=False).encode()
+        self.matcher = CubeQueryMatcher()
+    
+    def test_group_bys_match_pandas_after_appends(self):
+        store = DatasetStore()
+        head = self.df.iloc[:2000].to_csv(index=False).encode()
+        store.ingest('nse.csv', head)
+        cube = store.ingest('nse.csv', self.data)['cube']
+        
+        query = self.matcher.match("What is the mean and standard deviation of P Change by Sector?", cube)
+        result = cube.answer(query).set_index('Sector')
+        expected = self.df.groupby('Sector')['P Change'].agg(['mean', 'std'])
+        np.testing.assert_allclose(result.to_numpy(), expected.to_numpy())
+        
+        query = self.matcher.match("Total Volume by Symbol and Date", cube)
+        expected = self.df.groupby(['Symbol', 'Date'])['Volume'].sum().reset_index()
+        pd.testing.assert_frame_equal(cube.answer(query), expected, check_dtype=False)
+    
+    def test_matcher_leaves_other_questions_to_the_llm(self):
+        cube = DatasetStore().ingest('nse.csv', self.data)['cube']
+        for question in ["Plot the mean P Change by Sector", "Average Volume for IT stocks",
+                         "Top 3 Symbol by total Volume", "Median Change by Sector",
+                         "Can you calculate and display the mean of each numerical column?",
+                         "Mean P Change over time", "average P Change by Sector today",
+                         "Mean Volume by Sector since last week", "average P Change by Sector for large caps",
+                         "average P Change by Sector for positive Change", "How many stocks are in each Sector?"]:
+            self.assertIsNone(self.matcher.match(question, cube), question)
+        self.assertEqual(self.matcher.match("how many rows per Sector", cube).aggregates, ['count'])
+    
+    def test_pipeline_answers_cube_questions_locally(self):
+        dataset = DatasetStore().ingest('nse.csv', self.data)
+        upload = Mock()
+        upload.name = 'nse.csv'
+        sandbox_pool = Mock()
+        job = analysis_job(upload, dataset, "average Change per Sector", {'model_name': 'm', 'race_mode': False},
+                           'key', file_handler=Mock(), sandbox_pool=sandbox_pool, single_flight=Mock())
+        
+        results, response, code = job(Mock())
+        
+        sandbox_pool.lease.assert_not_called()
+        self.assertEqual(results[0].num_rows, 3)
+        self.assertIn("df.groupby(['Sector']", code)
+
+class TestProfileAnswers(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            'Symbol': ['TCS', 'INFY', 'TCS', 'SBIN', None, 'TCS'],
+            'Last Price': [10.0, 20.0, 30.0, None, 50.0, 60.0],
+            'Volume': [1, 2, 3, 4, 5, 6],
+        })
+        self.dataset = DatasetStore().ingest('nse.csv', self.df.to_csv(index=False).encode())
+        self.answerer = LocalAnswerer(metrics=MetricsRecorder())
+    
+    def test_default_question_is_answered_from_the_profile(self):
+        results, response, code = self.answerer.answer(
+            self.dataset, "Can you calculate and display the mean of each numerical column?"
+        )
+        
+        table = results[0].table.to_pandas()
+        self.assertEqual(table['Column'].tolist(), ['Last Price', 'Volume'])
+        np.testing.assert_allclose(table['Mean'], self.df[['Last Price', 'Volume']].mean())
+        self.assertIn("agg(['mean'])", code)
+        self.assertEqual(self.answerer.metrics.counter('local_answers.hits', source='profile'), 1)
+    
+    def test_descriptive_intents(self):
+        matcher = ProfileQueryMatcher()
+        analysis = self.dataset['analysis']
+        
+        nulls = matcher.match("How many missing values per column?", analysis)
+        self.assertEqual((nulls.statistics, len(nulls.columns)), (['nulls'], 3))
+        top = matcher.match("What are the top 2 most common Symbol values?", analysis)
+        tables, _ = answer_from_profile(top, analysis, self.dataset['value_counts'], './nse.csv')
+        self.assertEqual(tables[0][1][['Value', 'Count']].values.tolist(), [['TCS', 3], ['INFY', 1]])
+        self.assertEqual(matcher.match("median and max of Volume", analysis).statistics, ['median', 'max'])
+        
+        for question in ["Plot the mean of each numerical column", "Mean Volume by Symbol",
+                         "What is the average Symbol?", "Which Symbol has the highest Volume?",
+                         "average Volume of TCS", "highest Last Price of INFY today",
+                         "maximum Volume for the last hour"]:
+            self.assertIsNone(matcher.match(question, analysis, self.dataset['value_counts']), question)
+        self.assertIsNone(self.answerer.answer(self.dataset, "Forecast Volume for next week"))
+        self.assertEqual(self.answerer.metrics.counter('local_answers.misses'), 1)
+
+class TestSQLEngine(unittest.TestCase):
+    def test_only_single_read_only_queries_run(self):
+        self.assertEqual(check_select("-- top sectors\nSELECT \"Set\", 'a;b' FROM nse;"), "SELECT \"Set\", 'a;b' FROM nse")
+        self.assertTrue(check_select("WITH t AS (SELECT 1) SELECT * FROM t").startswith("WITH"))
+        for sql in ["DROP TABLE nse", "SELECT 1; DELETE FROM nse", "SELECT * FROM read_csv('/etc/passwd')",
+                    "COPY nse TO 'out.csv'", "SELECT 1; SET threads = 1", "SELECT * FROM '/etc/passwd'",
+                    "SELECT * FROM 'config/../.env'", "SELECT * FROM duckdb_tables()",
+                    "SELECT * FROM nse JOIN '/etc/hosts' USING (x)"]:
+            with self.assertRaises(ValueError, msg=sql):
+                check_select(sql)
+    
+    @patch('src.core.llm_client.Together')
+    def test_sql_block_ignored_without_engine(self, mock_together):
+        create = mock_together.return_value.chat.completions.create
+        create.return_value = Mock(choices=[Mock(message=Mock(content="```sql\nSELECT 1\n```"))])
+        client = LLMClient(reporter=Reporter())
+        client.sql_engine = Mock(available=False)
+        client.code_executor = Mock(last_error=None)
+        options = {'together_api_key': 'key', 'model_name': 'model', 'race_mode': False}
+        
+        results, _, code = client.chat_with_llm(Mock(), 'q', './nse.csv', options=options, sql_tables=['fp'])
+        
+        self.assertIsNone(results)
+        self.assertNotIn("SQL engine", create.call_args[1]['messages'][0]['content'])
+        client.sql_engine.query.assert_not_called()
+    
+    @unittest.skipIf(duckdb is None, "duckdb is not installed")
+    @patch('src.core.llm_client.Together')
+    def test_relational_question_joins_uploads_on_the_host(self, mock_together):
+        engine = SQLEngine(threads=2, max_tables=4, max_databases=2)
+        tables = [engine.register('nse.csv', b"Symbol,Volume\nTCS,10\nINFY,5\nTCS,7\n", 'fp-nse'),
+                  engine.register('Sectors (1).csv', b"Symbol,Sector\nTCS,IT\nINFY,IT\n", 'fp-sectors')]
+        self.assertEqual(tables, ['nse', 'sectors_1'])
+        sql = ('SELECT s."Sector", SUM(n."Volume") AS "Volume" FROM nse n JOIN sectors_1 s USING ("Symbol") '
+               'GROUP BY 1')
+        create = mock_together.return_value.chat.completions.create
+        create.return_value = Mock(choices=[Mock(message=Mock(content=f"```sql\n{sql}\n```"))])
+        client = LLMClient(reporter=Reporter())
+        client.sql_engine = engine
+        client.code_executor = Mock()
+        options = {'together_api_key': 'key', 'model_name': 'model', 'race_mode': False}
+        
+        results, _, code = client.chat_with_llm(Mock(), 'Total volume per sector', './nse.csv', options=options,
+                                                sql_tables=['fp-nse', 'fp-sectors'])
+        
+        self.assertEqual(code, sql)
+        self.assertEqual(results[0].table.to_pylist(), [{'Sector': 'IT', 'Volume': 22}])
+        self.assertIn("sectors_1 (2 rows)", create.call_args[1]['messages'][0]['content'])
+        client.code_executor.execute_code.assert_not_called()
+        self.assertEqual(client.answer_language, 'sql')
+        
+        # Other sessions' uploads and host files are out of reach
+        engine.register('other.csv', b"Secret\n42\n", 'fp-other')
+        for sql in ['SELECT * FROM other', 'SELECT * FROM "upload_fp-other"']:
+            with self.assertRaises(Exception, msg=sql):
+                engine.query(sql, ['fp-nse'])
+        with self.assertRaises(Exception):
+            engine._database(['fp-nse'])['connection'].execute("SELECT * FROM read_csv_auto('config/settings.py')")
+
+class TestStratifiedSample(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        rows = 40000
+        self.df = pd.DataFrame({
+            'Sector': rng.choice(['IT', 'Bank', 'Pharma', 'Metal'], rows, p=[0.6, 0.3, 0.098, 0.002]),
+            'Last Price': rng.normal(100, 20, rows),
+            'Volume': rng.integers(1, 100, rows),
+        })
+        value_counts = {}
+        analysis = DataProcessor().analyze_dataframe(self.df, value_counts)
+        self.sample = StratifiedSample.from_frame(self.df, analysis, value_counts, sample_rows=4000, min_rows=10000)
+    
+    def test_sample_is_stratified_with_small_strata_kept(self):
+        sizes = self.sample.sample['Sector'].value_counts()
+        
+        self.assertEqual(self.sample.stratum, 'Sector')
+        self.assertAlmostEqual(sizes['IT'] / sizes['Bank'], 2.0, delta=0.1)
+        self.assertEqual(sizes['Metal'], min(30, (self.df['Sector'] == 'Metal').sum()))
+        self.assertIsNone(StratifiedSample.from_frame(self.df.head(100), {}, {}, min_rows=10000))
+    
+    def test_means_and_sums_get_bounds_covering_the_full_data(self):
+        sample = self.sample.sample
+        means = self.sample.annotate(sample.groupby('Sector')[['Last Price']].mean())
+        sums = self.sample.annotate(sample.groupby('Sector')['Volume'].sum().to_frame())
+        total = self.sample.annotate(pd.DataFrame({'Volume': [sample['Volume'].sum()]}))
+        
+        truth = self.df.groupby('Sector')[['Last Price', 'Volume']].agg(['mean', 'sum'])
+        for _, row in means.iterrows():
+            self.assertLess(abs(row['Last Price'] - truth.loc[row['Sector'], ('Last Price', 'mean')]),
+                            2 * row['Last Price ± 95%'])
+        for _, row in sums.iterrows():
+            self.assertLess(abs(row['Volume'] - truth.loc[row['Sector'], ('Volume', 'sum')]),
+                            2 * row['Volume ± 95%'] + 1)
+        self.assertLess(abs(total['Volume'][0] - self.df['Volume'].sum()), 2 * total['Volume ± 95%'][0])
+        self.assertIsNone(self.sample.annotate(sample.groupby('Sector')[['Last Price']].max()))
+    
+    @patch('src.core.llm_client.Together')
+    def test_preview_runs_on_the_sample_before_the_full_data(self, mock_together):
+        code = "import pandas as pd\ndf = pd.read_csv('./nse.csv')\ndf.groupby('Sector')['Last Price'].mean()"
+        create = mock_together.return_value.chat.completions.create
+        create.return_value = Mock(choices=[Mock(message=Mock(content=f"```python\n{code}\n```"))])
+        partials = {}
+        reporter = Reporter()
+        reporter.partial = partials.__setitem__
+        client = LLMClient(reporter=reporter)
+        preview = TableResult.from_frame('result', self.sample.sample.groupby('Sector')[['Last Price']].mean()
+                                         .reset_index())
+        client.preview_executor = Mock(last_error=None)
+        client.preview_executor.execute_code.return_value = ([preview], '')
+        client.code_executor = Mock(last_error=None, last_profile=None)
+        client.code_executor.execute_code.return_value = (['full'], '')
+        options = {'together_api_key': 'key', 'model_name': 'model', 'race_mode': False}
+        
+        results, _, _ = client.chat_with_llm(Mock(), 'q', './nse.csv', schema=['Sector', 'Last Price'],
+                                             options=options,
+                                             sample={'path': './nse.csv.sample.csv', 'sample': self.sample})
+        
+        self.assertEqual(results, ['full'])
+        self.assertIn("'./nse.csv.sample.csv'", client.preview_executor.execute_code.call_args[0][1])
+        self.assertIn("'./nse.csv'", client.code_executor.execute_code.call_args[0][1])
+        self.assertIn('Last Price ± 95%', partials['preview']['results'][0].column_names)
+    
+    def test_preview_only_swaps_the_dataset_path_itself(self):
+        code = ("import pandas as pd\ndf = pd.read_csv('./nse.csv')\n"
+                "bars = pd.read_parquet('./nse.csv.bars/1min.parquet')\nprint('./nse.csv')")
+        client = LLMClient(reporter=Reporter())
+        client.sample, client.dataset_path = {'path': './nse.csv.sample.csv', 'sample': self.sample}, './nse.csv'
+        client.preview_executor = Mock(last_error=None)
+        client.preview_executor.execute_code.return_value = (None, '')
+        
+        client._run_preview(Mock(), code)
+        
+        sample_code = client.preview_executor.execute_code.call_args[0][1]
+        self.assertIn("pd.read_csv('./nse.csv.sample.csv')", sample_code)
+        self.assertIn("'./nse.csv.bars/1min.parquet'", sample_code)
+        self.assertIn("print('./nse.csv.sample.csv')", sample_code)
+        self.assertEqual(client.preview_executor.execute_code.call_args[1]['timeout'],
+                         PROGRESSIVE_CONFIG['preview_timeout'])
+
+class TestCorrelationEngine(unittest.TestCase):
+    def setUp(self):
+        self.engine = CorrelationEngine(block_size=2, max_workers=2)
+        rng = np.random.default_rng(0)
+        self.df = pd.DataFrame(rng.normal(size=(200, 5)), columns=list('abcde'))
+        self.df['f'] = self.df['a'] * 3 + rng.normal(size=200) * 0.01
+        self.df.loc[::9, 'c'] = None
+        self.df['label'] = 'x'
+    
+    def test_blocked_matrix_matches_pandas(self):
+        expected = self.df.select_dtypes(include=['number']).corr()
+        result = self.engine.correlation_matrix(self.df)
+        np.testing.assert_allclose(result.values, expected.values, atol=1e-10)
+    
+    def test_top_pairs(self):
+        pairs = self.engine.top_pairs(self.df, k=3, method='spearman')
+        self.assertEqual(len(pairs), 3)
+        self.assertEqual({pairs.iloc[0]['Column A'], pairs.iloc[0]['Column B']}, {'a', 'f'})
+    
+    def test_clustered_matrix_limits_columns(self):
+        clustered = self.engine.clustered_matrix(self.df, max_columns=3)
+        self.assertEqual(clustered.shape, (3, 3))
+        self.assertIn('a', clustered.columns)
+
+class TestSessionKernel(unittest.TestCase):
+    def setUp(self):
+        self.dataset = {'fingerprint': 'v1', 'parent': None, 'offset': 0}
+        self.uploaded_file = Mock()
+        self.uploaded_file.name = 'nse.csv'
+        self.uploaded_file.getvalue.return_value = b"a,b\n1,2\n"
+    
+    @patch('src.core.session_kernel.Sandbox')
+    def test_dataset_is_loaded_once_per_version(self, mock_sandbox_cls):
+        sandbox = mock_sandbox_cls.return_value
+        sandbox.sandbox_id = 'sbx-1'
+        sandbox.run_code.return_value = Mock(error=None, logs=Mock(stdout=['{"df": "DataFrame 1 rows x 2 columns"}']))
+        kernel = SessionKernel('key')
+        file_handler = Mock()
+        file_handler.upload_to_sandbox.return_value = './nse.csv'
+        
+        kernel.load_dataset(file_handler, self.uploaded_file, self.dataset)
+        kernel.load_dataset(file_handler, self.uploaded_file, self.dataset)
+        
+        mock_sandbox_cls.assert_called_once()
+        loads = [call for call in sandbox.run_code.call_args_list if 'read_csv' in call[0][0]]
+        self.assertEqual(len(loads), 1)
+        self.assertEqual(kernel.prompt_context()['variables'], {'df': 'DataFrame 1 rows x 2 columns'})
+    
+    def test_session_prompt_lists_variables(self):
+        prompt = LLMClient()._session_prompt({'variables': {'by_sector': 'DataFrame 12 rows x 2 columns'}, 'history': []})
+        self.assertIn('`df`', prompt)
+        self.assertIn('by_sector: DataFrame 12 rows x 2 columns', prompt)
+
+class TestPreflightChecker(unittest.TestCase):
+    def setUp(self):
+        self.checker = PreflightChecker()
+        self.columns = ['Symbol', 'Last Price', 'P Change', 'Sector', 'Volume']
+    
+    def test_repairs_path_and_column_names(self):
+        code = "import pandas as pd\ndf = pd.read_csv('data.csv')\nprint(df.groupby('sector')['p_change'].mean())"
+        result = self.checker.check(code, './nse.csv', self.columns)
+        
+        self.assertTrue(result['ok'])
+        self.assertIn("pd.read_csv('./nse.csv')", result['code'])
+        self.assertIn("df.groupby('Sector')['P Change']", result['code'])
+        self.assertEqual(len(result['repairs']), 3)
+    
+    def test_unknown_column_is_reported(self):
+        code = "df = pd.read_csv('./nse.csv')\ndf['Ratio'] = 1\nprint(df['Ratio'], df['Market Share'])"
+        result = self.checker.check(code, './nse.csv', self.columns)
+        
+        self.assertFalse(result['ok'])
+        self.assertEqual(len(result['issues']), 1)
+        self.assertIn("'Market Share'", result['issues'][0])
+    
+    def test_only_wrong_dataset_names_are_repaired(self):
+        code = ("import pandas as pd\ndf = pd.read_csv('./NSE.csv')\nother = pd.read_csv('./sectors.csv')\n"
+                "bars = pd.read_csv('./nse.csv.bars_1min.csv')\nraw = pd.read_excel('./nse.xlsx')")
+        result = self.checker.check(code, './nse.csv', self.columns)
+        
+        self.assertIn("df = pd.read_csv('./nse.csv')", result['code'])
+        self.assertIn("pd.read_csv('./sectors.csv')", result['code'])
+        self.assertIn("pd.read_csv('./nse.csv.bars_1min.csv')", result['code'])
+        self.assertIn("pd.read_excel('./nse.xlsx')", result['code'])
+        self.assertEqual(len(result['repairs']), 1)
+    
+    def test_session_frame_keeps_columns_from_earlier_turns(self):
+        code = "print(df.groupby('Sector')['Return'].mean())"
+        self.assertFalse(self.checker.check(code, './nse.csv', self.columns)['ok'])
+        self.assertTrue(self.checker.check(code, './nse.csv', self.columns, session=True)['ok'])
+        reread = "df = pd.read_csv('./nse.csv')\nprint(df['Return'])"
+        self.assertFalse(self.checker.check(reread, './nse.csv', self.columns, session=True)['ok'])
+    
+    def test_syntax_errors(self):
+        self.assertTrue(self.checker.check("    x = 1\n    print(x)", './nse.csv')['ok'])
+        result = self.checker.check("print(x", './nse.csv')
+        self.assertFalse(result['ok'])
+        self.assertIn('SyntaxError', result['issues'][0])
+
+class TestLLMClientPreflight(unittest.TestCase):
+    @patch('src.core.llm_client.st')
+    @patch('src.core.llm_client.Together')
+    def test_unfixable_code_goes_back_to_llm(self, mock_together, mock_st):
+        mock_st.session_state.together_api_key = 'key'
+        mock_st.session_state.model_name = 'model'
+        mock_st.session_state.get.return_value = None
+        bad = Mock(choices=[Mock(message=Mock(content="```python\nprint(df['Nope'])\n```"))])
+        good = Mock(choices=[Mock(message=Mock(content="```python\nprint(df['Sector'])\n```"))])
+        create = mock_together.return_value.chat.completions.create
+        create.side_effect = [bad, good]
+        
+        client = LLMClient()
+        client.code_executor = Mock(last_error=None)
+        client.code_executor.execute_code.return_value = (['ok'], 'ok')
+        results, response, code = client.chat_with_llm(Mock(), 'q', './nse.csv', schema=['Sector'])
+        
+        self.assertEqual(create.call_count, 2)
+        self.assertEqual(code, "print(df['Sector'])")
+        client.code_executor.execute_code.assert_called_once()
+        feedback = create.call_args_list[1][1]['messages'][-1]['content']
+        self.assertIn("'Nope'", feedback)
+
+class TestModelRouter(unittest.TestCase):
+    def setUp(self):
+        self.router = ModelRouter(MetricsRecorder())
+    
+    def test_classify(self):
+        self.assertEqual(self.router.classify("How many rows are there?"), 'simple')
+        self.assertEqual(self.router.classify(
+            "Compare the volatility of each sector, then forecast the trend and explain outliers"), 'complex')
+        # Keywords only match whole words: 'minute', 'summary' and 'stop' are not aggregates
+        self.assertEqual(self.router.classify("Show the minimum price"), 'simple')
+        self.assertNotEqual(self.router.classify("Give a summary of each minute"), 'simple')
+        self.assertNotEqual(self.router.classify("Where did trading stop?"), 'simple')
+    
+    def test_route_escalates_to_larger_tiers(self):
+        complexity, chain = self.router.route("What is the average price?")
+        
+        self.assertEqual(complexity, 'simple')
+        self.assertEqual(chain[0], TOGETHER_MODELS["Qwen 2.5 7B"])
+        self.assertEqual(chain[-1], TOGETHER_MODELS["DeepSeek V3"])
+        self.assertEqual(len(chain), 3)
+    
+    def test_ranking_learns_from_metrics(self):
+        qwen, mixtral = TOGETHER_MODELS["Qwen 2.5 7B"], TOGETHER_MODELS["Mixtral 8x7B"]
+        for _ in range(3):
+            self.router.record_latency(qwen, 1.0)
+            self.router.record_outcome(qwen, False)
+            self.router.record_latency(mixtral, 2.0)
+            self.router.record_outcome(mixtral, True)
+        
+        self.assertEqual(self.router.ranked('fast'), [mixtral, qwen])
+        stats = {row['Model']: row for row in self.router.stats()}
+        self.assertEqual(stats["Qwen 2.5 7B"]['success_rate'], 0.0)
+        self.assertEqual(stats["Mixtral 8x7B"]['p50_latency'], 2.0)
+
+    @patch('src.core.llm_client.st')
+    @patch('src.core.llm_client.Together')
+    def test_client_escalates_when_code_missing(self, mock_together, mock_st):
+        mock_st.session_state.together_api_key = 'key'
+        mock_st.session_state.model_name = AUTO_MODEL_ID
+        mock_st.session_state.get.return_value = None
+        no_code = Mock(choices=[Mock(message=Mock(content="The answer is 3."))])
+        good = Mock(choices=[Mock(message=Mock(content="```python\nprint(len(df))\n```"))])
+        create = mock_together.return_value.chat.completions.create
+        create.side_effect = [no_code, good]
+        
+        client = LLMClient()
+        client.router = self.router
+        client.code_executor = Mock(last_error=None)
+        client.code_executor.execute_code.return_value = (['3'], '3')
+        results, response, code = client.chat_with_llm(Mock(), 'How many rows?', './nse.csv')
+        
+        self.assertEqual(code, "print(len(df))")
+        models = [call[1]['model'] for call in create.call_args_list]
+        self.assertEqual(models, [TOGETHER_MODELS["Qwen 2.5 7B"], TOGETHER_MODELS["Meta-Llama 3.3 70B"]])
+        self.assertEqual(self.router.model_stats(models[0])['success_rate'], 0.0)
+
+    @patch('src.core.llm_client.Together')
+    def test_session_does_not_escalate_after_code_ran(self, mock_together):
+        failing = Mock(choices=[Mock(message=Mock(content="```python\ndf['x'] = 1\nprint(df['y'])\n```"))])
+        create = mock_together.return_value.chat.completions.create
+        create.return_value = failing
+        client = LLMClient(reporter=Reporter())
+        client.router = self.router
+        client.code_executor = Mock(last_error='KeyError: y', last_profile=None)
+        client.code_executor.execute_code.return_value = (None, '')
+        options = {'together_api_key': 'key', 'model_name': AUTO_MODEL_ID, 'race_mode': False}
+        sandbox = Mock()
+        sandbox.list_code_contexts.return_value = [Mock(language='python')]
+        
+        client.chat_with_llm(sandbox, 'How many rows?', './nse.csv', options=options,
+                             session_context={'variables': {}, 'history': []})
+        self.assertEqual(create.call_count, 1)
+        
+        client.chat_with_llm(sandbox, 'How many rows?', './nse.csv', options=options)
+        self.assertEqual(create.call_count, 4)
+        self.assertEqual(sandbox.restart_code_context.call_count, 2)
+
+class TestModelRacing(unittest.TestCase):
+    @patch('src.core.llm_client.st')
+    @patch('src.core.llm_client.Together')
+    def test_first_runnable_answer_wins(self, mock_together, mock_st):
+        slow, fast = TOGETHER_MODELS["DeepSeek V3"], TOGETHER_MODELS["Qwen 2.5 7B"]
+        mock_st.session_state.together_api_key = 'key'
+        mock_st.session_state.model_name = slow
+        mock_st.session_state.get.side_effect = lambda key, default=None: {
+            'race_mode': True, 'race_models': ["Qwen 2.5 7B"]}.get(key, default)
+        release = threading.Event()
+        
+        def create(model, **kwargs):
+            if model == slow:
+                release.wait(5)
+            return Mock(choices=[Mock(message=Mock(content=f"```python\nprint('{model}')\n```"))],
+                        usage=Mock(total_tokens=100))
+        mock_together.return_value.chat.completions.create.side_effect = create
+        
+        client = LLMClient()
+        client.metrics = MetricsRecorder()
+        client.router = ModelRouter(client.metrics)
+        client.code_executor = Mock(last_error=None)
+        client.code_executor.execute_code.return_value = (['ok'], 'ok')
+        results, response, code = client.chat_with_llm(Mock(), 'q', './nse.csv')
+        
+        self.assertEqual(code, f"print('{fast}')")
+        client.code_executor.execute_code.assert_called_once()
+        race = ','.join(sorted([slow, fast]))
+        self.assertEqual(client.metrics.counter('race.wins', race=race, model=fast), 1)
+        
+        # The abandoned request still reports its tokens and the time saved
+        release.set()
+        for _ in range(50):
+            if client.metrics.counter('race.extra_tokens', race=race, model=slow):
+                break
+            time.sleep(0.02)
+        self.assertEqual(client.metrics.counter('race.extra_tokens', race=race, model=slow), 100)
+        self.assertEqual(client.metrics.summary('race.latency_saved', race=race)['count'], 1)
+
+    @patch('src.core.llm_client.Together')
+    def test_loser_finishing_during_execution_is_accounted(self, mock_together):
+        primary, fast = TOGETHER_MODELS["DeepSeek V3"], TOGETHER_MODELS["Qwen 2.5 7B"]
+        executing, primary_returned = threading.Event(), threading.Event()
+        
+        def create(model, **kwargs):
+            if model == primary:
+                executing.wait(5)
+                primary_returned.set()
+            return Mock(choices=[Mock(message=Mock(content=f"```python\nprint('{model}')\n```"))],
+                        usage=Mock(total_tokens=100))
+        mock_together.return_value.chat.completions.create.side_effect = create
+        
+        client = LLMClient(reporter=Reporter())
+        client.metrics = MetricsRecorder()
+        client.router = ModelRouter(client.metrics)
+        client.code_executor = Mock(last_error=None, last_profile=None)
+        
+        def execute_code(sandbox, code, profile=False):
+            # The primary's completion arrives while the winner's code runs
+            executing.set()
+            primary_returned.wait(5)
+            time.sleep(0.05)
+            return ['ok'], 'ok'
+        client.code_executor.execute_code.side_effect = execute_code
+        options = {'together_api_key': 'key', 'model_name': primary, 'race_mode': True,
+                   'race_models': ["Qwen 2.5 7B"]}
+        client.chat_with_llm(Mock(), 'q', './nse.csv', options=options)
+        
+        race = ','.join(sorted([primary, fast]))
+        self.assertEqual(client.metrics.counter('race.wins', race=race, model=fast), 1)
+        for _ in range(50):
+            if client.metrics.counter('race.extra_tokens', race=race, model=primary):
+                break
+            time.sleep(0.02)
+        self.assertEqual(client.metrics.counter('race.extra_tokens', race=race, model=primary), 100)
+        self.assertEqual(client.metrics.summary('race.latency_saved', race=race)['count'], 1)
+
+    def race_failing_first(self, session_context=None):
+        """Races two models whose first executed candidate fails; returns the client and the sandbox"""
+        first, second = TOGETHER_MODELS["Qwen 2.5 7B"], TOGETHER_MODELS["Meta-Llama 3.3 70B"]
+        first_ran = threading.Event()
+        
+        def create(model, **kwargs):
+            if model == second:
+                first_ran.wait(5)
+            return Mock(choices=[Mock(message=Mock(content=f"```python\nprint('{model}')\n```"))],
+                        usage=Mock(total_tokens=10))
+        
+        client = LLMClient(reporter=Reporter())
+        client.metrics = MetricsRecorder()
+        client.router = ModelRouter(client.metrics)
+        client.code_executor = Mock(last_error=None, last_profile=None)
+        
+        def execute_code(sandbox, code, profile=False):
+            client.code_executor.last_error = 'NameError' if first in code else None
+            first_ran.set()
+            return (None, '') if first in code else (['ok'], 'ok')
+        
+        client.code_executor.execute_code.side_effect = execute_code
+        sandbox = Mock()
+        sandbox.list_code_contexts.return_value = [Mock(language='python')]
+        options = {'together_api_key': 'key', 'model_name': first, 'race_mode': True,
+                   'race_models': ["Meta-Llama 3.3 70B"]}
+        with patch('src.core.llm_client.Together') as mock_together:
+            mock_together.return_value.chat.completions.create.side_effect = create
+            answer = client.chat_with_llm(sandbox, 'q', './nse.csv', options=options,
+                                          session_context=session_context)
+        return answer, client, sandbox
+    
+    def test_kernel_is_restarted_between_candidates(self):
+        (results, _, code), client, sandbox = self.race_failing_first()
+        
+        self.assertEqual(results, ['ok'])
+        self.assertEqual(client.code_executor.execute_code.call_count, 2)
+        sandbox.restart_code_context.assert_called_once()
+    
+    def test_session_race_runs_a_single_candidate(self):
+        (results, _, _), client, sandbox = self.race_failing_first(session_context={'variables': {}, 'history': []})
+        
+        self.assertIsNone(results)
+        client.code_executor.execute_code.assert_called_once()
+        sandbox.restart_code_context.assert_not_called()
+    
+    @patch('src.core.llm_client.Together')
+    def test_routed_models_keep_their_race_partners(self, mock_together):
+        client = LLMClient(reporter=Reporter())
+        client.router = ModelRouter(MetricsRecorder())
+        options = {'together_api_key': 'key', 'model_name': AUTO_MODEL_ID, 'race_mode': True,
+                   'race_models': ["Meta-Llama 3.3 70B"]}
+        
+        with patch.object(client, '_race', return_value=(None, "", "")) as race:
+            client.chat_with_llm(Mock(), 'How many rows?', './nse.csv', options=options)
+        
+        _, chain = client.router.route('How many rows?')
+        self.assertEqual(race.call_args.args[1], [chain[0], TOGETHER_MODELS["Meta-Llama 3.3 70B"]])
+
+class FakeProvider(BaseHTTPRequestHandler):
+    """Chat-completions endpoint; ``script`` is a list of (status, delay) for successive requests"""
+    script = []
+    lock = threading.Lock()
+    active = 0
+    max_active = 0
+    
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        cls = type(self)
+        with cls.lock:
+            status, delay = cls.script.pop(0) if cls.script else (200, 0)
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+        time.sleep(delay)
+        with cls.lock:
+            cls.active -= 1
+        body = json.dumps({'id': 'x', 'object': 'chat.completion', 'created': 0, 'model': 'm',
+                           'choices': [{'index': 0, 'finish_reason': 'stop',
+                                        'message': {'role': 'assistant', 'content': f'answer after {delay}'}}]}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Retry-After', '0')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, *args):
+        pass
+
+class TestRequestScheduler(unittest.TestCase):
+    def setUp(self):
+        FakeProvider.script, FakeProvider.active, FakeProvider.max_active = [], 0, 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeProvider)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        from together import Together
+        self.client = Together(api_key='key', base_url=f'http://127.0.0.1:{self.server.server_port}/v1',
+                               max_retries=0, timeout=5)
+        self.metrics = MetricsRecorder()
+    
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def call(self):
+        return self.client.chat.completions.create(model='m', messages=[{'role': 'user', 'content': 'q'}])
+    
+    def test_retries_rate_limits_and_server_errors(self):
+        FakeProvider.script = [(429, 0), (503, 0)]
+        scheduler = RequestScheduler(self.metrics, backoff_base=0.01)
+        
+        response = scheduler.submit('key', 'm', self.call)
+        
+        self.assertEqual(response.choices[0].message.content, 'answer after 0')
+        self.assertEqual(self.metrics.counter('scheduler.retries', model='m', status=429), 1)
+        self.assertEqual(self.metrics.counter('scheduler.retries', model='m', status=503), 1)
+    
+    def test_concurrency_cap_per_model(self):
+        FakeProvider.script = [(200, 0.1)] * 6
+        scheduler = RequestScheduler(self.metrics, max_per_model=2, rate_per_second=100, burst=10)
+        threads = [threading.Thread(target=scheduler.submit, args=('key', 'm', self.call)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(FakeProvider.max_active, 2)
+        self.assertEqual(self.metrics.summary('scheduler.wait', model='m')['count'], 6)
+        self.assertEqual(self.metrics.gauge('scheduler.queue_depth'), 0)
+    
+    def test_slow_request_is_hedged(self):
+        FakeProvider.script = [(200, 1.0), (200, 0)]
+        scheduler = RequestScheduler(self.metrics, hedge_min_samples=1)
+        self.metrics.observe('scheduler.latency', 0.05, model='m')
+        
+        started = time.monotonic()
+        response = scheduler.submit('key', 'm', self.call)
+        
+        self.assertLess(time.monotonic() - started, 0.9)
+        self.assertEqual(response.choices[0].message.content, 'answer after 0')
+        self.assertEqual(self.metrics.counter('scheduler.hedge_wins', model='m'), 1)
+    
+    def test_deadline_expires_in_queue(self):
+        FakeProvider.script = [(200, 0.5)]
+        scheduler = RequestScheduler(self.metrics, max_per_model=1)
+        slow = threading.Thread(target=scheduler.submit, args=('key', 'm', self.call))
+        slow.start()
+        time.sleep(0.05)
+        
+        with self.assertRaises(DeadlineExceeded):
+            scheduler.submit('key', 'm', self.call, timeout=0.1)
+        slow.join()
+        self.assertEqual(self.metrics.counter('scheduler.expired', model='m'), 1)
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.metrics = MetricsRecorder()
+        self.flight = SingleFlight(self.metrics)
+    
+    def test_key_normalizes_query(self):
+        self.assertEqual(coalescing_key('fp', 'm', '  Top 5   gainers? '), coalescing_key('fp', 'm', 'top 5 gainers'))
+        self.assertNotEqual(coalescing_key('fp', 'm', 'q'), coalescing_key('other', 'm', 'q'))
+    
+    def test_concurrent_callers_share_one_run(self):
+        started, release = threading.Event(), threading.Event()
+        calls = []
+        
+        def run(publish):
+            calls.append(1)
+            publish('uploading')
+            started.set()
+            release.wait(5)
+            publish('running')
+            return 'result'
+        
+        outputs = {}
+        updates = {name: [] for name in ('leader', 'follower')}
+        
+        def ask(name):
+            outputs[name] = self.flight.do('key', run, updates[name].append)
+        
+        leader = threading.Thread(target=ask, args=('leader',))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=ask, args=('follower',))
+        follower.start()
+        while not self.metrics.counter('singleflight.coalesced'):
+            time.sleep(0.01)
+        release.set()
+        leader.join()
+        follower.join()
+        
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(outputs, {'leader': 'result', 'follower': 'result'})
+        self.assertEqual(updates['follower'], ['uploading', 'running'])
+        self.assertFalse(self.flight.in_flight('key'))
+    
+    def test_errors_reach_every_caller(self):
+        release = threading.Event()
+        
+        def run(publish):
+            release.wait(5)
+            raise ValueError('boom')
+        
+        errors = []
+        
+        def ask():
+            try:
+                self.flight.do('key', run)
+            except ValueError as e:
+                errors.append(str(e))
+        
+        threads = [threading.Thread(target=ask) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        while self.metrics.counter('singleflight.coalesced') < 2:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(errors, ['boom'] * 3)
+        self.assertEqual(self.metrics.counter('singleflight.runs'), 1)
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.metrics = MetricsRecorder()
+        self.queue = JobQueue(max_workers=1, metrics=self.metrics)
+    
+    def wait_for(self, job_id, statuses=('completed', 'failed', 'cancelled')):
+        for _ in range(200):
+            job = self.queue.get(job_id)
+            if job['status'] in statuses:
+                return job
+            time.sleep(0.01)
+        self.fail(f"job {job_id} stuck in {job['status']}")
+    
+    def test_job_records_progress_and_result(self):
+        def run(job):
+            with job.stage('step one'):
+                job.partial('response', 'partial answer')
+            job.warning('careful')
+            return 42
+        
+        job = self.wait_for(self.queue.submit(run, description='q'))
+        
+        self.assertEqual(job['status'], 'completed')
+        self.assertEqual(job['result'], 42)
+        self.assertEqual(job['progress'], ['step one'])
+        self.assertEqual(job['partial'], {'response': 'partial answer'})
+        self.assertEqual(job['messages'], [('warning', 'careful')])
+        self.assertEqual(self.metrics.counter('jobs.completed'), 1)
+    
+    def test_cancel_running_and_pending_jobs(self):
+        started, killed = threading.Event(), threading.Event()
+        
+        def run(job):
+            job.on_cancel(killed.set)
+            started.set()
+            killed.wait(5)
+            job.progress('never recorded')
+        
+        running = self.queue.submit(run)
+        pending = self.queue.submit(lambda job: 'unused')
+        started.wait(5)
+        
+        self.assertTrue(self.queue.cancel(pending))
+        self.assertTrue(self.queue.cancel(running))
+        self.assertEqual(self.queue.get(pending)['status'], 'cancelled')
+        job = self.wait_for(running)
+        self.assertEqual(job['status'], 'cancelled')
+        self.assertEqual(job['progress'], [])
+        self.assertFalse(self.queue.cancel(running))
+    
+    def test_failures_are_stored(self):
+        def run(job):
+            raise ValueError('no sandbox')
+        
+        job = self.wait_for(self.queue.submit(run))
+        
+        self.assertEqual(job['status'], 'failed')
+        self.assertEqual(job['error'], 'no sandbox')
+
+class TestCoalescedCancel(unittest.TestCase):
+    def setUp(self):
+        self.queue = JobQueue(max_workers=2, metrics=MetricsRecorder())
+        self.flight = SingleFlight(MetricsRecorder())
+        self.sandbox = Mock()
+        self.started, self.release = threading.Event(), threading.Event()
+        test = self
+        
+        class FakeClient:
+            def __init__(self, reporter):
+                self.reporter = reporter
+            
+            def chat_with_llm(self, *args, **kwargs):
+                test.started.set()
+                test.release.wait(5)
+                self.reporter.partial('preview', 'approximate answer')
+                self.reporter.error('No Python code block detected')
+                self.reporter.partial('response', 'answer')
+                return ['ok'], 'answer', 'code'
+        
+        pool = Mock()
+        pool.lease.return_value.__enter__ = Mock(return_value=self.sandbox)
+        pool.lease.return_value.__exit__ = Mock(return_value=False)
+        self.client = patch('src.core.analysis_pipeline.LLMClient', FakeClient)
+        self.client.start()
+        self.addCleanup(self.client.stop)
+        self.dataset = {'fingerprint': 'fp', 'df': pd.DataFrame({'a': [1]})}
+        self.job = lambda: analysis_job(Mock(), self.dataset, 'q', {'model_name': 'm', 'race_mode': False}, 'key',
+                                        file_handler=Mock(), sandbox_pool=pool, single_flight=self.flight,
+                                        answer_locally=False)
+    
+    def wait_for(self, job_id):
+        for _ in range(300):
+            job = self.queue.get(job_id)
+            if job['status'] not in ('pending', 'running'):
+                return job
+            time.sleep(0.01)
+        self.fail(f"job {job_id} stuck in {job['status']}")
+    
+    def test_followers_receive_the_leaders_updates(self):
+        leader = self.queue.submit(self.job())
+        self.started.wait(5)
+        follower = self.queue.submit(self.job())
+        while not self.flight.metrics.counter('singleflight.coalesced'):
+            time.sleep(0.01)
+        
+        self.release.set()
+        
+        for job in (self.wait_for(leader), self.wait_for(follower)):
+            self.assertEqual(job['partial']['preview'], 'approximate answer')
+            self.assertIn(('error', 'No Python code block detected'), job['messages'])
+            self.assertIn("📤 Uploading dataset to the sandbox...", job['progress'])
+    
+    def test_cancelled_leader_hands_the_run_to_its_followers(self):
+        leader = self.queue.submit(self.job())
+        self.started.wait(5)
+        follower = self.queue.submit(self.job())
+        while not self.flight.metrics.counter('singleflight.coalesced'):
+            time.sleep(0.01)
+        
+        self.queue.cancel(leader)
+        self.release.set()
+        
+        self.assertEqual(self.wait_for(follower)['result'], (['ok'], 'answer', 'code'))
+        self.assertEqual(self.wait_for(leader)['status'], 'cancelled')
+        self.sandbox.kill.assert_not_called()
+    
+    def test_cancelled_leader_without_followers_stops_the_sandbox(self):
+        leader = self.queue.submit(self.job())
+        self.started.wait(5)
+        
+        self.queue.cancel(leader)
+        self.release.set()
+        
+        self.assertEqual(self.wait_for(leader)['status'], 'cancelled')
+        self.sandbox.kill.assert_called_once()
+
+def sdk_sandbox() -> Mock:
+    """A Mock with the SDK's ``Sandbox`` attributes whose kernel calls are checked against the real signatures"""
+    sandbox = Mock(spec=Sandbox)
+    for name in ('is_running', 'list_code_contexts', 'restart_code_context'):
+        signature = inspect.signature(getattr(Sandbox, name))
+        getattr(sandbox, name).side_effect = (
+            lambda *args, signature=signature, **kwargs: (signature.bind(None, *args, **kwargs), DEFAULT)[1]
+        )
+    return sandbox
+
+
+class TestSandboxPool(unittest.TestCase):
+    def test_sandboxes_are_reused_with_fresh_kernels(self):
+        started = []
+        
+        def factory(api_key):
+            sandbox = sdk_sandbox()
+            sandbox.is_running.return_value = True
+            sandbox.list_code_contexts.return_value = [Mock(language='python')]
+            started.append(sandbox)
+            return sandbox
+        
+        pool = SandboxPool(factory, MetricsRecorder())
+        with pool.lease('key') as first:
+            pass
+        with pool.lease('key') as second:
+            pass
+        
+        self.assertIs(first, second)
+        self.assertEqual(len(started), 1)
+        self.assertEqual(first.restart_code_context.call_count, 2)
+        first.kill.assert_not_called()
+    
+    def test_failed_lease_discards_sandbox(self):
+        pool = SandboxPool(lambda api_key: sdk_sandbox(), MetricsRecorder())
+        with self.assertRaises(RuntimeError):
+            with pool.lease('key') as sandbox:
+                raise RuntimeError('kernel died')
+        
+        sandbox.kill.assert_called_once()
+        with pool.lease('key') as replacement:
+            self.assertIsNot(replacement, sandbox)
+
+
+class TestSandboxProfiling(unittest.TestCase):
+    def test_generated_code_runs_between_profiler_cells(self):
+        sandbox = Mock()
+        report = Mock(error=None)
+        report.logs.stdout = ["   ncalls  tottime  cumtime\n"]
+        sandbox.run_code.side_effect = [Mock(error=None), Mock(error=None), Mock(error=None),
+                                        Mock(error=None, results=[]), report]
+        executor = CodeExecutor(reporter=Reporter())
+        
+        executor.execute_code(sandbox, "print(1)", profile=True)
+        
+        cells = [call.args[0] for call in sandbox.run_code.call_args_list]
+        self.assertIn("RLIMIT_AS", cells[0])
+        self.assertNotIn("RLIMIT_AS", cells[1])
+        self.assertIn("_dbg_profiler.enable()", cells[2])
+        self.assertEqual(cells[3], "print(1)")
+        self.assertIn("_dbg_profiler.disable()", cells[4])
+        self.assertIn("ncalls", executor.last_profile)
+        self.assertIsNone(executor.last_error)
+    
+    def test_profiler_is_stopped_when_the_code_fails(self):
+        sandbox = Mock()
+        sandbox.run_code.side_effect = [Mock(error=None), Mock(error=None), Mock(error=None), ConnectionError('lost'),
+                                        Mock(error=None)]
+        executor = CodeExecutor(reporter=Reporter())
+        
+        executor.execute_code(sandbox, "print(1)", profile=True)
+        
+        self.assertEqual(executor.last_error, 'lost')
+        self.assertIn("_dbg_profiler.disable()", sandbox.run_code.call_args_list[4].args[0])
+
+
+class TestExecutionBudgets(unittest.TestCase):
+    def setUp(self):
+        self.metrics = MetricsRecorder()
+        self.executor = CodeExecutor(reporter=Reporter())
+        self.executor.metrics = self.metrics
+    
+    def streaming_sandbox(self, lines, results=()):
+        sandbox = Mock()
+        
+        def run_code(code, on_stdout=None, on_stderr=None, timeout=None):
+            if on_stdout is not None:
+                for line in lines:
+                    on_stdout(Mock(line=line))
+                return Mock(error=None, results=list(results))
+            return Mock(error=None)
+        
+        sandbox.run_code.side_effect = run_code
+        return sandbox
+    
+    def test_stdout_is_streamed_and_capped(self):
+        sandbox = self.streaming_sandbox(["x" * 1000 + "\n"] * 200)
+        with patch.dict('src.core.code_executor.EXECUTION_BUDGET_CONFIG', max_stdout_bytes=5000):
+            results, stdout = self.executor.execute_code(sandbox, "while True: print('x' * 1000)")
+        
+        self.assertLess(len(stdout), 5100)
+        self.assertIn("output truncated: 195,200 more bytes", stdout)
+        self.assertEqual(self.metrics.counter('execution.budget_exceeded', budget='stdout'), 1)
+    
+    def test_timeout_restarts_kernel(self):
+        from e2b_code_interpreter import TimeoutException
+        sandbox = Mock()
+        sandbox.list_code_contexts.return_value = [Mock(language='python'), Mock(language='r')]
+        
+        def run_code(code, on_stdout=None, on_stderr=None, timeout=None):
+            if on_stdout is not None:
+                raise TimeoutException('timed out')
+            return Mock(error=None)
+        
+        sandbox.run_code.side_effect = run_code
+        
+        results, _ = self.executor.execute_code(sandbox, "while True: pass")
+        
+        self.assertIsNone(results)
+        self.assertTrue(self.executor.last_error.startswith("TimeoutError"))
+        sandbox.restart_code_context.assert_called_once_with(sandbox.list_code_contexts.return_value[0])
+        self.assertEqual(self.metrics.counter('execution.budget_exceeded', budget='timeout'), 1)
+    
+    def test_artifact_budgets(self):
+        small = Mock(png='a' * 10)
+        small.formats.return_value = ['png']
+        huge = Mock(html='<div>' * 100)
+        huge.formats.return_value = ['html']
+        sandbox = self.streaming_sandbox([], results=[small, huge, small, small])
+        with patch.dict('src.core.code_executor.EXECUTION_BUDGET_CONFIG', max_artifacts=2, max_artifact_bytes=100):
+            results, _ = self.executor.execute_code(sandbox, "plots()")
+        
+        self.assertEqual(results, [small, small])
+        self.assertEqual(self.metrics.counter('execution.budget_exceeded', budget='artifact_size'), 1)
+        self.assertEqual(self.metrics.counter('execution.budget_exceeded', budget='artifacts'), 1)
+    
+    def test_preview_runs_count_under_their_own_names(self):
+        preview = CodeExecutor(reporter=Reporter(), metric_prefix='preview.')
+        preview.metrics = self.metrics
+        sandbox = self.streaming_sandbox(["x\n"])
+        
+        preview.execute_code(sandbox, "print('x')", timeout=5)
+        
+        self.assertEqual(self.metrics.counter('preview.execution.succeeded'), 1)
+        self.assertEqual(self.metrics.counter('execution.succeeded'), 0)
+        self.assertEqual(sandbox.run_code.call_args_list[2].kwargs['timeout'], 5)
+
+
+class LocalKernel:
+    """Runs cells in-process, close enough to the E2B kernel for the helper cells"""
+    
+    def __init__(self):
+        self.namespace = {}
+        self.files = Mock()
+        self.files.read.side_effect = lambda path, format: open(path, 'rb').read()
+    
+    def run_code(self, code, on_stdout=None, on_stderr=None, timeout=None):
+        tree = ast.parse(code)
+        last = tree.body.pop() if tree.body and isinstance(tree.body[-1], ast.Expr) else None
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            exec(compile(tree, '<cell>', 'exec'), self.namespace)
+            value = eval(compile(ast.Expression(last.value), '<cell>', 'eval'), self.namespace) if last else None
+        results = []
+        if value is not None:
+            self.namespace['_'] = value
+            results.append(Result(html=value.to_html() if hasattr(value, 'to_html') else None, text=repr(value),
+                                  is_main_result=True))
+        if on_stdout is not None and stdout.getvalue():
+            on_stdout(Mock(line=stdout.getvalue()))
+        return Mock(error=None, results=results, logs=Mock(stdout=[stdout.getvalue()]))
+
+
+class TestTableTransport(unittest.TestCase):
+    def setUp(self):
+        self.kernel = LocalKernel()
+        self.kernel.run_code("import pandas as pd")
+        self.executor = CodeExecutor(reporter=Reporter())
+        self.budget = patch.dict('src.core.code_executor.EXECUTION_BUDGET_CONFIG', memory_limit_mb=2 ** 40)
+        self.budget.start()
+    
+    def tearDown(self):
+        self.budget.stop()
+    
+    def test_memory_limit_failure_does_not_skip_the_helpers(self):
+        with patch.dict('sys.modules', resource=None):
+            self.kernel.run_code(memory_limit_cell())
+        self.executor.execute_code(self.kernel, "x = 1")
+        
+        self.assertIn('publish_table', self.kernel.namespace)
+        self.assertNotIn('_budget_limit_memory', self.kernel.namespace)
+    
+    def test_final_dataframe_arrives_as_arrow(self):
+        results, _ = self.executor.execute_code(
+            self.kernel, "df = pd.DataFrame({'Symbol': ['A', 'B', 'C'], 'Price': [1.5, 2.5, 3.5]})\ndf"
+        )
+        
+        self.assertEqual(len(results), 1)
+        table = results[0]
+        self.assertIsInstance(table, TableResult)
+        self.assertEqual(table.column_names, ['Symbol', 'Price'])
+        self.assertEqual(table.page(1, 2).to_pylist(), [{'Symbol': 'C', 'Price': 3.5}])
+        self.assertTrue(table.to_csv().startswith(b'"Symbol","Price"'))
+    
+    def test_published_tables_and_stale_results(self):
+        self.executor.execute_code(self.kernel, "pd.DataFrame({'a': [1]})")
+        results, _ = self.executor.execute_code(
+            self.kernel, "publish_table(pd.DataFrame({'b': [2]}), 'first')\nx = 1"
+        )
+        
+        # The earlier cell's DataFrame is not sent again
+        self.assertEqual([table.name for table in results], ['first'])
+    
+    def test_chart_reports_reach_metrics(self):
+        before = self.executor.metrics.counter('viz.charts', kind='timeseries')
+        self.executor.execute_code(
+            self.kernel, "df = pd.DataFrame({'t': range(20000), 'v': [i % 97 for i in range(20000)]})\n"
+                         "fig = plot_timeseries(df, 't', 'v', max_points=300)"
+        )
+        
+        self.assertEqual(self.executor.metrics.counter('viz.charts', kind='timeseries'), before + 1)
+        self.assertGreater(self.executor.metrics.counter('viz.payload_bytes', stage='before'),
+                           self.executor.metrics.counter('viz.payload_bytes', stage='after'))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
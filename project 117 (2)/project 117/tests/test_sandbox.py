@@ -0,0 +1,65 @@
+import unittest
+import numpy as np
+import pandas as pd
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.sandbox_helpers import SANDBOX_HELPER_SOURCES
+
+
+def load_helpers(name: str) -> dict:
+    """Execute a kernel-side helper module the way the sandbox does"""
+    namespace = {}
+    exec(compile(SANDBOX_HELPER_SOURCES[name], f"<{name}>", 'exec'), namespace)
+    return namespace
+
+
+class TestVizHelpers(unittest.TestCase):
+    def setUp(self):
+        self.viz = load_helpers('viz_helpers')
+        self.viz['_configure_viz'](max_points=500, webgl_threshold=1000, density_threshold=20000,
+                                   raster_size=(120, 80))
+        rng = np.random.default_rng(0)
+        self.df = pd.DataFrame({
+            'Timestamp': pd.date_range('2024-01-01 09:15', periods=50000, freq='s'),
+            'Close': 100 + rng.standard_normal(50000).cumsum(),
+            'Volume': rng.integers(1, 1000, 50000),
+        })
+
+    def test_downsampling_keeps_endpoints_and_spikes(self):
+        y = np.zeros(10000)
+        y[4321] = 50.0
+        x = np.arange(len(y))
+
+        lttb = self.viz['lttb_downsample'](x, y, 100)
+        minmax = self.viz['minmax_downsample'](x, y, 100)
+
+        self.assertEqual(len(lttb), 100)
+        self.assertEqual((lttb[0], lttb[-1]), (0, 9999))
+        self.assertIn(4321, lttb)
+        self.assertIn(4321, minmax)
+        self.assertLessEqual(len(minmax), 100)
+
+        noisy = np.random.default_rng(0).normal(size=20000)
+        self.assertLessEqual(len(self.viz['minmax_downsample'](np.arange(20000), noisy, 2000)), 2000)
+
+    def test_chart_kind_follows_size(self):
+        line = self.viz['plot_timeseries'](self.df, 'Timestamp', 'Close')
+        scatter = self.viz['plot_scatter'](self.df.head(5000), 'Close', 'Volume')
+        shaded = self.viz['plot_scatter'](self.df, 'Close', 'Volume')
+
+        self.assertLessEqual(len(line.data[0].x), 500)
+        self.assertEqual(line.data[0].type, 'scatter')
+        self.assertEqual(scatter.data[0].type, 'scattergl')
+        self.assertEqual(shaded.data[0].type, 'image')
+
+        reports = self.viz['_collect_chart_reports']()
+        self.assertEqual([report['kind'] for report in reports], ['timeseries', 'scatter', 'datashade'])
+        for report in (reports[0], reports[2]):
+            self.assertLess(report['payload_after_bytes'], report['payload_before_bytes'] / 10)
+        self.assertEqual(self.viz['_collect_chart_reports'](), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
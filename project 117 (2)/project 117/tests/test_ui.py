@@ -1,12 +1,16 @@
+import base64
+import io
 import unittest
 from unittest.mock import Mock, patch
 import pandas as pd
+from PIL import Image
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.ui.components import display_data_summary
-from src.ui.output_handler import OutputHandler
+from src.ui.output_handler import OutputHandler, image_dimensions
+from src.ui.data_viewer import DataPager
 
 class TestUIComponents(unittest.TestCase):
     def setUp(self):
@@ -73,5 +77,104 @@ class TestOutputHandler(unittest.TestCase):
             
             self.assertTrue(test_passed)
 
+class TestAnalysisMemoization(unittest.TestCase):
+    def setUp(self):
+        self.handler = OutputHandler()
+        self.df = pd.DataFrame({
+            'A': [1, 2, None, 4, 5],
+            'B': [2, 4, 6, 8, 10]
+        })
+    
+    def test_views_are_computed_once_per_fingerprint(self):
+        with patch('streamlit.radio', return_value="Missing Data"), \
+             patch('streamlit.subheader'), \
+             patch('streamlit.dataframe'), \
+             patch('streamlit.plotly_chart') as mock_chart:
+            self.handler.display_dataframe_analysis(self.df, fingerprint='fp-memo')
+            with patch.object(self.df, 'isnull', side_effect=AssertionError("recomputed")):
+                self.handler.display_dataframe_analysis(self.df, fingerprint='fp-memo')
+            
+            self.assertEqual(mock_chart.call_count, 2)
+            self.assertIs(mock_chart.call_args_list[0][0][0], mock_chart.call_args_list[1][0][0])
+            self.assertIsInstance(mock_chart.call_args_list[0][0][0], dict)
+
+class TestDataPager(unittest.TestCase):
+    def setUp(self):
+        self.pager = DataPager()
+        self.df = pd.DataFrame({
+            'Symbol': ['TCS', 'INFY', 'WIPRO', 'TCS', 'HDFC'],
+            'Price': [30.0, 10.0, None, 20.0, 40.0]
+        })
+    
+    def test_get_page_slices_and_projects(self):
+        page, total = self.pager.get_page(self.df, 'fp', 1, 2, columns=['Price'])
+        
+        self.assertEqual(total, 5)
+        self.assertEqual(list(page.columns), ['Price'])
+        self.assertEqual(page['Price'].tolist()[1], 20.0)
+        self.assertEqual(len(page), 2)
+    
+    def test_sort_and_filter_are_pushed_down(self):
+        page, total = self.pager.get_page(self.df, 'fp', 0, 10, sort_by='Price', ascending=False)
+        self.assertEqual(page['Symbol'].tolist(), ['HDFC', 'TCS', 'TCS', 'INFY', 'WIPRO'])
+        
+        page, total = self.pager.get_page(self.df, 'fp', 0, 10, filter_column='Price', filter_value='>= 20')
+        self.assertEqual(total, 3)
+        
+        page, total = self.pager.get_page(self.df, 'fp', 0, 10, filter_column='Symbol', filter_value='tc')
+        self.assertEqual(page['Price'].tolist(), [30.0, 20.0])
+    
+    def test_malformed_numbers_fall_back_to_substring_match(self):
+        for value in ('> 1.2.3', '>= .'):
+            page, total = self.pager.get_page(self.df, 'fp', 0, 10, filter_column='Price', filter_value=value)
+            self.assertEqual(total, 0)
+        
+        page, total = self.pager.get_page(self.df, 'fp', 0, 10, filter_column='Price', filter_value='< .5e2')
+        self.assertEqual(total, 4)
+    
+    def test_mixed_type_columns_sort_by_their_text(self):
+        df = pd.DataFrame({'Code': ['b', 2, 'a', 10]})
+        
+        page, total = self.pager.get_page(df, 'mixed', 0, 10, sort_by='Code')
+        
+        self.assertEqual(page['Code'].tolist(), [10, 2, 'a', 'b'])
+    
+    def test_recent_pages_are_cached(self):
+        first, _ = self.pager.get_page(self.df, 'fp', 0, 2)
+        second, _ = self.pager.get_page(self.df, 'fp', 0, 2)
+        self.assertIs(first, second)
+
+
+class TestOutputRendering(unittest.TestCase):
+    def setUp(self):
+        self.handler = OutputHandler()
+    
+    def encoded_png(self, width, height):
+        buffer = io.BytesIO()
+        Image.new('RGB', (width, height), 'red').save(buffer, 'PNG')
+        return base64.b64encode(buffer.getvalue()).decode()
+    
+    def test_images_within_display_width_pass_through(self):
+        encoded = self.encoded_png(300, 200)
+        with patch('PIL.Image.open') as mock_open:
+            image_data, output_format = self.handler._prepare_image(encoded, 'png')
+        
+        mock_open.assert_not_called()
+        self.assertEqual(image_data, base64.b64decode(encoded))
+        self.assertEqual(output_format, 'PNG')
+    
+    def test_wide_images_are_downscaled(self):
+        image_data, _ = self.handler._prepare_image(self.encoded_png(2920, 1000), 'png')
+        self.assertEqual(image_dimensions(image_data), (1460, 500))
+    
+    def test_identical_outputs_are_shown_once(self):
+        chart = Mock(png=None, jpeg=None, svg=None, html="<b>chart</b>", markdown=None, json=None, text=None,
+                     extra=None)
+        with patch('streamlit.html') as mock_html, patch('streamlit.text') as mock_text:
+            self.handler._process_results([chart, "total: 3", chart, "total: 3"])
+        
+        self.assertEqual(mock_html.call_count, 1)
+        self.assertEqual(mock_text.call_count, 1)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
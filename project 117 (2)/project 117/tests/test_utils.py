@@ -1,3 +1,8 @@
+import json
+import logging
+import tempfile
+import time
+import tracemalloc
 import unittest
 import pandas as pd
 from unittest.mock import Mock, patch, MagicMock
@@ -8,6 +13,11 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from src.utils.file_handler import FileHandler
 from src.utils.code_parser import CodeParser
 from src.utils.validators import Validators
+from src.utils.metrics import MetricsRecorder
+from src.utils.code_optimizer import CodeOptimizer
+from src.utils.profiler import RequestProfiler, profiled_job
+from src.utils.structured_logging import (JsonFormatter, DebugSampler, TraceContextFilter,
+                                          SizeAndTimeRotatingFileHandler, new_trace, trace_stage, stage_timings)
 
 class TestFileHandler(unittest.TestCase):
     def setUp(self):
@@ -58,6 +68,12 @@ class TestCodeParserAdvanced(unittest.TestCase):
         self.assertEqual(code_blocks[0].strip(), 'x = 1')
         self.assertEqual(code_blocks[1].strip(), 'y = 2')
     
+    def test_match_sql_blocks(self):
+        text = "Joined the files:\n```sql\nSELECT * FROM nse\n```\n"
+        
+        self.assertEqual(self.parser.match_sql_blocks(text), "SELECT * FROM nse")
+        self.assertEqual(self.parser.match_sql_blocks("```python\nx = 1\n```"), "")
+    
     def test_no_code_blocks(self):
         text = "This is just regular text with no code blocks."
         code_blocks = self.parser.extract_all_code_blocks(text)
@@ -88,5 +104,179 @@ class TestValidatorsAdvanced(unittest.TestCase):
         self.assertTrue(result['is_valid'])
         self.assertTrue(any('unsafe' in warning.lower() for warning in result['warnings']))
 
+class TestMetricsRecorder(unittest.TestCase):
+    def test_counters_ratios_and_summaries(self):
+        metrics = MetricsRecorder()
+        self.assertIsNone(metrics.ratio('execution.failed', 'questions.answered'))
+        
+        metrics.increment('execution.failed')
+        metrics.increment('questions.answered', 2)
+        for value in [1.0, 2.0, 3.0, 4.0]:
+            metrics.observe('llm.latency', value, model='m')
+        
+        self.assertEqual(metrics.ratio('execution.failed', 'questions.answered'), 0.5)
+        summary = metrics.summary('llm.latency', model='m')
+        self.assertEqual(summary['count'], 4)
+        self.assertEqual(summary['mean'], 2.5)
+        self.assertEqual(metrics.summary('llm.latency')['count'], 0)
+
+class TestCodeOptimizer(unittest.TestCase):
+    def setUp(self):
+        self.optimizer = CodeOptimizer()
+    
+    def test_row_apply_vectorized(self):
+        code = "df['c'] = df.apply(lambda row: row['a'] * 2 + row['b'], axis=1)  # keep\n"
+        optimized, rewrites, warnings = self.optimizer.optimize(code)
+        
+        self.assertIn("df['c'] = (df['a'] * 2 + df['b'])  # keep", optimized)
+        self.assertEqual(len(rewrites), 1)
+        
+        df = pd.DataFrame({'a': [1, 2], 'b': [3, 4]})
+        namespace = {'df': df}
+        exec(optimized, namespace)
+        self.assertEqual(df['c'].tolist(), [5, 8])
+    
+    def test_append_loop_becomes_single_concat(self):
+        code = ("import pandas as pd\nout = pd.DataFrame()\nfor i in range(3):\n"
+                "    out = out.append({'i': i}, ignore_index=True)\n")
+        optimized, rewrites, _ = self.optimizer.optimize(code)
+        
+        self.assertNotIn('.append({', optimized)
+        namespace = {}
+        exec(optimized, namespace)
+        self.assertEqual(namespace['out']['i'].tolist(), [0, 1, 2])
+    
+    def test_append_in_while_loop_keeps_its_condition_working(self):
+        code = ("import pandas as pd\nout = pd.DataFrame()\nwhile len(out) < 3:\n"
+                "    out = out.append({'i': len(out)}, ignore_index=True)\n")
+        optimized, _, _ = self.optimizer.optimize(code)
+        
+        self.assertNotIn('_opt_out_parts', optimized)
+        namespace = {}
+        exec(optimized, namespace)
+        self.assertEqual(namespace['out']['i'].tolist(), [0, 1, 2])
+    
+    def test_unsafe_cases_flagged_not_rewritten(self):
+        code = ("for idx, row in df.iterrows():\n    pass\n"
+                "df.apply(lambda row: str(row['a']), axis=1)\nresults = []\nresults.append(1)\n")
+        optimized, rewrites, warnings = self.optimizer.optimize(code)
+        
+        self.assertEqual(optimized, code)
+        self.assertEqual(rewrites, [])
+        self.assertEqual(len(warnings), 2)
+    
+    def test_repeated_reads_and_webgl(self):
+        code = ("a = pd.read_csv('data.csv')\nb = pd.read_csv('data.csv')\n"
+                "fig = px.scatter(a, x='x', y='y')\n")
+        optimized, rewrites, _ = self.optimizer.optimize(code)
+        
+        self.assertEqual(optimized.count("_opt_cached_read('read_csv', 'data.csv')"), 2)
+        self.assertIn("render_mode='webgl'", optimized)
+    
+    def test_benchmark_reports_speedup(self):
+        report = {row['pattern']: row for row in self.optimizer.benchmark(rows=20000)}
+        
+        self.assertTrue(all(row['same_result'] for row in report.values()))
+        self.assertGreater(report['row-wise apply']['speedup'], 1)
+
+
+class TestStructuredLogging(unittest.TestCase):
+    def record(self, msg, level=logging.INFO, **extra):
+        record = logging.LogRecord('test', level, __file__, 1, msg, None, None)
+        record.__dict__.update(extra)
+        return record
+
+    def test_json_records_carry_trace_and_stage_timings(self):
+        records = []
+        logger = logging.getLogger('test.structured')
+        logger.setLevel(logging.INFO)
+        handler = logging.Handler()
+        handler.emit = records.append
+        handler.addFilter(TraceContextFilter())
+        logger.addHandler(handler)
+        try:
+            with new_trace('abc123'):
+                with trace_stage('upload', logger):
+                    pass
+                timings = stage_timings()
+        finally:
+            logger.removeHandler(handler)
+
+        entry = json.loads(JsonFormatter().format(records[0]))
+        self.assertEqual(entry['trace_id'], 'abc123')
+        self.assertEqual(entry['stage'], 'upload')
+        self.assertIn('duration_ms', entry)
+        self.assertEqual(list(timings), ['upload'])
+
+    def test_debug_records_are_sampled(self):
+        sampler = DebugSampler(every=10)
+        kept = [sampler.filter(self.record('tick', logging.DEBUG)) for _ in range(100)]
+        self.assertEqual(sum(kept), 10)
+        self.assertTrue(all(sampler.filter(self.record('warn', logging.WARNING)) for _ in range(5)))
+
+    def test_debug_sampling_is_per_call_site(self):
+        sampler = DebugSampler(every=10, max_sites=3)
+        kept = [sampler.filter(self.record(f'tick {i}', logging.DEBUG)) for i in range(100)]
+        self.assertEqual(sum(kept), 10)
+        for line in range(10):
+            record = self.record('elsewhere', logging.DEBUG)
+            record.lineno = 100 + line
+            sampler.filter(record)
+        self.assertLessEqual(len(sampler._counts), 3)
+
+    def test_rotates_on_size(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'app.log')
+            handler = SizeAndTimeRotatingFileHandler(path, max_bytes=200, when='midnight', backupCount=3)
+            handler.setFormatter(JsonFormatter())
+            for i in range(20):
+                handler.emit(self.record(f"message {i}"))
+            handler.close()
+            files = os.listdir(directory)
+            self.assertEqual(len(files), 4)
+            self.assertTrue(all(os.path.getsize(os.path.join(directory, name)) <= 200 for name in files))
+
+
+class TestRequestProfiler(unittest.TestCase):
+    def busy(self):
+        rows = [list(range(200)) for _ in range(2000)]
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            sum(sum(row) for row in rows[:50])
+        return rows
+
+    def test_stage_records_time_memory_and_stacks(self):
+        profiler = RequestProfiler()
+        with profiler.stage('ingestion'):
+            rows = self.busy()
+        
+        report = profiler.report()
+        stage = report['stages'][0]
+        self.assertEqual(stage['stage'], 'ingestion')
+        self.assertGreater(stage['duration_ms'], 40)
+        self.assertGreater(stage['peak_kb'], 1000)
+        self.assertTrue(stage['top_allocations'])
+        self.assertIn('busy', report['cprofile'])
+        # Folded stacks: "stage;outer;...;inner count"
+        stack, count = report['folded'].splitlines()[0].rsplit(' ', 1)
+        self.assertTrue(stack.startswith('ingestion;'))
+        self.assertGreater(int(count), 0)
+
+    def test_stage_leaves_tracing_it_did_not_start(self):
+        tracemalloc.start()
+        try:
+            with RequestProfiler().stage('ingestion'):
+                self.busy()
+            self.assertTrue(tracemalloc.is_tracing())
+        finally:
+            tracemalloc.stop()
+
+    def test_profiled_job_publishes_report(self):
+        job = Mock()
+        self.assertEqual(profiled_job(lambda job: 42)(job), 42)
+        name, report = job.partial.call_args.args
+        self.assertEqual(name, 'profile')
+        self.assertEqual(report['stages'][0]['stage'], 'analysis')
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file